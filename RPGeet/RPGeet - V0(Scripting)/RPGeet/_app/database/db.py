@@ -1,9 +1,13 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
-from .db_connect import get_db_connection, hash_password
+from .db_connect import connection, transaction, hash_password
 from . import query_strings as queries
 
+# Every function checks out a pooled connection (see db_connect.ConnectionPool) instead of
+# opening its own, and the _insert_* helpers take a cursor so that several of them can share
+# a single transaction.
+
 def create_user(username : str, password : str) -> bool:
     """
     Create a new user in the database.
@@ -13,19 +17,13 @@ def create_user(username : str, password : str) -> bool:
     :param password: Password (unhashed) of the new user
     :type password: str
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
     hashed_pw = hash_password(password)
     try:
-        cur.execute(queries.CREATE_USER, (username, hashed_pw))
-        conn.commit()
+        with transaction() as conn, conn.cursor() as cur:
+            cur.execute(queries.CREATE_USER, (username, hashed_pw))
         return True
     except psycopg2.IntegrityError:
-        conn.rollback()
         return False
-    finally:
-        cur.close()
-        conn.close()
 
 def verify_user(username : str, password : str) -> bool:
     """
@@ -38,13 +36,10 @@ def verify_user(username : str, password : str) -> bool:
     :return: True if credentials are valid, False otherwise
     :rtype: bool
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
     hashed_pw = hash_password(password)
-    cur.execute(queries.VERIFY_USER, (username,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(queries.VERIFY_USER, (username,))
+        user = cur.fetchone()
     
     if user and user[0] == hashed_pw:
         return True
@@ -59,13 +54,16 @@ def get_user_games(username : str) -> list:
     :return: List of games
     :rtype: list
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(queries.GET_USER_GAMES, (username,))
-    games = cur.fetchall()
-    cur.close()
-    conn.close()
-    return games
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(queries.GET_USER_GAMES, (username,))
+        return cur.fetchall()
+
+def _insert_game(cur, name : str, system_id : int, source_id : int) -> int:
+    cur.execute(queries.CREATE_GAME, (name, system_id, source_id))
+    return cur.fetchone()[0] # type: ignore (only if insertion is successful)
+
+def _insert_member(cur, game_id : int, username : str, gamemaster : bool) -> None:
+    cur.execute(queries.JOIN_GAME, (game_id, username, gamemaster))
 
 def create_game(name : str, system_id : int, source_id : int) -> int:
     """
@@ -80,20 +78,37 @@ def create_game(name : str, system_id : int, source_id : int) -> int:
     :return: Game identifier
     :rtype: int
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(queries.CREATE_GAME, (name, system_id, source_id))
-        game_id = cur.fetchone()[0] # type: ignore (only if insertion is successful)
-        conn.commit()
-        return game_id
+        with transaction() as conn, conn.cursor() as cur:
+            return _insert_game(cur, name, system_id, source_id)
+    except Exception as e:
+        print(f"Error creating game: {e}")
+        return -1
+
+def create_game_as_gamemaster(name : str, system_id : int, source_id : int, username : str) -> int:
+    """
+    Create a new game and make the user its gamemaster, in a single transaction: either both
+    rows are inserted, or none.
+    
+    :param name: Name of the game
+    :type name: str
+    :param system_id: Game system identifier (D&D 5e, Pathfinder, etc.)
+    :type system_id: int
+    :param source_id: Source identifier (sourcebook, module, etc.)
+    :type source_id: int
+    :param username: Username of the gamemaster
+    :type username: str
+    :return: Game identifier, or -1 if the creation failed
+    :rtype: int
+    """
+    try:
+        with transaction() as conn, conn.cursor() as cur:
+            game_id = _insert_game(cur, name, system_id, source_id)
+            _insert_member(cur, game_id, username, True)
+            return game_id
     except Exception as e:
-        conn.rollback()
         print(f"Error creating game: {e}")
         return -1
-    finally:
-        cur.close()
-        conn.close()
 
 def join_game(game_id : int, username : str, gamemaster : bool=False) -> bool:
     """
@@ -108,18 +123,12 @@ def join_game(game_id : int, username : str, gamemaster : bool=False) -> bool:
     :return: True if successful, False otherwise
     :rtype: bool
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(queries.JOIN_GAME, (game_id, username, gamemaster))
-        conn.commit()
+        with transaction() as conn, conn.cursor() as cur:
+            _insert_member(cur, game_id, username, gamemaster)
         return True
     except psycopg2.IntegrityError:
-        conn.rollback()
         return False
-    finally:
-        cur.close()
-        conn.close()
 
 def get_game(game_id : int) -> dict | None:
     #TODO: Return specific message/error if game not found.
@@ -131,13 +140,9 @@ def get_game(game_id : int) -> dict | None:
     :return: Game details as a dictionary or None if not found
     :rtype: dict[Any, Any] | None
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(queries.GET_GAME, (game_id,))
-    game = cur.fetchone()
-    cur.close()
-    conn.close()
-    return game
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(queries.GET_GAME, (game_id,))
+        return cur.fetchone()
 
 def create_character(game_id : int, username : str, name : str) -> int | None:
     """
@@ -152,45 +157,27 @@ def create_character(game_id : int, username : str, name : str) -> int | None:
     :return: Character identifier or None if creation failed
     :rtype: int | None
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # First get the r_game_user id
-    cur.execute(queries.FETCH_R_GAME_USER, (game_id, username))
-    result = cur.fetchone()
-    if not result:
-        cur.close()
-        conn.close()
-        return None
-    
-    r_game_user_id = result[0]
-    
     try:
-        cur.execute(queries.NEW_CHARACTER, (r_game_user_id, name))
-        character_id = cur.fetchone()[0] # type: ignore (only if insertion is successful)
-        conn.commit()
-        return character_id
+        with transaction() as conn, conn.cursor() as cur:
+            # First get the r_game_user id
+            cur.execute(queries.FETCH_R_GAME_USER, (game_id, username))
+            result = cur.fetchone()
+            if not result:
+                return None
+            
+            r_game_user_id = result[0]
+            cur.execute(queries.NEW_CHARACTER, (r_game_user_id, name))
+            return cur.fetchone()[0] # type: ignore (only if insertion is successful)
     except Exception as e:
-        conn.rollback()
         print(f"Error creating character: {e}")
         return None
-    finally:
-        cur.close()
-        conn.close()
 
 def get_character(character_id):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(queries.GET_CHARACTER, (character_id,))
-    character = cur.fetchone()
-    cur.close()
-    conn.close()
-    return character
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(queries.GET_CHARACTER, (character_id,))
+        return cur.fetchone()
 
 def get_game_characters(game_id):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute(queries.GET_GAME_CHARACTERS, (game_id,))
-    characters = cur.fetchall()
-    cur.close()
-    conn.close()
-    return characters
+    with connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(queries.GET_GAME_CHARACTERS, (game_id,))
+        return cur.fetchall()
@@ -19,8 +19,13 @@ DB_NAME = os.getenv("DB_NAME")
 DB_PORT = os.getenv("DB_PORT")
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1")) # Connections opened when the pool is created
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10")) # Connections opened at most at the same time
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30")) # Seconds to wait for a free connection
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "30")) # Seconds idle after which a connection is pinged before reuse
 
 import psycopg2
+import psycopg2.extensions
 def get_db_connection() -> psycopg2.extensions.connection:
     """
     Establish and return a connection to the PostgreSQL database.
@@ -37,6 +42,198 @@ def get_db_connection() -> psycopg2.extensions.connection:
     )
     return conn
 
+# ==================
+# CONNECTION POOL
+# ==================
+
+from contextlib import contextmanager
+import threading
+import time
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection becomes free before the pool timeout.
+    """
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections, sized between min_size and max_size.
+
+    Connections idle for more than check_after seconds are pinged before being handed out,
+    and replaced if the server closed them. A connection is always given back outside of any
+    transaction (uncommitted work is rolled back).
+    """
+    def __init__(self, connect=get_db_connection, min_size : int = DB_POOL_MIN, max_size : int = DB_POOL_MAX,
+                 timeout : float = DB_POOL_TIMEOUT, check_after : float = DB_POOL_CHECK_AFTER):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("The pool sizes must verify 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle: list[tuple[psycopg2.extensions.connection, float]] = [] # (connection, time it was given back)
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._opened += 1
+
+    @property
+    def size(self) -> int:
+        """ Number of open connections, idle or checked out. """
+        return self._opened
+
+    def _healthy(self, conn : psycopg2.extensions.connection, idle_since : float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn : psycopg2.extensions.connection):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self) -> psycopg2.extensions.connection:
+        """
+        Checks out a connection, opening a new one if none is idle and the pool isn't full.
+
+        :return: A connection, to give back with putconn
+        :rtype: psycopg2.extensions.connection
+        :raises PoolTimeout: If no connection becomes free before the pool timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("The connection pool is closed")
+                while not self._idle and self._opened >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        if not self._idle and self._opened >= self.max_size:
+                            raise PoolTimeout(f"No database connection free after {self.timeout}s ({self.max_size} in use)")
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn, idle_since = None, 0.0
+                    self._opened += 1 # Reserve the slot before connecting outside of the lock
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._opened -= 1
+                        self._cond.notify()
+                    raise
+            # Health check outside of the lock, a ping may take a network round trip
+            if self._healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+
+    def putconn(self, conn : psycopg2.extensions.connection, discard : bool = False):
+        """
+        Gives back a checked out connection, rolling back its uncommitted work.
+
+        :param conn: The connection returned by getconn
+        :type conn: psycopg2.extensions.connection
+        :param discard: Whether to close the connection instead of reusing it
+        :type discard: bool
+        """
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+                self._opened -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """
+        Closes the idle connections, the checked out ones are closed when given back.
+        """
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._opened -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the duration of the with block. Nothing is committed
+        automatically, see transaction.
+
+        :return: A pooled connection
+        :rtype: psycopg2.extensions.connection
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Checks out a connection whose statements form a single transaction: committed at the end
+        of the with block, rolled back if it raises.
+
+        :return: A pooled connection
+        :rtype: psycopg2.extensions.connection
+        """
+        with self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """
+    :return: The process-wide pool, created on first use
+    :rtype: ConnectionPool
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def connection():
+    """ Checks out a connection of the process-wide pool, see ConnectionPool.connection. """
+    return get_pool().connection()
+
+def transaction():
+    """ Checks out a connection of the process-wide pool in a transaction, see ConnectionPool.transaction. """
+    return get_pool().transaction()
+
 import hashlib
 def hash_password(password: str) -> str:
     """
@@ -89,10 +89,9 @@ def create_game():
     system_id = 1 
     source_id = 1
     
-    game_id = db.create_game(name, system_id, source_id)
-    if game_id:
-        # Creator is automatically the GM
-        db.join_game(game_id, session['username'], gamemaster=True)
+    # Creator is automatically the GM
+    game_id = db.create_game_as_gamemaster(name, system_id, source_id, session['username'])
+    if game_id != -1:
         return redirect(url_for('view_game', game_id=game_id))
     else:
         flash('Error creating game')
@@ -0,0 +1,23 @@
+-- Indexes on the referencing columns of the core foreign keys, and uniqueness of the link tables.
+-- Fails (and is rolled back) if a user already joined the same game twice, or a source was added twice to a game:
+-- remove the duplicated rows before running it again.
+
+-- Lobby and character list : games of a user
+CREATE INDEX IF NOT EXISTS r_game_user_username_idx
+    ON core.r_game_user (username);
+
+-- Membership checks and game members : a user joins a game once
+ALTER TABLE core.r_game_user ADD CONSTRAINT r_game_user_game_id_username_uk
+UNIQUE (game_id, username);
+
+-- Characters of a membership
+CREATE INDEX IF NOT EXISTS characters_id_game_user_idx
+    ON core.characters (id_game_user);
+
+-- Sources of a game : a source is added once to a game
+ALTER TABLE core.r_game_sources ADD CONSTRAINT r_game_sources_game_id_source_id_uk
+UNIQUE (game_id, source_id);
+
+-- Sources of a game system
+CREATE INDEX IF NOT EXISTS n_sources_system_id_idx
+    ON core.n_sources (system_id);
@@ -0,0 +1,16 @@
+-- Combat trackers, shared by the workers when COMBAT_STORE=sql
+
+CREATE TABLE IF NOT EXISTS core.combat_state (
+                game_id INTEGER NOT NULL,
+                state JSONB NOT NULL,
+                version INTEGER DEFAULT 0 NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                CONSTRAINT combat_state_pk PRIMARY KEY (game_id)
+);
+
+ALTER TABLE core.combat_state ADD CONSTRAINT games_combat_state_fk
+FOREIGN KEY (game_id)
+REFERENCES core.games (game_id)
+ON DELETE CASCADE
+ON UPDATE NO ACTION
+NOT DEFERRABLE;
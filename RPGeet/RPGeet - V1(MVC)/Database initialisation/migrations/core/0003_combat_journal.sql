@@ -0,0 +1,31 @@
+-- Journal of the combat commands, and the last snapshots of each combat (COMBAT_JOURNAL=sql)
+
+CREATE TABLE IF NOT EXISTS core.combat_journal (
+                game_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                encounter INTEGER NOT NULL,
+                command JSONB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                CONSTRAINT combat_journal_pk PRIMARY KEY (game_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS core.combat_snapshot (
+                game_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                state JSONB NOT NULL,
+                CONSTRAINT combat_snapshot_pk PRIMARY KEY (game_id, seq)
+);
+
+ALTER TABLE core.combat_journal ADD CONSTRAINT games_combat_journal_fk
+FOREIGN KEY (game_id)
+REFERENCES core.games (game_id)
+ON DELETE CASCADE
+ON UPDATE NO ACTION
+NOT DEFERRABLE;
+
+ALTER TABLE core.combat_snapshot ADD CONSTRAINT games_combat_snapshot_fk
+FOREIGN KEY (game_id)
+REFERENCES core.games (game_id)
+ON DELETE CASCADE
+ON UPDATE NO ACTION
+NOT DEFERRABLE;
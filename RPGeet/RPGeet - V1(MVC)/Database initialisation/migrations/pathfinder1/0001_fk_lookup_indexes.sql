@@ -0,0 +1,21 @@
+-- Indexes on the character foreign keys read by every character sheet, and uniqueness of the link tables.
+-- Fails (and is rolled back) if a character already has the same class or deity twice:
+-- remove the duplicated rows before running it again.
+
+CREATE INDEX IF NOT EXISTS modifiers_character_id_idx
+    ON pathfinder1.modifiers (character_id);
+
+CREATE INDEX IF NOT EXISTS r_modifier_origin_id_modifier_idx
+    ON pathfinder1.r_modifier_origin (id_modifier);
+
+-- A character has each class once
+ALTER TABLE pathfinder1.r_classes_character ADD CONSTRAINT r_classes_character_character_id_class_id_uk
+UNIQUE (character_id, class_id);
+
+-- A character worships each deity once
+ALTER TABLE pathfinder1.r_character_deity ADD CONSTRAINT r_character_deity_character_id_deity_id_uk
+UNIQUE (character_id, deity_id);
+
+-- The primary key (id_skill, character_id) can't be used to find the skills of a character
+CREATE INDEX IF NOT EXISTS r_skill_character_character_id_idx
+    ON pathfinder1.r_skill_character (character_id);
@@ -1,13 +1,21 @@
 from flask import Flask
-from app.models.core import db
+from app.models.core import db, roles_cache
+from app.cache import reference_cache
+from app.game_logic import encounter
+from app import db_pool, migrations, passwords, query_tracker, timing
 from config import Config
 from sqlalchemy import text
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_pool.engine_options(app.config)
 
     db.init_app(app)
+    roles_cache.ttl = app.config['ROLES_CACHE_TTL']
+    reference_cache.ttl = app.config['REFERENCE_CACHE_TTL']
+    passwords.init_app(app)
+    encounter.init_app(app)
 
     from .controllers.main import main_bp
     app.register_blueprint(main_bp)
@@ -23,6 +31,9 @@ def create_app():
     
     from .controllers.combat import combat_bp
     app.register_blueprint(combat_bp)
+
+    from .controllers.dice import dice_bp
+    app.register_blueprint(dice_bp)
     
     from .controllers.admin import admin_bp
     app.register_blueprint(admin_bp)
@@ -33,6 +44,12 @@ def create_app():
         except Exception as e:
             print(f"Database connection error: {e}")
             raise e
+        query_tracker.init_app(app, db.engine)
+        db_pool.init_app(app, db.engine)
+        from .game_logic import game_logic
+        game_logic.configure_combat_store(app)
+    timing.init_app(app)
+    migrations.init_app(app)
     print("App created and database connected successfully.")
     
     return app
\ No newline at end of file
@@ -0,0 +1,164 @@
+""" Generic in-process caching helpers shared by the controllers and the game logic. """
+
+from collections import OrderedDict
+from types import MappingProxyType
+import threading
+import time
+
+named_caches: dict[str, 'LRUCache'] = {}
+""" The LRU caches created with a name, whose counters are shown to the admins. """
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded both in size and in entry age.
+
+    An entry can be stored with a version stamp: a lookup passing another stamp finds it stale,
+    drops it and counts a miss. Keeps hit/miss/stale/eviction counters, exposed through :meth:`stats`.
+    """
+    def __init__(self, max_size : int = 1024, ttl : float = 300.0, name : str | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.expirations = 0
+        if name is not None:
+            named_caches[name] = self
+
+    def get(self, key, default=None, stamp=None):
+        """
+        Return the cached value of a key, or default if it is missing, expired or stale.
+
+        :param stamp: The current version stamp of the key, None to accept any stored stamp
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires, stored_stamp, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            if stamp is not None and stored_stamp != stamp:
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, stamp=None):
+        """
+        Store a value, evicting the least recently used entries beyond max_size.
+
+        :param stamp: The version stamp the value was computed at
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.stale = self.evictions = self.expirations = 0
+
+    def stats(self) -> dict:
+        """
+        :return: The cache counters and current size
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+class ReferenceCache:
+    """
+    Process-wide read-through cache of effectively static reference tables.
+
+    Each table is registered under a name with a loader returning an immutable structure
+    (see :func:`index_rows`). It is loaded on first access, then reloaded when its TTL
+    expires or after an explicit :meth:`invalidate`.
+    """
+    def __init__(self, ttl : float = 3600.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaders: dict = {}
+        self._data: dict = {}
+
+    def loader(self, name : str):
+        """
+        Decorator registering the loader of a reference table.
+
+        :param name: The name the table is cached under, e.g. "pathfinder1.skills"
+        :type name: str
+        """
+        def decorator(f):
+            self._loaders[name] = f
+            return f
+        return decorator
+
+    def get(self, name : str):
+        """
+        Return a reference table, loading it if it is not cached or expired.
+
+        :param name: The name the table was registered under
+        :type name: str
+        """
+        entry = self._data.get(name)
+        if entry is not None and entry[0] >= time.monotonic():
+            return entry[1]
+        value = self._loaders[name]()
+        with self._lock:
+            self._data[name] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, prefix : str = ''):
+        """
+        Drop the cached tables whose name starts with prefix (all of them by default).
+
+        :param prefix: The name prefix of the tables to drop, e.g. "pathfinder1."
+        :type prefix: str
+        """
+        with self._lock:
+            for name in [n for n in self._data if n.startswith(prefix)]:
+                del self._data[name]
+
+def index_rows(rows, key : str) -> MappingProxyType:
+    """
+    Freeze query rows into a read-only dict keyed by one of their columns.
+
+    :param rows: The rows to index (immutable sqlalchemy Row objects)
+    :param key: The name of the column to key the rows by
+    :type key: str
+    :return: A read-only { key: row } mapping
+    :rtype: MappingProxyType
+    """
+    return MappingProxyType({getattr(r, key): r for r in rows})
+
+reference_cache = ReferenceCache()
+""" Process-wide cache of the rules reference data. """
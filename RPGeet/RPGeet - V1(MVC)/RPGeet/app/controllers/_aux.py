@@ -1,10 +1,11 @@
-from flask import session, redirect, url_for, request, abort
+from flask import session, redirect, url_for, request, abort, g
 from urllib.parse import urlparse
 from functools import wraps
 
 from werkzeug.wrappers.response import Response
 
-from app.models.core import User
+from app.models.core import User, Roles
+from app import timing
 
 def login_required(f):
     @wraps(f)
@@ -29,6 +30,31 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def get_roles(game_id : int | None = None, character_id : int | None = None) -> Roles | None:
+    """
+    Resolve the roles of the session user towards a game or a character.
+
+    The result is memoized on flask.g for the duration of the request, so that
+    stacked decorators and the view body share a single database round trip.
+
+    :param game_id: The ID of the target game
+    :type game_id: int | None
+    :param character_id: The ID of the target character (takes precedence over game_id)
+    :type character_id: int | None
+    :return: The resolved roles, or None if the session user does not exist
+    :rtype: Roles | None
+    """
+    username = session.get('username')
+    if not username:
+        return None
+    if 'roles' not in g:
+        g.roles = {}
+    key = ('character', character_id) if character_id is not None else ('game', game_id)
+    if key not in g.roles:
+        with timing.phase('auth'):
+            g.roles[key] = User.get_roles(username, game_id=game_id, character_id=character_id)
+    return g.roles[key]
+
 def game_member_required(f):
     @wraps(f)
     @login_required
@@ -36,10 +62,8 @@ def game_member_required(f):
         """
         Decorator to ensure that the user is a member of the specified game.
         """
-        game_id = kwargs.get('game_id')
-        username = session.get('username')
-        user = User.query.filter_by(username=username).first()
-        if not user or not user.is_member_of_game(game_id):
+        roles = get_roles(game_id=kwargs.get('game_id'))
+        if not roles or not roles.is_member:
             abort(403) 
         return f(*args, **kwargs)
     return decorated_function
@@ -51,10 +75,8 @@ def character_owner_required(f):
         """
         Decorator to ensure that the user is the owner of the character.
         """
-        character_id = kwargs.get('character_id')
-        username = session.get('username')
-        user = User.query.filter_by(username=username).first()
-        if not user or not user.is_owner_of_character(character_id):
+        roles = get_roles(character_id=kwargs.get('character_id'))
+        if not roles or not roles.is_owner:
             abort(403) 
         return f(*args, **kwargs)
     return decorated_function
@@ -66,10 +88,8 @@ def gm_required(f):
         """
         Decorator to ensure that the user is the GM of the specified game.
         """
-        game_id = kwargs.get('game_id')
-        username = session.get('username')
-        user = User.query.filter_by(username=username).first()
-        if not user or not user.is_gm_of_game(game_id):
+        roles = get_roles(game_id=kwargs.get('game_id'))
+        if not roles or not roles.is_gm:
             abort(403) 
         return f(*args, **kwargs)
     return decorated_function
@@ -81,10 +101,8 @@ def character_owner_or_gm_required(f):
         """
         Decorator to ensure that the user is either the owner of the character or the GM of the game.
         """
-        character_id = kwargs.get('character_id')
-        username = session.get('username')
-        user = User.query.filter_by(username=username).first()
-        if not user or not user.is_owner_or_gm_of_character(character_id):
+        roles = get_roles(character_id=kwargs.get('character_id'))
+        if not roles or not roles.is_owner_or_gm:
             abort(403) 
         return f(*args, **kwargs)
     return decorated_function
@@ -1,6 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from ..models.core import db, GameSystem, Source
 from ._aux import admin_required
+from ..game_logic import game_logic
+from .. import db_pool, query_tracker
+from ..cache import named_caches
 from sqlalchemy import text
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -70,6 +73,7 @@ def edit_system(system_id):
             system.name = name
         
         db.session.commit()
+        game_logic.invalidate_reference_data()
         return redirect(url_for('admin.list_systems'))
     
     return render_template('admin/edit_system.html', system=system, sources=sources)
@@ -94,6 +98,7 @@ def add_source(system_id):
         db.session.execute(sql, {"name": name, "core_id": new_source_core.source_id})
         
         db.session.commit()
+        game_logic.invalidate_reference_data()
         flash(f"Source '{name}' added to core and {system.schema_name}.")
     
     return redirect(url_for('admin.edit_system', system_id=system_id))
@@ -105,5 +110,27 @@ def delete_source(source_id):
     sid = source.system_id
     db.session.delete(source)
     db.session.commit()
+    game_logic.invalidate_reference_data()
     flash("Source deleted.")
-    return redirect(url_for('admin.edit_system', system_id=sid))
\ No newline at end of file
+    return redirect(url_for('admin.edit_system', system_id=sid))
+
+@admin_bp.route('/queries')
+@admin_required
+def list_queries():
+    """
+    Show the SQL statements issued per route, from the query tracker.
+    """
+    stats = sorted(query_tracker.endpoint_stats.values(), key=lambda s: s.avg_statements, reverse=True)
+    return render_template('admin/queries.html', stats=stats, budgets=current_app.config['QUERY_BUDGETS'],
+                           pool=db.engine.pool, pool_stats=db_pool.pool_stats,
+                           caches={name: cache.stats() for name, cache in sorted(named_caches.items())})
+
+@admin_bp.route('/queries/reset', methods=['POST'])
+@admin_required
+def reset_queries():
+    query_tracker.reset()
+    db_pool.pool_stats.reset()
+    for cache in named_caches.values():
+        cache.reset_stats()
+    flash("Query statistics reset.")
+    return redirect(url_for('admin.list_queries'))
\ No newline at end of file
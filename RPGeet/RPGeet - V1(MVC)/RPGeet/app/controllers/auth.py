@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 
 from ..models import core
 from ..models.core import db, User
+from ..passwords import throttle, HashingBusy
 from ._aux import set_session_and_connect, Response
 
 
@@ -18,10 +19,20 @@ def login() -> str | Response:
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        success, user = User.login(username, password)
+        retry_after = throttle.retry_after(request.remote_addr, username)
+        if retry_after:
+            flash(f"Too many login attempts, try again in {int(retry_after) + 1} seconds.")
+            return render_template('auth/login.html'), 429, {'Retry-After': str(int(retry_after) + 1)}
+        try:
+            success, user = User.login(username, password)
+        except HashingBusy:
+            flash("The server is busy, please try again in a few seconds.")
+            return render_template('auth/login.html'), 503, {'Retry-After': '2'}
         if success:
+            throttle.succeeded(username)
             return set_session_and_connect(username)
         else:
+            throttle.failed(username)
             flash('Invalid username or password')
             current_app.logger.error(f"Failed to login user {username}: {user}")
     return render_template('auth/login.html')
@@ -37,7 +48,15 @@ def register() -> str | Response:
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        success, user = User.register(username, password)
+        retry_after = throttle.retry_after(request.remote_addr, username)
+        if retry_after:
+            flash(f"Too many attempts, try again in {int(retry_after) + 1} seconds.")
+            return render_template('auth/register.html'), 429, {'Retry-After': str(int(retry_after) + 1)}
+        try:
+            success, user = User.register(username, password)
+        except HashingBusy:
+            flash("The server is busy, please try again in a few seconds.")
+            return render_template('auth/register.html'), 503, {'Retry-After': '2'}
         if success:
             flash("Account created successfully! Welcomoe to RPGeet, {}!".format(username))
             return set_session_and_connect(username)
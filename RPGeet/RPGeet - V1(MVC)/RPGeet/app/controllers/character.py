@@ -1,8 +1,9 @@
-from flask import Blueprint, request, url_for, render_template, redirect, session, flash
+from flask import Blueprint, request, url_for, render_template, redirect, session, flash, current_app
 from sqlalchemy.exc import IntegrityError
-from app.models.core import db, Game, GameUser, Character, GameSources
+from app.models.core import db, Game, GameUser, Character, GameSources, roles_cache
 import app.game_logic.game_logic as game_logic
-from app.controllers._aux import login_required, Response, character_owner_or_gm_required
+from app.controllers._aux import login_required, Response, character_owner_or_gm_required, get_roles
+from app import timing
 
 character_bp = Blueprint('character', __name__)
 
@@ -19,20 +20,18 @@ def characters() -> str:
     :return: Rendered characters template
     :rtype: str
     """
-    user_participations = GameUser.query.filter_by(username=session['username']).all()
-    user_characters = []
-    
-    for participation in user_participations:
-        game_name = participation.game.name
-        game_id = participation.game.game_id
-        for char in participation.characters:
-            user_characters.append({
-                'id': char.character_id,
-                'name': char.name,
-                'game_name': game_name,
-                'game_id': game_id
-            })
-            
+    # (id, name, game_name, game_id) rows of all the user's characters, in one query
+    user_characters = db.session.query(
+        Character.character_id.label('id'),
+        Character.name,
+        Game.name.label('game_name'),
+        Game.game_id
+    ).join(GameUser, GameUser.id_game_user == Character.id_game_user).join(
+        Game, Game.game_id == GameUser.game_id
+    ).filter(GameUser.username == session['username']).order_by(
+        GameUser.id_game_user, Character.character_id
+    ).all()
+
     return render_template('character/characters.html', characters=user_characters)
 
 @character_bp.route('/game/<int:game_id>/character/create', methods=['POST'])
@@ -48,6 +47,7 @@ def create_character(game_id : int) -> Response:
             new_char = Character(id_game_user=gu.id_game_user, name=name)
             db.session.add(new_char)
             db.session.commit()
+            roles_cache.bump(game_id)
             return redirect(url_for('game.view_game', game_id=game_id))
         except Exception as e:
             db.session.rollback()
@@ -60,30 +60,24 @@ def create_character(game_id : int) -> Response:
 @character_bp.route('/game/<int:game_id>/character/<int:character_id>')
 @character_owner_or_gm_required
 def view_character(game_id : int, character_id : int) -> str | tuple:
-    character = Character.query.get(character_id)
-    if not character:
+    # Roles were resolved (and memoized) by the access decorator
+    roles = get_roles(character_id=character_id)
+    if roles.game_id != game_id:
         return "Character not found", 404
-        
-    # Convert to dict for compatibility with dummy game logic
-    char_dict = {
-        'character_id': character.character_id,
-        'name': character.name
-    }
-    
-    # DEBUG: Direct dispatch attempt to verify data retrieval
-    game = Game.query.get(game_id)
-    stats = {}
-    if game and game.system_id == 1:
-        try:
-            from app.game_logic import pathfinder1 as pf1
-            stats = pf1.calculate_stats(character.character_id)
-        except Exception as e:
-            print(f"Error calling PF1 stats directly: {e}")
-            stats = {'Error': str(e)}
-    else:
-        stats = game_logic.calculate_stats(char_dict, game_id=game_id)
-        
-    return render_template('character/character.html', stats=stats, game_id=game_id, character_id=character_id)
+
+    try:
+        stats = game_logic.calculate_stats(character_id, game_id=game_id)
+    except Exception as e:
+        current_app.logger.error(f"Error calculating stats of character {character_id}: {e}")
+        stats = {'Error': str(e)}
+
+    # Exact chances of the checks against a DC/AC, from memoized distributions
+    target = request.args.get('target', 15, type=int)
+    odds = game_logic.calculate_odds(stats, target, game_id=game_id)
+
+    with timing.phase('render'):
+        return render_template('character/character.html', stats=stats, game_id=game_id, character_id=character_id,
+                               target=target, odds=odds)
 
 @character_bp.route('/game/<int:game_id>/character/<int:character_id>/save', methods=['POST'])
 @character_owner_or_gm_required
@@ -1,8 +1,10 @@
-from flask import Blueprint, request, url_for, render_template, redirect, session, flash
+from flask import Blueprint, Response as FlaskResponse, request, url_for, render_template, redirect, session, flash, abort, stream_with_context, jsonify
 from sqlalchemy.exc import IntegrityError
 from app.models.core import db, Game, GameUser, Character, GameSources
 import app.game_logic.game_logic as game_logic
-from app.controllers._aux import login_required, Response, gm_required
+from app.game_logic import combat_events, encounter
+from app.game_logic.combat_journal import CombatJournalError
+from app.controllers._aux import Response, gm_required, game_member_required, get_roles
 
 combat_bp = Blueprint('combat', __name__)
 
@@ -12,30 +14,209 @@ combat_bp = Blueprint('combat', __name__)
 # ==================
 
 @combat_bp.route('/game/<int:game_id>/combat')
-@login_required
+@game_member_required
 def combat(game_id):
     state = game_logic.get_combat_state(game_id)
-    return render_template('combat.html', game_id=game_id, state=state)
+    history = game_logic.get_combat_history(game_id, limit=20)
+    characters = game_logic.get_game_characters(game_id)
+    roles = get_roles(game_id=game_id)
+    return render_template('combat.html', game_id=game_id, state=state, history=history, characters=characters,
+                           is_gm=bool(roles and roles.is_gm))
+
+@combat_bp.route('/game/<int:game_id>/combat/events')
+@game_member_required
+def combat_events_stream(game_id):
+    """
+    Stream the changes of the combat as server-sent events, starting with a snapshot.
+
+    :return: The event stream, or 429 if the user already has too many streams of the game open
+    """
+    try:
+        subscription = combat_events.broker.subscribe(game_id, session['username']) # Before the snapshot, so no event is missed
+    except combat_events.TooManySubscriptions:
+        return "Too many open combat trackers for this game.", 429, {'Retry-After': '30'}
+    snapshot = game_logic.get_combat_snapshot(game_id)
+    db.session.remove() # Don't hold a pooled connection for the lifetime of the stream
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            yield combat_events.format_event(snapshot['seq'], 'snapshot', snapshot)
+            yield from subscription.messages()
+        finally:
+            combat_events.broker.unsubscribe(subscription)
+
+    return FlaskResponse(stream_with_context(stream()), mimetype='text/event-stream',
+                         headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@combat_bp.errorhandler(CombatJournalError)
+def combat_journal_error(e):
+    return f"This combat can't be rebuilt from its journal: {e}", 409
+
+def _done(game_id, error=None):
+    """
+    Answer a combat action: a redirect to the tracker for forms, an empty answer for the
+    tracker's own script (whose page is updated by the event stream).
+    """
+    if request.headers.get('X-Requested-With') == 'fetch':
+        return (error, 409) if error else ('', 204)
+    if error:
+        flash(error)
+    return redirect(url_for('combat.combat', game_id=game_id))
 
 @combat_bp.route('/game/<int:game_id>/combat/add', methods=['POST'])
-@login_required
+@gm_required
 def combat_add(game_id):
     name = request.form['name']
     initiative = int(request.form['initiative'])
-    game_logic.add_participant(game_id, name, initiative)
-    return redirect(url_for('combat.combat', game_id=game_id))
+    secondary = int(request.form.get('secondary') or 0)
+    character_id = request.form.get('character_id', type=int)
+    if character_id is not None:
+        characters = dict(game_logic.get_game_characters(game_id))
+        if character_id not in characters:
+            abort(400)
+        name = name or characters[character_id]
+    if not name:
+        abort(400)
+    game_logic.add_participant(game_id, name, initiative, secondary, character_id)
+    return _done(game_id)
+
+@combat_bp.route('/game/<int:game_id>/combat/party', methods=['POST'])
+@gm_required
+def combat_add_party(game_id):
+    if not game_logic.add_party(game_id):
+        return _done(game_id, "Every character of the game is already in the combat.")
+    return _done(game_id)
+
+def _may_control(game_id, participant_id) -> bool:
+    """
+    :return: Whether the session user may act for a participant: the GM for everyone, a player
+        for the participants of their own characters
+    :rtype: bool
+    :raises KeyError: If the participant is not in the combat
+    """
+    if get_roles(game_id=game_id).is_gm:
+        return True
+    character_id = game_logic.participant_character(game_id, participant_id)
+    if character_id is None:
+        return False
+    roles = get_roles(character_id=character_id)
+    return bool(roles and roles.is_owner and roles.game_id == game_id)
+
+@combat_bp.route('/game/<int:game_id>/combat/remove', methods=['POST'])
+@gm_required
+def combat_remove(game_id):
+    try:
+        game_logic.remove_participant(game_id, int(request.form['participant_id']))
+    except KeyError:
+        return _done(game_id, "This participant already left the combat.")
+    return _done(game_id)
+
+@combat_bp.route('/game/<int:game_id>/combat/hold', methods=['POST'])
+@game_member_required
+def combat_hold(game_id):
+    action = request.form['action']
+    participant_id = int(request.form['participant_id'])
+    if action not in ('delay', 'ready'):
+        abort(400)
+    try:
+        if not _may_control(game_id, participant_id):
+            abort(403)
+        game_logic.hold_action(game_id, participant_id, action)
+    except KeyError:
+        return _done(game_id, "This participant already left the combat.")
+    except ValueError as e:
+        return _done(game_id, str(e))
+    return _done(game_id)
+
+@combat_bp.route('/game/<int:game_id>/combat/act', methods=['POST'])
+@game_member_required
+def combat_act(game_id):
+    participant_id = int(request.form['participant_id'])
+    try:
+        if not _may_control(game_id, participant_id):
+            abort(403)
+        game_logic.act_now(game_id, participant_id)
+    except (KeyError, ValueError) as e:
+        return _done(game_id, f"Can't act now: {e}")
+    return _done(game_id)
 
 @combat_bp.route('/game/<int:game_id>/combat/next', methods=['POST'])
-@login_required
+@game_member_required
 def combat_next(game_id):
+    """
+    End the turn: for the GM, or the player of the active participant.
+    """
+    if not get_roles(game_id=game_id).is_gm:
+        active = game_logic.get_combat_state(game_id)['active']
+        if active is None or not _may_control(game_id, active['id']):
+            abort(403)
     game_logic.next_turn(game_id)
-    return redirect(url_for('combat.combat', game_id=game_id))
+    return _done(game_id)
+
+@combat_bp.route('/game/<int:game_id>/combat/undo', methods=['POST'])
+@gm_required
+def combat_undo(game_id):
+    try:
+        game_logic.undo(game_id, int(request.form.get('count') or 1))
+    except ValueError as e:
+        return _done(game_id, str(e))
+    return _done(game_id)
+
+@combat_bp.route('/game/<int:game_id>/combat/new', methods=['POST'])
+@gm_required
+def combat_new_encounter(game_id):
+    game_logic.new_encounter(game_id)
+    return _done(game_id)
 
 @combat_bp.route('/game/<int:game_id>/combat/effect', methods=['POST'])
-@login_required
+@gm_required
 def combat_effect(game_id):
-    participant = request.form['participant']
+    participant_id = int(request.form['participant_id'])
     effect = request.form['effect']
     duration = int(request.form['duration'])
-    game_logic.add_effect(game_id, participant, effect, duration)
-    return redirect(url_for('combat.combat', game_id=game_id))
+    try:
+        game_logic.add_effect(game_id, participant_id, effect, duration)
+    except KeyError:
+        return _done(game_id, "This participant already left the combat.")
+    return _done(game_id)
+
+# ==================
+# ENCOUNTER SIMULATOR
+# ==================
+
+def _foe(block : dict) -> encounter.Combatant:
+    return encounter.Combatant(
+        name=str(block.get('name') or 'Foe'), side=encounter.FOES, hp=int(block['hp']), ac=int(block['ac']),
+        attack=int(block['attack']), damage=str(block['damage']),
+        saves=tuple(int(v) for v in block.get('saves', (0, 0, 0)))[:3],
+        save_dc=int(block.get('save_dc') or 0), save=str(block.get('save') or 'ref'),
+        save_damage=str(block.get('save_damage') or ''))
+
+@combat_bp.route('/game/<int:game_id>/combat/simulate', methods=['POST'])
+@gm_required
+def combat_simulate(game_id):
+    """
+    Simulate the fight of the characters in the combat against foes, given as JSON ({"foes":
+    [{"name": "Orc", "count": 6, "hp": 6, "ac": 13, "attack": 5, "damage": "2d4+4", "saves": [3, 0, -1]}],
+    "trials": 10000, "seed": 1}) or as the fields of a single kind of foe.
+
+    :return: The encounter report as JSON, or 400
+    :rtype: Response
+    """
+    payload = request.get_json(silent=True) or {'foes': [request.form.to_dict()], **request.form.to_dict()}
+    try:
+        foes = []
+        for block in payload.get('foes') or []:
+            count = int(block.get('count') or 1)
+            if not 1 <= count <= 100 - len(foes):
+                raise ValueError("At most 100 foes can be simulated")
+            foes += [_foe(block)._replace(name=f"{block.get('name') or 'Foe'} {i + 1}") for i in range(count)]
+        trials = int(payload.get('trials') or 10_000)
+        seed = int(payload['seed']) if payload.get('seed') not in (None, '') else None
+        report = game_logic.simulate_encounter(game_id, foes, trials, seed)
+    except KeyError as e:
+        return jsonify(error=f"Invalid simulation: the foes need a '{e.args[0]}'"), 400
+    except (TypeError, ValueError) as e:
+        return jsonify(error=f"Invalid simulation: {e}"), 400
+    return jsonify(report.as_dict())
@@ -0,0 +1,66 @@
+from flask import Blueprint, request, jsonify
+import secrets
+from app.game_logic import dice, probability
+from app.controllers._aux import game_member_required
+
+dice_bp = Blueprint('dice', __name__)
+
+# ==================
+# DICE ROUTES
+# ==================
+
+@dice_bp.route('/game/<int:game_id>/roll', methods=['POST'])
+@game_member_required
+def roll(game_id : int):
+    """
+    Roll dice expressions, given as JSON ({"expressions": ["30#1d20+5", "4d6kh3"], "seed": 42,
+    "faces": true}) or as an "expression" form field.
+
+    The seed of the rolls is always returned, so that they can be replayed.
+
+    :return: {"seed": ..., "rolls": [{"expression": ..., "totals": [...], "faces": [...]}]}, or 400
+    :rtype: Response
+    """
+    payload = request.get_json(silent=True) or {}
+    expressions = payload.get('expressions') or request.form.getlist('expression')
+    if not expressions or not all(isinstance(e, str) for e in expressions):
+        return jsonify(error="No dice expression to roll"), 400
+    seed = payload.get('seed')
+    if seed is None:
+        seed = secrets.randbits(53) # Exact in JavaScript numbers
+    elif not isinstance(seed, int) or isinstance(seed, bool) or seed < 0:
+        return jsonify(error="The seed must be a positive integer"), 400
+
+    try:
+        rolls = dice.roll_batch(expressions, seed)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    results = []
+    for r in rolls:
+        result = {'expression': r.expression.text, 'totals': r.totals.tolist()}
+        if payload.get('faces'):
+            result['faces'] = [faces.tolist() for faces in r.faces]
+        results.append(result)
+    return jsonify(seed=seed, rolls=results)
+
+@dice_bp.route('/game/<int:game_id>/roll/distribution')
+@game_member_required
+def distribution(game_id : int):
+    """
+    Exact distribution of a dice expression (?expression=1d20%2B7), with the chance to reach
+    ?target if given.
+
+    :return: {"expression": ..., "minimum": ..., "maximum": ..., "mean": ..., "pmf": {total: p}, "at_least": p}, or 400
+    :rtype: Response
+    """
+    try:
+        d = probability.distribution(request.args.get('expression', ''))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    result = {'expression': request.args['expression'], 'minimum': d.minimum, 'maximum': d.maximum,
+              'mean': d.mean, 'pmf': d.as_dict()}
+    target = request.args.get('target', type=int)
+    if target is not None:
+        result['at_least'] = d.at_least(target)
+    return jsonify(result)
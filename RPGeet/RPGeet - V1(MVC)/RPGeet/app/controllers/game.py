@@ -1,8 +1,9 @@
 from flask import Blueprint, request, url_for, render_template, redirect, session, flash
 from sqlalchemy.exc import IntegrityError
-from app.models.core import db, Game, GameUser, Character, GameSources, GameSystem, Source
+from app.models.core import db, Game, GameUser, Character, GameSources, GameSystem, Source, roles_cache
 import app.game_logic.game_logic as game_logic
 from app.controllers._aux import game_member_required, login_required, gm_required, Response
+from app.cache import reference_cache
 import json
 
 game_bp = Blueprint('game', __name__)
@@ -18,9 +19,9 @@ def create_game():
     """
     
     def aux_load_systems_and_sources():
-        """Load game systems and sources for the creation form."""
-        systems = GameSystem.query.all()
-        sources = Source.query.all()
+        """Load game systems and sources for the creation form, from the reference data cache."""
+        systems = list(reference_cache.get('core.game_systems').values())
+        sources = reference_cache.get('core.sources')
         
         # Transform sources into a list of dicts for JS
         sources_data = [
@@ -66,6 +67,7 @@ def create_game():
                 
                 # Commit all changes
                 db.session.commit()
+                roles_cache.bump(new_game.game_id)
             
                 return redirect(url_for('game.view_game', game_id=new_game.game_id))
             except Exception as e:
@@ -111,6 +113,7 @@ def join_game(game_id : int) -> Response:
         new_participation = GameUser(game_id=game_id, username=session['username'], gamemaster=False)
         db.session.add(new_participation)
         db.session.commit()
+        roles_cache.bump(game_id)
         return redirect(url_for('game.view_game', game_id=game_id))
     except Exception as e:
         db.session.rollback()
@@ -16,16 +16,11 @@ def lobby() -> str:
     :return: Rendered lobby template
     :rtype: str
     """
-    # Get all games the user is participating in
-    participations = GameUser.query.filter_by(username=session['username']).all()
-    
-    # Format for template to match previous behavior
-    games = []
-    for p in participations:
-        games.append({
-            'game_id': p.game.game_id,
-            'name': p.game.name,
-            'gamemaster': p.gamemaster
-        })
-        
+    # Get all games the user is participating in, as (game_id, name, gamemaster) rows in one query
+    games = db.session.query(
+        Game.game_id, Game.name, GameUser.gamemaster
+    ).join(GameUser, GameUser.game_id == Game.game_id).filter(
+        GameUser.username == session['username']
+    ).order_by(GameUser.id_game_user).all()
+
     return render_template('lobby.html', games=games, username=session['username'])
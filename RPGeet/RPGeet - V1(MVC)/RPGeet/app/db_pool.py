@@ -0,0 +1,115 @@
+""" Engine pool settings, per-blueprint statement timeouts and pool checkout metrics.
+
+The pool and connection settings come from the DB_* variables of config.Config. Every connection
+starts with the strict DB_STATEMENT_TIMEOUT, and the transactions of the blueprints listed in
+STATEMENT_TIMEOUTS (e.g. admin schema provisioning) get their own with SET LOCAL.
+"""
+
+from flask import Flask, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+import threading
+import time
+
+from app import timing
+
+class PoolStats:
+    """
+    Connection checkouts of the engine pool, and how long they waited for a free connection.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.timeouts = 0
+
+    def record(self, wait : float, timed_out : bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if timed_out:
+                self.timeouts += 1
+
+    @property
+    def avg_wait_ms(self) -> float:
+        return 1000 * self.total_wait / self.checkouts if self.checkouts else 0.0
+
+pool_stats = PoolStats()
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool recording the wait of every checkout in pool_stats and as the "db-pool"
+    phase of the current request.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        wait = time.perf_counter() - start
+        pool_stats.record(wait)
+        timing.record('db-pool', wait)
+        return entry
+
+def engine_options(config : dict) -> dict:
+    """
+    :param config: The application configuration
+    :type config: dict
+    :return: The SQLALCHEMY_ENGINE_OPTIONS built from the DB_* settings, the options already
+        set in the configuration taking precedence
+    :rtype: dict
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name() != 'postgresql':
+        return options # e.g. the SQLite stand-in of the benchmarks, which sets its own options
+
+    connect_args = {
+        'application_name': config['DB_APPLICATION_NAME'],
+        'options': f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT'])}",
+    }
+    connect_args.update(options.get('connect_args', {}))
+    defaults = {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    defaults.update(options)
+    defaults['connect_args'] = connect_args
+    return defaults
+
+def init_app(app : Flask, engine):
+    """
+    Apply the per-blueprint statement timeouts to the transactions of the requests.
+
+    :param app: The Flask application
+    :type app: Flask
+    :param engine: The SQLAlchemy engine of the application
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+    default = int(app.config['DB_STATEMENT_TIMEOUT'])
+    timeouts = {blueprint: int(ms) for blueprint, ms in app.config['STATEMENT_TIMEOUTS'].items() if int(ms) != default}
+    if not timeouts:
+        return
+
+    @event.listens_for(Session, 'after_begin')
+    def _set_statement_timeout(session, transaction, connection):
+        if connection.engine is not engine or not has_request_context():
+            return
+        timeout = timeouts.get(request.blueprint)
+        if timeout is not None:
+            # SET LOCAL ends with the transaction, the pooled connection gets back the default
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout}")
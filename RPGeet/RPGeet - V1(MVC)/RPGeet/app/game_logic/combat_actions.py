@@ -0,0 +1,169 @@
+""" Combat actions as replayable commands, with their undo.
+
+A command is a small dict ({'type': 'add', 'name': 'Orc', 'initiative': 12, 'secondary': 0}) applied
+to a combat state by :func:`apply`, the only way the state changes. Replaying the commands of the
+journal from a snapshot gives back the same state (see combat_journal.py).
+
+Each applied command leaves an undo patch in state['undo'] (the last UNDO_DEPTH ones): what the
+command changed, so that undoing N commands costs N patches instead of a replay.
+"""
+
+import copy
+import heapq
+
+from app.game_logic import effects, initiative
+from app.game_logic.combat_store import new_state
+
+UNDO_DEPTH = 50
+
+def upgrade_state(state : dict) -> dict:
+    """
+    Fill in the keys missing from states saved by a previous version.
+    """
+    effects.upgrade_state(initiative.upgrade_state(state))
+    state.setdefault('encounter', 1)
+    state.setdefault('seq', 0)
+    state.setdefault('undo', [])
+    return state
+
+def _effect_event(entry : list) -> dict:
+    return {'id': entry[effects.ID], 'participant_id': entry[effects.PARTICIPANT], 'name': entry[effects.NAME],
+            'expires': entry[effects.EXPIRES]}
+
+# ==================
+# ACTIONS
+# ==================
+# Each action changes the state and returns the events to publish and the undo patch
+
+def _add(state, command):
+    participant = initiative.add(state, command['name'], command['initiative'], command.get('secondary', 0),
+                                 **command.get('extra', {}))
+    return [{'type': 'participant_added', 'participant': dict(participant)}], {'ids': [participant['id']]}
+
+def _add_party(state, command):
+    added = [initiative.add(state, p['name'], p['initiative'], p['secondary'], character_id=p['character_id'])
+             for p in command['participants']]
+    return ([{'type': 'participant_added', 'participant': dict(participant)} for participant in added],
+            {'ids': [participant['id'] for participant in added]})
+
+def _remove(state, command):
+    index = initiative.index_of(state, command['id'])
+    participant = initiative.remove(state, command['id'])
+    removed_effects = effects.remove_participant(state, command['id'])
+    return ([{'type': 'participant_removed', 'id': command['id']}],
+            {'participant': participant, 'index': index, 'effects': removed_effects})
+
+def _hold(state, command):
+    initiative.hold(state, command['id'], command['action'])
+    return [{'type': 'held', 'id': command['id'], 'action': command['action']}], {'id': command['id']}
+
+def _act(state, command):
+    index = initiative.index_of(state, command['id'])
+    before = copy.deepcopy(state['participants'][command['id']])
+    initiative.act_now(state, command['id'])
+    return [{'type': 'acted', 'participant': dict(state['participants'][command['id']])}], {'participant': before, 'index': index}
+
+def _next(state, command):
+    initiative.next_turn(state)
+    return [], {}
+
+def _effect(state, command):
+    if command['participant_id'] not in state['participants']:
+        raise KeyError(command['participant_id'])
+    entry = effects.add(state, command['participant_id'], command['name'], command['duration'])
+    return [{'type': 'effect_added', 'effect': _effect_event(entry)}], {'effect_id': entry[effects.ID]}
+
+ACTIONS = {
+    'add': _add,
+    'add_party': _add_party,
+    'remove': _remove,
+    'hold': _hold,
+    'act': _act,
+    'next': _next,
+    'effect': _effect,
+}
+
+def _turn(state):
+    participant = initiative.active(state)
+    return state['round'], participant['id'] if participant else None
+
+def apply(state : dict, command : dict) -> list[dict]:
+    """
+    Apply a command to the combat state.
+
+    :param state: The combat state, changed in place
+    :type state: dict
+    :param command: The command, with a 'type' key among ACTIONS, 'undo' and 'new_encounter'
+    :type command: dict
+    :return: The events describing the changes, for the players (see combat_events.py)
+    :rtype: list[dict]
+    :raises KeyError | ValueError: If the command doesn't apply to the state (e.g. unknown participant)
+    """
+    state['seq'] += 1
+    if command['type'] == 'undo':
+        return _undo(state, command['count'])
+    if command['type'] == 'new_encounter':
+        encounter, seq = state['encounter'] + 1, state['seq']
+        state.clear()
+        state.update(upgrade_state(new_state()), encounter=encounter, seq=seq)
+        return [snapshot_event(state)]
+
+    scalars = [state['round'], state['current'], state['next_id'], state['next_effect']]
+    turn = _turn(state)
+    events, patch = ACTIONS[command['type']](state, command)
+    if _turn(state) != turn:
+        events.append({'type': 'turn', 'round': state['round'], 'active': _turn(state)[1]})
+    expired = effects.expire(state)
+    if expired:
+        events.append({'type': 'effect_expired', 'ids': [entry[effects.ID] for entry in expired]})
+
+    patch.update(type=command['type'], scalars=scalars, expired=expired)
+    state['undo'].append(patch)
+    del state['undo'][:-UNDO_DEPTH]
+    return events
+
+# ==================
+# UNDO
+# ==================
+
+def _revert(state : dict, patch : dict):
+    kind = patch['type']
+    if kind in ('add', 'add_party'):
+        for participant_id in patch['ids']:
+            state['order'].pop(initiative.index_of(state, participant_id))
+            del state['participants'][participant_id]
+    elif kind == 'remove':
+        participant = patch['participant']
+        state['participants'][participant['id']] = participant
+        state['order'].insert(patch['index'], participant['id'])
+        for entry in patch['effects']:
+            heapq.heappush(state['effects'], entry)
+    elif kind == 'hold':
+        state['participants'][patch['id']]['held'] = None
+    elif kind == 'act':
+        participant = patch['participant']
+        state['order'].pop(initiative.index_of(state, participant['id']))
+        state['participants'][participant['id']] = participant
+        state['order'].insert(patch['index'], participant['id'])
+    elif kind == 'effect':
+        state['effects'] = [entry for entry in state['effects'] if entry[effects.ID] != patch['effect_id']]
+        heapq.heapify(state['effects'])
+    for entry in patch['expired']:
+        heapq.heappush(state['effects'], entry)
+    state['round'], state['current'], state['next_id'], state['next_effect'] = patch['scalars']
+
+def _undo(state : dict, count : int) -> list[dict]:
+    if count > len(state['undo']):
+        raise ValueError(f"Only the last {len(state['undo'])} actions can be undone")
+    for _ in range(count):
+        _revert(state, state['undo'].pop())
+    return [snapshot_event(state)]
+
+def snapshot_event(state : dict) -> dict:
+    """
+    :return: The whole combat, as sent at the start of an event stream and after an undo
+    :rtype: dict
+    """
+    return {'type': 'snapshot', 'encounter': state['encounter'], 'round': state['round'], 'active': _turn(state)[1],
+            'participants': initiative.ordered(state), 'effects': [_effect_event(entry) for entry in state['effects']],
+            'undoable': len(state['undo'])}
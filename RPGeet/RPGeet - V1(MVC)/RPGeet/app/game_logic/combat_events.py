@@ -0,0 +1,140 @@
+""" Publication of the combat changes to the connected players, as server-sent events.
+
+Each combat action publishes compact JSON deltas (participant added, turn advanced, effect
+expired, ...) to the broker, which pushes them to the event streams of the game. Events are
+numbered per game: a stream starts with a snapshot of the combat, and the client ignores the
+events already included in it.
+
+LocalBroker fans out within the process, for single-node setups. A multi-node deployment
+needs a Broker relaying the events between the nodes (e.g. PostgreSQL LISTEN/NOTIFY).
+"""
+
+import json
+import queue
+import threading
+
+HEARTBEAT_INTERVAL = 15.0 # Seconds between two keep-alive comments of an idle stream
+SUBSCRIBER_BUFFER = 256 # Events waiting for a slow client before it is disconnected
+MAX_STREAMS_PER_USER = 5 # Streams of a game a user can keep open at once (tabs, devices)
+
+class TooManySubscriptions(Exception):
+    """
+    Raised when a user already has MAX_STREAMS_PER_USER streams open on a game.
+    """
+
+class Subscription:
+    """
+    Events of a game waiting to be sent to one client.
+    """
+    def __init__(self, game_id : int, owner : str | None = None, maxsize : int = SUBSCRIBER_BUFFER):
+        self.game_id = game_id
+        self.owner = owner
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+    def push(self, message : str) -> bool:
+        """
+        :return: False if the client is too slow and must be disconnected
+        :rtype: bool
+        """
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            self.closed = True
+            return False
+
+    def messages(self, heartbeat : float = HEARTBEAT_INTERVAL):
+        """
+        Yield the formatted events as they come, and a keep-alive comment when idle.
+        """
+        while not self.closed:
+            try:
+                yield self.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+
+def format_event(seq : int, event_type : str, data : dict) -> str:
+    """
+    :return: The event in the text/event-stream format
+    :rtype: str
+    """
+    return f"id: {seq}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class Broker:
+    """
+    Base class of the combat event brokers.
+    """
+    def seq(self, game_id : int) -> int:
+        """ :return: The number of the last event published for the game """
+        raise NotImplementedError
+
+    def publish(self, game_id : int, events : list[dict]):
+        """ Send the events (dicts with a 'type' key) to the subscribers of the game. """
+        raise NotImplementedError
+
+    def subscribe(self, game_id : int, owner : str | None = None) -> Subscription:
+        """
+        Open a stream of the game's events for a client.
+
+        :param owner: The user opening it, whose streams of the game are limited to MAX_STREAMS_PER_USER
+        :type owner: str | None
+        :raises TooManySubscriptions: If the owner has too many streams open already
+        """
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription : Subscription):
+        raise NotImplementedError
+
+class LocalBroker(Broker):
+    """
+    Broker between the requests of a single process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[Subscription]] = {}
+        self._seq: dict[int, int] = {}
+
+    def seq(self, game_id : int) -> int:
+        return self._seq.get(game_id, 0)
+
+    def publish(self, game_id : int, events : list[dict]):
+        if not events:
+            return
+        with self._lock:
+            seq = self._seq.get(game_id, 0)
+            messages = []
+            for event in events:
+                seq += 1
+                messages.append(format_event(seq, event['type'], event)) # Serialized once for all the subscribers
+            self._seq[game_id] = seq
+            subscribers = list(self._subscribers.get(game_id, ()))
+        for subscription in subscribers:
+            for message in messages:
+                if not subscription.push(message):
+                    self.unsubscribe(subscription)
+                    break
+
+    def subscribe(self, game_id : int, owner : str | None = None) -> Subscription:
+        subscription = Subscription(game_id, owner)
+        with self._lock:
+            subscribers = self._subscribers.setdefault(game_id, set())
+            if owner is not None and sum(s.owner == owner for s in subscribers) >= MAX_STREAMS_PER_USER:
+                raise TooManySubscriptions(f"{owner} has {MAX_STREAMS_PER_USER} streams of game {game_id} open")
+            subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription : Subscription):
+        subscription.closed = True
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.game_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.game_id]
+
+    def listeners(self, game_id : int) -> int:
+        """ :return: The number of clients connected to the game's stream """
+        return len(self._subscribers.get(game_id, ()))
+
+broker: Broker = LocalBroker()
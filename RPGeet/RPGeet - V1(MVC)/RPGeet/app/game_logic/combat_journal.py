@@ -0,0 +1,190 @@
+""" Append-only journal of the combat commands, with periodic snapshots of the state.
+
+Every command applied to a combat (see combat_actions.py) is appended with its number (state['seq']),
+and every snapshot_interval commands the whole state is saved as well. A combat is rebuilt from
+its last snapshot and the few commands after it, e.g. after a worker restart with the memory
+combat store, or to catch up a write-behind SQL store after a crash.
+
+Retention is the same for both backends: the last kept_snapshots snapshots of each game, and the
+commands after the oldest of them (older ones could not be replayed anyway). The history of a game
+thus spans between (kept_snapshots - 1) x snapshot_interval and kept_snapshots x snapshot_interval
+commands, and a new encounter (which takes a snapshot) cuts it short.
+"""
+
+from contextlib import nullcontext
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+import copy
+import json
+import threading
+
+from app.game_logic import combat_actions
+from app.game_logic.combat_store import new_state
+
+class CombatJournalError(Exception):
+    """
+    Raised when the journal of a combat can't be replayed, e.g. a command is missing.
+    """
+
+class CombatJournal:
+    """
+    Base class of the journal backends.
+    """
+    def __init__(self, snapshot_interval : int = 50, kept_snapshots : int = 2):
+        self.snapshot_interval = snapshot_interval
+        self.kept_snapshots = kept_snapshots
+
+    def append(self, game_id : int, state : dict, command : dict, conn=None):
+        """
+        Record a command, just applied to the state.
+
+        :param game_id: The game of the combat
+        :type game_id: int
+        :param state: The combat state after the command
+        :type state: dict
+        :param command: The applied command
+        :type command: dict
+        :param conn: The connection of the transaction saving the state, to write the journal in
+            (SQL backend), None for a transaction of its own
+        """
+        self._append(game_id, state['seq'], state['encounter'], command, conn)
+        if state['seq'] % self.snapshot_interval == 0 or command['type'] == 'new_encounter':
+            self._snapshot(game_id, state['seq'], state, conn)
+
+    def restore(self, game_id : int, state : dict | None = None) -> dict | None:
+        """
+        Rebuild a combat: from the given state (e.g. a late copy) or the last snapshot, replaying the
+        commands journaled after it.
+
+        :return: The rebuilt state, None if nothing was journaled for the game
+        :rtype: dict | None
+        :raises CombatJournalError: If the journaled commands don't follow the state
+        """
+        if state is None:
+            state = self._last_snapshot(game_id)
+        after = state.get("seq", 0) if state is not None else 0
+        tail = self._commands(game_id, after)
+        if state is None and not tail:
+            return None
+        state = combat_actions.upgrade_state(copy.deepcopy(state) if state is not None else new_state())
+        for seq, command in tail:
+            if seq != state['seq'] + 1:
+                raise CombatJournalError(f"Combat journal of game {game_id} has a gap before #{seq}")
+            combat_actions.apply(state, command)
+            if state['seq'] != seq:
+                raise CombatJournalError(f"Command #{seq} of the combat journal of game {game_id} didn't replay")
+        return state
+
+    def history(self, game_id : int, limit : int = 50) -> list[tuple[int, int, dict, datetime]]:
+        """
+        :return: The last commands of the game, latest first, as (seq, encounter, command, time)
+        :rtype: list[tuple[int, int, dict, datetime]]
+        """
+        raise NotImplementedError
+
+    def _append(self, game_id : int, seq : int, encounter : int, command : dict, conn=None):
+        raise NotImplementedError
+
+    def _snapshot(self, game_id : int, seq : int, state : dict, conn=None):
+        raise NotImplementedError
+
+    def _last_snapshot(self, game_id : int) -> dict | None:
+        raise NotImplementedError
+
+    def _commands(self, game_id : int, after : int) -> list[tuple[int, dict]]:
+        raise NotImplementedError
+
+class MemoryCombatJournal(CombatJournal):
+    """
+    Journal kept in the memory of the process, for undo history and tests.
+    """
+    def __init__(self, snapshot_interval : int = 50, kept_snapshots : int = 2):
+        super().__init__(snapshot_interval, kept_snapshots)
+        self._lock = threading.Lock()
+        self._entries: dict[int, list[tuple[int, int, str, datetime]]] = {}
+        self._snapshots: dict[int, list[tuple[int, str]]] = {}
+
+    def _append(self, game_id, seq, encounter, command, conn=None):
+        with self._lock:
+            self._entries.setdefault(game_id, []).append((seq, encounter, json.dumps(command), datetime.now()))
+
+    def _snapshot(self, game_id, seq, state, conn=None):
+        with self._lock:
+            snapshots = self._snapshots.setdefault(game_id, [])
+            snapshots.append((seq, json.dumps(state)))
+            del snapshots[:-self.kept_snapshots]
+            # Only the commands after the oldest kept snapshot can be replayed, forget the others
+            entries = self._entries.get(game_id, [])
+            oldest = snapshots[0][0]
+            while entries and entries[0][0] <= oldest:
+                entries.pop(0)
+
+    def _last_snapshot(self, game_id):
+        with self._lock:
+            snapshots = self._snapshots.get(game_id)
+            return json.loads(snapshots[-1][1]) if snapshots else None
+
+    def _commands(self, game_id, after):
+        with self._lock:
+            entries = self._entries.get(game_id, [])
+            # Appended in order: only the tail is scanned
+            start = len(entries)
+            while start > 0 and entries[start - 1][0] > after:
+                start -= 1
+            return [(seq, json.loads(command)) for seq, _, command, _ in entries[start:]]
+
+    def history(self, game_id, limit=50):
+        with self._lock:
+            entries = self._entries.get(game_id, [])[-limit:]
+        return [(seq, encounter, json.loads(command), time) for seq, encounter, command, time in reversed(entries)]
+
+class SqlCombatJournal(CombatJournal):
+    """
+    Journal kept in core.combat_journal, and snapshots in core.combat_snapshot (only the last
+    kept_snapshots of each game, and the commands after them).
+
+    Given the connection of the SQL combat store's transaction, the commands and snapshots are
+    written in it, so that the journal and the saved state never disagree.
+    """
+    def __init__(self, engine, journal_table, snapshot_table, snapshot_interval : int = 50, kept_snapshots : int = 2):
+        super().__init__(snapshot_interval, kept_snapshots)
+        self.engine = engine
+        self.journal = journal_table
+        self.snapshots = snapshot_table
+
+    def _begin(self, conn):
+        return nullcontext(conn) if conn is not None else self.engine.begin()
+
+    def _append(self, game_id, seq, encounter, command, conn=None):
+        with self._begin(conn) as conn:
+            conn.execute(insert(self.journal).values(game_id=game_id, seq=seq, encounter=encounter, command=command,
+                                                     created_at=datetime.now()))
+
+    def _snapshot(self, game_id, seq, state, conn=None):
+        s, j = self.snapshots, self.journal
+        with self._begin(conn) as conn:
+            conn.execute(insert(s).values(game_id=game_id, seq=seq, state=state))
+            oldest_kept = conn.execute(select(s.c.seq).where(s.c.game_id == game_id)
+                                       .order_by(s.c.seq.desc()).offset(self.kept_snapshots - 1).limit(1)).scalar()
+            if oldest_kept is not None:
+                conn.execute(delete(s).where(s.c.game_id == game_id, s.c.seq < oldest_kept))
+                # Same retention as the memory journal: only the commands after the oldest kept snapshot
+                conn.execute(delete(j).where(j.c.game_id == game_id, j.c.seq <= oldest_kept))
+
+    def _last_snapshot(self, game_id):
+        s = self.snapshots
+        with self.engine.connect() as conn:
+            return conn.execute(select(s.c.state).where(s.c.game_id == game_id).order_by(s.c.seq.desc()).limit(1)).scalar()
+
+    def _commands(self, game_id, after):
+        j = self.journal
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(j.c.seq, j.c.command).where(j.c.game_id == game_id, j.c.seq > after).order_by(j.c.seq))
+            return [(seq, command) for seq, command in rows]
+
+    def history(self, game_id, limit=50):
+        j = self.journal
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(j.c.seq, j.c.encounter, j.c.command, j.c.created_at)
+                                .where(j.c.game_id == game_id).order_by(j.c.seq.desc()).limit(limit))
+            return [tuple(row) for row in rows]
@@ -0,0 +1,221 @@
+""" Storage backends of the combat trackers, one state per game.
+
+- MemoryCombatStore keeps the states in the process, for a single worker.
+- SqlCombatStore keeps them in core.combat_state, shared by every worker and kept across restarts.
+
+Every mutation goes through :meth:`CombatStore.mutate`, which holds the game's lock while the
+state is read, changed and saved, so concurrent actions on the same combat don't lose updates.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import bindparam, select, update, insert
+from sqlalchemy.exc import IntegrityError
+import atexit
+import copy
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def new_state() -> dict:
+    """
+    :return: The state of a combat that didn't start yet
+    :rtype: dict
+    """
+    return {'round': 1, 'current': None, 'next_id': 1, 'participants': {}, 'order': [], 'effects': [], 'next_effect': 1}
+
+class CombatStore:
+    """
+    Base class of the combat state backends.
+    """
+    def __init__(self):
+        self._locks: dict[int, threading.RLock] = {}
+        self._locks_lock = threading.Lock()
+        self.restore = None
+        """ Optional callable(game_id, state) rebuilding a combat missing from, or late in, the process (see combat_journal.py). """
+
+    def _restored(self, game_id : int, state : dict | None = None) -> dict:
+        if self.restore is not None:
+            state = self.restore(game_id, state) or state
+        return state or new_state()
+
+    def lock(self, game_id : int) -> threading.RLock:
+        """
+        :return: The in-process lock of the game's combat, reentrant so that callers can hold it around mutate
+        :rtype: threading.RLock
+        """
+        with self._locks_lock:
+            lock = self._locks.get(game_id)
+            if lock is None:
+                lock = self._locks[game_id] = threading.RLock()
+            return lock
+
+    def load(self, game_id : int) -> dict:
+        """
+        :param game_id: The game whose combat is read
+        :type game_id: int
+        :return: A copy of the combat state, safe to read while other requests change it
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def mutate(self, game_id : int, before_save=None):
+        """
+        Context manager yielding the combat state of the game, to change in place. The state is
+        saved when the with block ends, and discarded if it raises.
+
+        :param game_id: The game whose combat is changed
+        :type game_id: int
+        :param before_save: Optional callable(state, conn) run once the block ended, before the state
+            is saved. conn is the connection of the saving transaction for the SQL store (the callable's
+            writes are committed along with the state), None for the other backends
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """ Write the pending changes, for the backends that delay them. """
+
+class MemoryCombatStore(CombatStore):
+    """
+    Combat states kept in the memory of the process: lost on restart, and not shared
+    between workers.
+    """
+    def __init__(self):
+        super().__init__()
+        self._states: dict[int, dict] = {}
+
+    def _get(self, game_id : int) -> dict:
+        state = self._states.get(game_id)
+        if state is None:
+            state = self._states[game_id] = self._restored(game_id)
+        return state
+
+    def load(self, game_id : int) -> dict:
+        with self.lock(game_id):
+            return copy.deepcopy(self._get(game_id))
+
+    @contextmanager
+    def mutate(self, game_id : int, before_save=None):
+        with self.lock(game_id):
+            state = copy.deepcopy(self._get(game_id))
+            yield state
+            if before_save is not None:
+                before_save(state, None)
+            self._states[game_id] = state
+
+class SqlCombatStore(CombatStore):
+    """
+    Combat states kept in core.combat_state.
+
+    By default every mutation is a transaction locking the game's row (SELECT ... FOR UPDATE), so
+    workers of different processes take turns on the same combat. With write_behind, the states are
+    kept in the process and the changed ones are written in one batch every flush_interval seconds:
+    fewer round trips, but a game's requests must then all reach the same worker, and a crash loses
+    the last interval.
+    """
+    def __init__(self, engine, table, write_behind : bool = False, flush_interval : float = 0.5):
+        super().__init__()
+        self.engine = engine
+        self.table = table
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self._cache: dict[int, dict] = {}
+        self._dirty: set[int] = set()
+        self._dirty_lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+
+    def _select(self, conn, game_id : int, for_update : bool = False) -> dict | None:
+        query = select(self.table.c.state).where(self.table.c.game_id == game_id)
+        if for_update:
+            query = query.with_for_update()
+        return conn.execute(query).scalar()
+
+    def _select_or_create(self, conn, game_id : int) -> dict:
+        state = self._select(conn, game_id, for_update=True)
+        if state is not None:
+            return state
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(self.table).values(game_id=game_id, state=new_state(), version=0,
+                                                       updated_at=datetime.now()))
+        except IntegrityError:
+            pass # Created by another worker in the meantime
+        return self._select(conn, game_id, for_update=True)
+
+    def load(self, game_id : int) -> dict:
+        if self.write_behind:
+            with self.lock(game_id):
+                if game_id in self._cache:
+                    return copy.deepcopy(self._cache[game_id])
+        with self.engine.connect() as conn:
+            return self._select(conn, game_id) or new_state()
+
+    @contextmanager
+    def mutate(self, game_id : int, before_save=None):
+        with self.lock(game_id):
+            if self.write_behind:
+                state = self._cache.get(game_id)
+                if state is None:
+                    with self.engine.begin() as conn:
+                        state = self._select_or_create(conn, game_id)
+                    state = self._restored(game_id, state) # Commands journaled after the last flush
+                state = copy.deepcopy(state)
+                yield state
+                if before_save is not None:
+                    before_save(state, None) # Journaled ahead of the delayed write
+                self._cache[game_id] = state
+                with self._dirty_lock:
+                    self._dirty.add(game_id)
+                self._start_flusher()
+                return
+
+            with self.engine.begin() as conn:
+                state = self._select_or_create(conn, game_id)
+                yield state
+                if before_save is not None:
+                    before_save(state, conn)
+                conn.execute(update(self.table).where(self.table.c.game_id == game_id)
+                             .values(state=state, version=self.table.c.version + 1, updated_at=datetime.now()))
+
+    def flush(self):
+        """
+        Write the states changed since the last flush, in a single transaction.
+        """
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        rows = []
+        for game_id in dirty:
+            with self.lock(game_id):
+                rows.append({'g_id': game_id, 'g_state': copy.deepcopy(self._cache[game_id])})
+        stmt = (update(self.table).where(self.table.c.game_id == bindparam('g_id'))
+                .values(state=bindparam('g_state', type_=self.table.c.state.type), version=self.table.c.version + 1,
+                        updated_at=datetime.now()))
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception:
+            logger.exception("Failed to write %d combat states, retrying on next flush", len(rows))
+            with self._dirty_lock:
+                self._dirty |= dirty
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._dirty_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='combat-flush', daemon=True)
+                self._flusher.start()
+                atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """ Stop the background writer, after a last flush. """
+        self._stop.set()
+        self.flush()
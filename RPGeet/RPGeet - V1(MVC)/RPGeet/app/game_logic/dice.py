@@ -0,0 +1,175 @@
+""" Dice expressions: parsed once into a compiled form, then rolled in batches with NumPy.
+
+Syntax (case and spaces around the operators ignored):
+    [repeat#] term (+|- term)*
+    term: an integer, or [count]d(sides|%)[kh|kl|dh|dl n], e.g. 4d6kh3 (4d6, keep the highest 3)
+
+'20#1d20+5' rolls 1d20+5 twenty times. All the rows of an expression are rolled as one array, and
+every call draws from its own generator (seeded on demand), so concurrent requests never share a
+random state.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+import re
+
+import numpy as np
+
+MAX_REPEAT = 10_000
+MAX_SIDES = 1_000
+MAX_DICE = 1_000_000
+""" Dice rolled at most by a single call (repeat x count of every term). """
+MAX_CONSTANT = 10 ** 9
+""" Largest absolute value of a constant term and of the constant total, well within int64. """
+
+_TERM = re.compile(r'([+-])?(?:(\d*)d(\d+|%)(?:(kh|kl|dh|dl|k)(\d+))?|(\d+))')
+
+class DiceTerm(NamedTuple):
+    sign: int
+    count: int
+    sides: int
+    keep: int
+    highest: bool
+    """ Whether the kept dice are the highest ones (the lowest otherwise). """
+
+class DiceExpression(NamedTuple):
+    text: str
+    repeat: int
+    terms: tuple[DiceTerm, ...]
+    constant: int
+
+    @property
+    def dice(self) -> int:
+        """ Number of dice rolled by the expression. """
+        return self.repeat * sum(term.count for term in self.terms)
+
+class DiceRoll(NamedTuple):
+    expression: DiceExpression
+    totals: np.ndarray
+    """ Total of each row, shape (repeat,). """
+    faces: tuple[np.ndarray, ...]
+    """ Faces rolled by each dice term, shape (repeat, count), kept or not. """
+
+@lru_cache(maxsize=512)
+def parse(text : str) -> DiceExpression:
+    """
+    Compile a dice expression.
+
+    :param text: The expression, e.g. '4d6kh3+2' or '20#1d20+5'
+    :type text: str
+    :return: The compiled expression
+    :rtype: DiceExpression
+    :raises ValueError: If the expression is invalid or rolls too many dice
+    """
+    source = re.sub(r'\s*([#+-])\s*', r'\1', text.strip().lower()) # Spaces around the operators only
+    repeat = 1
+    if '#' in source:
+        head, _, source = source.partition('#')
+        if not head.isdigit() or not 1 <= int(head) <= MAX_REPEAT:
+            raise ValueError(f"The repetitions of '{text}' must be between 1 and {MAX_REPEAT}")
+        repeat = int(head)
+
+    terms, constant, position = [], 0, 0
+    while position < len(source):
+        match = _TERM.match(source, position)
+        if match is None or (match.group(1) is None and position > 0):
+            raise ValueError(f"Invalid dice expression '{text}' at '{source[position:]}'")
+        sign = -1 if match.group(1) == '-' else 1
+        count, sides, keep_kind, keep_n, number = match.group(2, 3, 4, 5, 6)
+        if number is not None:
+            if int(number) > MAX_CONSTANT:
+                raise ValueError(f"Constants of '{text}' must be at most {MAX_CONSTANT}")
+            constant += sign * int(number)
+        else:
+            count = int(count) if count else 1
+            sides = 100 if sides == '%' else int(sides)
+            if count < 1:
+                raise ValueError(f"'{text}' rolls no dice")
+            if not 1 <= sides <= MAX_SIDES:
+                raise ValueError(f"Dice of '{text}' must have between 1 and {MAX_SIDES} sides")
+            keep, highest = count, True
+            if keep_kind is not None:
+                n = int(keep_n)
+                if n > count:
+                    raise ValueError(f"'{text}' keeps or drops more dice than it rolls")
+                keep, highest = {'k': (n, True), 'kh': (n, True), 'kl': (n, False),
+                                 'dh': (count - n, False), 'dl': (count - n, True)}[keep_kind]
+            terms.append(DiceTerm(sign, count, sides, keep, highest))
+        position = match.end()
+    if position == 0:
+        raise ValueError("Empty dice expression")
+    if abs(constant) > MAX_CONSTANT:
+        raise ValueError(f"The constant total of '{text}' must be at most {MAX_CONSTANT}")
+
+    expression = DiceExpression(text, repeat, tuple(terms), constant)
+    if expression.dice > MAX_DICE:
+        raise ValueError(f"'{text}' rolls more than {MAX_DICE} dice")
+    return expression
+
+def generator(seed : int | None = None) -> np.random.Generator:
+    """
+    :param seed: The seed, for reproducible rolls; None draws one from the OS
+    :type seed: int | None
+    :return: A new random generator, to use by a single thread
+    :rtype: numpy.random.Generator
+    """
+    return np.random.default_rng(seed)
+
+def roll(expression : str | DiceExpression, rng : np.random.Generator | None = None) -> DiceRoll:
+    """
+    Roll every row of an expression at once.
+
+    :param expression: The expression, compiled or not
+    :type expression: str | DiceExpression
+    :param rng: The generator to draw from, a new one if None
+    :type rng: numpy.random.Generator | None
+    :return: The totals and the rolled faces
+    :rtype: DiceRoll
+    :raises ValueError: If the expression is invalid
+    """
+    if isinstance(expression, str):
+        expression = parse(expression)
+    rng = rng if rng is not None else generator()
+
+    totals = np.full(expression.repeat, expression.constant, dtype=np.int64)
+    faces = []
+    for term in expression.terms:
+        rolled = rng.integers(1, term.sides, size=(expression.repeat, term.count), endpoint=True)
+        kept = rolled
+        if term.keep < term.count:
+            kept = np.sort(rolled, axis=1)
+            kept = kept[:, term.count - term.keep:] if term.highest else kept[:, :term.keep]
+        totals += term.sign * kept.sum(axis=1)
+        faces.append(rolled)
+    return DiceRoll(expression, totals, tuple(faces))
+
+def roll_batch(expressions : list[str], seed : int | None = None) -> list[DiceRoll]:
+    """
+    Roll several expressions from one generator. Repeated expressions (e.g. the same attack for
+    30 monsters) are rolled together as the rows of a single evaluation.
+
+    :param expressions: The expressions, in the order of the results
+    :type expressions: list[str]
+    :param seed: The seed of the generator, for reproducible rolls
+    :type seed: int | None
+    :return: The roll of each expression
+    :rtype: list[DiceRoll]
+    :raises ValueError: If an expression is invalid, or all of them roll too many dice
+    """
+    compiled = [parse(text) for text in expressions]
+    if sum(expression.dice for expression in compiled) > MAX_DICE:
+        raise ValueError(f"These rolls use more than {MAX_DICE} dice")
+
+    positions: dict[DiceExpression, list[int]] = {}
+    for i, expression in enumerate(compiled):
+        positions.setdefault(expression, []).append(i)
+
+    rng = generator(seed)
+    results: list[DiceRoll | None] = [None] * len(compiled)
+    for expression, indexes in positions.items():
+        rows = expression.repeat
+        batch = roll(expression._replace(repeat=rows * len(indexes)), rng)
+        for n, i in enumerate(indexes):
+            part = slice(n * rows, (n + 1) * rows)
+            results[i] = DiceRoll(expression, batch.totals[part], tuple(f[part] for f in batch.faces))
+    return results
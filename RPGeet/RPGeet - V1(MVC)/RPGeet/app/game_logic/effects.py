@@ -0,0 +1,79 @@
+""" Timed effects of a combat (spells, conditions, ...), indexed by the round they expire.
+
+The effects of a combat state are a heap of [expires, id, participant_id, name] entries in
+state['effects'], ordered by expiry round. Ending rounds only pops the effects that expire, and
+the remaining duration of an effect is computed when displayed.
+"""
+
+import heapq
+
+EXPIRES, ID, PARTICIPANT, NAME = range(4)
+
+def upgrade_state(state : dict) -> dict:
+    """
+    Move the effects of the participants of states saved by a previous version to the heap.
+    """
+    if 'effects' not in state:
+        state['effects'] = []
+        state['next_effect'] = 1
+        for p in state['participants'].values():
+            for e in p.pop('effects', []):
+                add(state, p['id'], e['name'], e['duration'])
+    return state
+
+def add(state : dict, participant_id : int, name : str, duration : int) -> list:
+    """
+    Apply an effect for a number of rounds, the current one included.
+
+    :param participant_id: The participant affected
+    :type participant_id: int
+    :param name: The displayed name of the effect
+    :type name: str
+    :param duration: The number of rounds, at least 1
+    :type duration: int
+    :return: The new heap entry
+    :rtype: list
+    """
+    entry = [state['round'] + max(duration, 1), state['next_effect'], participant_id, name]
+    state['next_effect'] += 1
+    heapq.heappush(state['effects'], entry)
+    return entry
+
+def expire(state : dict) -> list[list]:
+    """
+    Remove the effects whose last round ended.
+
+    :return: The expired entries, by expiry round
+    :rtype: list[list]
+    """
+    heap = state['effects']
+    expired = []
+    while heap and heap[0][EXPIRES] <= state['round']:
+        expired.append(heapq.heappop(heap))
+    return expired
+
+def remove_participant(state : dict, participant_id : int) -> list[list]:
+    """
+    Drop the effects of a participant leaving the combat.
+
+    :return: The removed entries
+    :rtype: list[list]
+    """
+    heap, removed = [], []
+    for entry in state['effects']:
+        (removed if entry[PARTICIPANT] == participant_id else heap).append(entry)
+    if removed:
+        heapq.heapify(heap)
+        state['effects'] = heap
+    return removed
+
+def by_participant(state : dict) -> dict[int, list[dict]]:
+    """
+    :return: The active effects of each participant with their remaining rounds, soonest expiring first
+    :rtype: dict[int, list[dict]]
+    """
+    grouped = {}
+    for entry in sorted(state['effects']):
+        grouped.setdefault(entry[PARTICIPANT], []).append(
+            {'id': entry[ID], 'name': entry[NAME], 'duration': entry[EXPIRES] - state['round']})
+    return grouped
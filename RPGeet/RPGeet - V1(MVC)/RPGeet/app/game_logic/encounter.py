@@ -0,0 +1,260 @@
+""" Monte Carlo encounter simulator, for the GM to balance a fight before running it.
+
+Every trial of a fight is a row of NumPy arrays: each round, the attacks of all the living
+combatants are resolved for all the trials at once, so the Python loop only runs over
+rounds x combatants. Rounds are simultaneous (a combatant dropped this round still strikes back),
+each attacker picks a random living enemy, and a combatant with a save_damage effect (breath,
+fireball) uses it on the first round against every enemy instead of attacking.
+
+Large batches are split across a process pool, each chunk with its own independent seed. The cost
+of a simulation grows with trials x combatants x rounds (its work), which decides whether the pool
+is used and is bounded, as the request waits for it.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+
+from app.game_logic.probability import distribution
+
+PARTY, FOES = 0, 1
+SAVES = ('fort', 'ref', 'will')
+
+class Combatant(NamedTuple):
+    name: str
+    side: int
+    """ PARTY or FOES. """
+    hp: int
+    ac: int
+    attack: int
+    """ Attack bonus of its attack roll. """
+    damage: str
+    """ Dice expression of its damage, e.g. '1d8+3'. """
+    saves: tuple[int, int, int] = (0, 0, 0)
+    """ Fortitude, Reflex and Will bonuses. """
+    save_dc: int = 0
+    """ DC of its first-round effect, 0 for none. """
+    save: str = 'ref'
+    """ Saving throw against its effect, among SAVES. """
+    save_damage: str = ''
+    """ Damage of its effect, halved on a successful save. """
+
+class EncounterReport(NamedTuple):
+    trials: int
+    party_wins: float
+    foes_wins: float
+    draws: float
+    """ Share of the trials with both sides down at once, or still running after max_rounds. """
+    mean_rounds: float
+    """ Rounds of the decided trials. """
+    party_hp_lost: float
+    """ Share of the party's total HP lost, on average. """
+    combatants: list[dict]
+    """ For each combatant: name, side, hp, damage, survival (share of the trials it ends standing) and mean_hp_left. """
+    assumptions: tuple[str, ...] = ()
+    """ What the simulated stats guess rather than read from the characters, to show with the report. """
+
+    def as_dict(self) -> dict:
+        return self._asdict()
+
+# ==================
+# SIMULATION
+# ==================
+
+@lru_cache(maxsize=256)
+def _sampler(expression : str) -> tuple[int, np.ndarray]:
+    d = distribution(expression)
+    return d.minimum, np.cumsum(d.pmf)
+
+def _sample(rng : np.random.Generator, expression : str, size) -> np.ndarray:
+    minimum, cdf = _sampler(expression)
+    totals = minimum + np.searchsorted(cdf, rng.random(size) * cdf[-1], side='right')
+    return np.maximum(totals, 1) # Damage deals at least 1
+
+def _d20_success(rng : np.random.Generator, bonus, target, size) -> np.ndarray:
+    d20 = rng.integers(1, 20, size=size, endpoint=True)
+    return (d20 == 20) | ((d20 != 1) & (d20 + bonus >= target))
+
+def simulate_chunk(combatants : list[Combatant], trials : int, seed, max_rounds : int) -> dict[str, np.ndarray]:
+    """
+    Run trials of a fight in this process.
+
+    :return: Sums over the trials, to merge with other chunks: 'wins' (party, foes, draws),
+        'rounds' (sum over the decided trials), 'standing' and 'hp_left' (per combatant)
+    :rtype: dict[str, numpy.ndarray]
+    """
+    rng = np.random.default_rng(seed)
+    n = len(combatants)
+    side = np.array([c.side for c in combatants])
+    ac = np.array([c.ac for c in combatants])
+    saves = np.array([c.saves for c in combatants])
+    hp = np.tile(np.array([c.hp for c in combatants], dtype=np.int64), (trials, 1)) # trials x combatants
+    enemies = [np.flatnonzero(side != c.side) for c in combatants]
+    rows = np.arange(trials)
+
+    running = np.ones(trials, dtype=bool)
+    winner = np.full(trials, 2) # Draw until a side falls
+    rounds = np.zeros(trials, dtype=np.int64)
+    for round_ in range(1, max_rounds + 1):
+        alive = hp > 0
+        damage = np.zeros_like(hp)
+        for i, c in enumerate(combatants):
+            acting = running & alive[:, i]
+            foes = enemies[i]
+            if not acting.any() or not len(foes):
+                continue
+            if round_ == 1 and c.save_dc:
+                # Area effect: one damage roll, each enemy saves for half
+                rolled = _sample(rng, c.save_damage, trials)
+                saved = _d20_success(rng, saves[foes, SAVES.index(c.save)], c.save_dc, (trials, len(foes)))
+                hit = np.where(saved, rolled[:, None] // 2, rolled[:, None])
+                damage[:, foes] += np.where(acting[:, None] & alive[:, foes], hit, 0)
+                continue
+            # Random living enemy: the highest of random scores, the dead ones excluded
+            scores = np.where(alive[:, foes], rng.random((trials, len(foes))), -1.0)
+            target = foes[scores.argmax(axis=1)]
+            hits = acting & alive[rows, target] & _d20_success(rng, c.attack, ac[target], trials)
+            np.add.at(damage, (rows[hits], target[hits]), _sample(rng, c.damage, trials)[hits])
+        hp -= np.where(running[:, None], damage, 0)
+
+        alive = hp > 0
+        party_up = (alive & (side == PARTY)).any(axis=1)
+        foes_up = (alive & (side == FOES)).any(axis=1)
+        ended = running & ~(party_up & foes_up)
+        winner[ended] = np.where(party_up[ended], PARTY, np.where(foes_up[ended], FOES, 2))
+        rounds[ended] = round_
+        running &= ~ended
+        if not running.any():
+            break
+
+    decided = winner != 2
+    return {
+        'wins': np.bincount(winner, minlength=3),
+        'decided': np.array([decided.sum()]),
+        'rounds': np.array([rounds[decided].sum()]),
+        'standing': (hp > 0).sum(axis=0),
+        'hp_left': np.maximum(hp, 0).sum(axis=0),
+    }
+
+def _report(combatants : list[Combatant], trials : int, totals : dict[str, np.ndarray]) -> EncounterReport:
+    wins = totals['wins'] / trials
+    max_hp = np.array([c.hp for c in combatants])
+    party = np.array([c.side == PARTY for c in combatants])
+    hp_left = totals['hp_left'] / trials
+    party_hp = max_hp[party].sum()
+    return EncounterReport(
+        trials=trials,
+        party_wins=float(wins[PARTY]),
+        foes_wins=float(wins[FOES]),
+        draws=float(wins[2]),
+        mean_rounds=float(totals['rounds'][0] / totals['decided'][0]) if totals['decided'][0] else 0.0,
+        party_hp_lost=float(1 - hp_left[party].sum() / party_hp) if party_hp else 0.0,
+        combatants=[{'name': c.name, 'side': 'party' if c.side == PARTY else 'foes', 'hp': c.hp, 'damage': c.damage,
+                     'survival': float(totals['standing'][i] / trials), 'mean_hp_left': float(hp_left[i])}
+                    for i, c in enumerate(combatants)],
+    )
+
+# ==================
+# SIMULATOR
+# ==================
+
+class EncounterSimulator:
+    """
+    Runs the simulations, in the calling thread for small batches and across a process pool
+    (started on first use, with the spawn method: forking a threaded server is unsafe) from
+    pool_threshold work on.
+
+    The work of a simulation is trials x combatants x max_rounds, the number of attacks resolved at
+    worst (a fight nobody wins): about 20 million per second and core. max_work bounds the work of
+    each process, so a simulation split across the pool can do workers x max_work.
+    """
+    def __init__(self, workers : int = 0, pool_threshold : int = 5_000_000, max_trials : int = 200_000,
+                 max_rounds : int = 50, max_work : int = 20_000_000):
+        self.workers = workers or min(os.cpu_count() or 1, 4)
+        self.pool_threshold = pool_threshold
+        self.max_trials = max_trials
+        self.max_rounds = max_rounds
+        self.max_work = max_work
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pooled(self) -> bool:
+        """ Whether large simulations are split across a process pool. """
+        return self.workers >= 2
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def run(self, combatants : list[Combatant], trials : int = 10_000, seed : int | None = None) -> EncounterReport:
+        """
+        Simulate a fight.
+
+        :param combatants: Both sides of the fight
+        :type combatants: list[Combatant]
+        :param trials: The number of simulated fights
+        :type trials: int
+        :param seed: The seed, for a reproducible report
+        :type seed: int | None
+        :return: The outcome of the fights
+        :rtype: EncounterReport
+        :raises ValueError: If a side is empty, a damage expression invalid or too large (see
+            probability.MAX_SUPPORT), or trials out of bounds
+        """
+        if not 1 <= trials <= self.max_trials:
+            raise ValueError(f"The number of trials must be between 1 and {self.max_trials}")
+        if {c.side for c in combatants} != {PARTY, FOES}:
+            raise ValueError("Both the party and the foes need at least one combatant")
+        work = trials * len(combatants) * self.max_rounds
+        max_work = self.max_work * self.workers if self.pooled else self.max_work
+        if work > max_work:
+            raise ValueError(f"A fight of {len(combatants)} combatants can be simulated "
+                             f"{max(max_work // (len(combatants) * self.max_rounds), 1)} times at most")
+        for c in combatants:
+            if c.save_dc and c.save not in SAVES:
+                raise ValueError(f"Unknown saving throw '{c.save}' of {c.name}")
+            for expression in (c.damage, c.save_damage) if c.save_dc else (c.damage,):
+                try:
+                    distribution(expression) # Here rather than in a worker
+                except ValueError as e:
+                    raise ValueError(f"Damage of {c.name}: {e}") from e
+
+        if work < self.pool_threshold or not self.pooled or trials < self.workers:
+            totals = simulate_chunk(combatants, trials, seed, self.max_rounds)
+        else:
+            sizes = [trials // self.workers + (i < trials % self.workers) for i in range(self.workers)]
+            seeds = np.random.SeedSequence(seed).spawn(self.workers)
+            pool = self._get_pool()
+            chunks = [pool.submit(simulate_chunk, combatants, size, s, self.max_rounds) for size, s in zip(sizes, seeds)]
+            totals = {}
+            for chunk in chunks:
+                for key, value in chunk.result().items():
+                    totals[key] = totals[key] + value if key in totals else value
+        return _report(combatants, trials, totals)
+
+simulator = EncounterSimulator()
+
+def init_app(app):
+    """
+    Configure the simulator from the application configuration.
+    """
+    global simulator
+    config = app.config
+    simulator.shutdown()
+    simulator = EncounterSimulator(config['ENCOUNTER_WORKERS'], config['ENCOUNTER_POOL_THRESHOLD'],
+                                   config['ENCOUNTER_MAX_TRIALS'], config['ENCOUNTER_MAX_ROUNDS'],
+                                   config['ENCOUNTER_MAX_WORK'])
@@ -8,125 +8,331 @@ def calculate_stats(character):
     Dummy function to calculate dynamic stats based on character data.
     In the future, this will query the DB for base stats, modifiers, active spells, etc.
     """
-    # Deterministic "random" stats based on character ID for consistency
-    random.seed(character['character_id'])
+    # Deterministic "random" stats based on character ID for consistency, from a private generator
+    rng = random.Random(character['character_id'])
     
     stats = {
         'Name': character['name'],
-        'Level': random.randint(1, 20),
-        'HP': random.randint(10, 100),
-        'AC': random.randint(10, 25),
-        'Strength': random.randint(8, 20),
-        'Dexterity': random.randint(8, 20),
-        'Constitution': random.randint(8, 20),}
+        'Level': rng.randint(1, 20),
+        'HP': rng.randint(10, 100),
+        'AC': rng.randint(10, 25),
+        'Strength': rng.randint(8, 20),
+        'Dexterity': rng.randint(8, 20),
+        'Constitution': rng.randint(8, 20),}
     
     return stats
 # Contains the "dummy" rules engine for calculating dynamic values.
 # Functions to calculate modifiers, initiative, etc.
 
-from app.models.core import Game, Character
+from app.models.core import db, Game, GameUser, Character, CombatState, CombatJournalEntry, CombatSnapshot
+from app.cache import reference_cache
+from app.game_logic.combat_store import CombatStore, MemoryCombatStore, SqlCombatStore
+from app.game_logic.combat_journal import CombatJournal, CombatJournalError, MemoryCombatJournal, SqlCombatJournal
+from app.game_logic import combat_actions, combat_events, dice, effects, encounter, initiative
+from flask import current_app
+import importlib
 import random
-try:
-    import app.game_logic.pathfinder1 as pf1
-except ImportError:
-    pf1 = None
+import threading
 
-def calculate_stats(character_dict, game_id=None):
+# ==================
+# RULES REGISTRY
+# ==================
+
+RULES_MODULES = {
+    'pathfinder1': 'app.game_logic.pathfinder1',
+}
+""" Rules module of each game system, keyed by GameSystem.schema_name. """
+
+_rules_lock = threading.Lock()
+_loaded_rules = {}
+_game_systems: dict[int, int] = {}
+
+def get_rules(schema_name : str):
+    """
+    Return the rules module of a game system, importing it on first use only.
+
+    If the module defines configure(config), it is called once with the application config.
+
+    :param schema_name: The schema name of the game system
+    :type schema_name: str
+    :return: The rules module, or None if the system has no rules module
+    """
+    if schema_name in _loaded_rules:
+        return _loaded_rules[schema_name]
+    with _rules_lock:
+        if schema_name not in _loaded_rules:
+            module = None
+            if schema_name in RULES_MODULES:
+                module = importlib.import_module(RULES_MODULES[schema_name])
+                if hasattr(module, 'configure'):
+                    module.configure(current_app.config)
+            _loaded_rules[schema_name] = module
+    return _loaded_rules[schema_name]
+
+def get_game_system_id(game_id : int) -> int | None:
+    """
+    Return the system of a game. Games never change system, so the mapping is cached for the lifetime of the process.
+
+    :param game_id: The ID of the game
+    :type game_id: int
+    :return: The system ID, or None if the game does not exist
+    :rtype: int | None
+    """
+    if game_id not in _game_systems:
+        system_id = db.session.query(Game.system_id).filter(Game.game_id == game_id).scalar()
+        if system_id is None:
+            return None
+        _game_systems[game_id] = system_id
+    return _game_systems[game_id]
+
+def get_game_rules(game_id : int | None):
+    """
+    Return the rules module of the system a game is played with.
+
+    :param game_id: The ID of the game
+    :type game_id: int | None
+    :return: The rules module, or None for unknown games and systems without rules
+    """
+    if not game_id:
+        return None
+    system = reference_cache.get('core.game_systems').get(get_game_system_id(game_id))
+    return get_rules(system.schema_name) if system else None
+
+def calculate_stats(character_id, game_id=None):
     """
     Calculate dynamic stats based on character data and game system.
     """
-    stats = {}
-    
-    # Identify system
-    system_name = "Unknown"
-    if game_id:
-        game = Game.query.get(game_id)
-        if game:
-            print(f"DEBUG: Game found. ID={game_id}, SystemID={game.system_id}")
-            # TODO: Helper to get system name from ID, or just check ID
-            # For now, assuming system_id 1 is Pathfinder (based on init_dummy_db)
-            if game.system_id == 1: 
-                if pf1:
-                    print("DEBUG: Dispatching to Pathfinder Logic")
-                    return pf1.calculate_stats(character_dict['character_id'])
-                else:
-                    print("DEBUG: Pathfinder logic not loaded")
-                    stats['Error'] = "Pathfinder logic not loaded"
-            else:
-                 print(f"DEBUG: Unknown System ID {game.system_id}")
-        else:
-            print(f"DEBUG: Game not found for ID {game_id}")
-    else:
-        print("DEBUG: No game_id provided to calculate_stats")
+    rules = get_game_rules(game_id)
+    if rules:
+        return rules.calculate_stats(character_id)
 
     # Fallback / Dummy Logic
-    random.seed(character_dict['character_id'])
+    character = Character.query.get(character_id)
+    rng = random.Random(character_id) # Deterministic per character, without touching the global generator
     
-    stats.update({
-        'Name': character_dict['name'],
-        'System': system_name,
-        'Level': random.randint(1, 20),
-        'HP': random.randint(10, 100),
-        'AC': random.randint(10, 25),
-        'Strength': random.randint(8, 20),
-        'Dexterity': random.randint(8, 20),
-        'Constitution': random.randint(8, 20),
-        'Intelligence': random.randint(8, 20),
-        'Wisdom': random.randint(8, 20),
-        'Charisma': random.randint(8, 20),
-        'Active Effects': ['Bless', 'Haste'] if random.random() > 0.5 else ['None']
-    })
-    
-    return stats
+    return {
+        'Name': character.name if character else "Unknown",
+        'System': "Unknown",
+        'Level': rng.randint(1, 20),
+        'HP': rng.randint(10, 100),
+        'AC': rng.randint(10, 25),
+        'Strength': rng.randint(8, 20),
+        'Dexterity': rng.randint(8, 20),
+        'Constitution': rng.randint(8, 20),
+        'Intelligence': rng.randint(8, 20),
+        'Wisdom': rng.randint(8, 20),
+        'Charisma': rng.randint(8, 20),
+        'Active Effects': ['Bless', 'Haste'] if rng.random() > 0.5 else ['None']
+    }
+
+def calculate_odds(stats, target, game_id=None):
+    """
+    Chances of success of the checks of a character sheet against a target number.
+
+    :return: The probabilities keyed by check, empty for systems without rules
+    :rtype: dict[str, float]
+    """
+    rules = get_game_rules(game_id)
+    if rules and hasattr(rules, 'check_odds') and 'Error' not in stats:
+        return rules.check_odds(stats, target)
+    return {}
 
 def update_character(character_id, form_data, game_id=None):
     """
     Update character data based on game system.
     """
-    if game_id:
-        game = Game.query.get(game_id)
-        if game and game.system_id == 1:
-            if pf1:
-                return pf1.update_character(character_id, form_data)
-            else:
-                return False, "Pathfinder logic not loaded"
+    rules = get_game_rules(game_id)
+    if rules:
+        return rules.update_character(character_id, form_data)
     
     # Fallback
     return True, "Dummy update (no persistence)"
 
-# In-memory combat state: { game_id: { 'turn': 0, 'participants': [ { 'name': '...', 'initiative': 10, 'effects': [{'name': 'Bless', 'duration': 10}] } ] } }
-COMBAT_STATE = {}
+def invalidate_reference_data():
+    """
+    Drop the rules caches after an admin edit to the reference data (systems, sources).
+    """
+    reference_cache.invalidate()
+    for rules in list(_loaded_rules.values()):
+        if rules and hasattr(rules, 'invalidate_reference_data'):
+            rules.invalidate_reference_data()
+
+# ==================
+# COMBAT
+# ==================
+
+# Combat state of a game: { 'encounter': 1, 'seq': 12, 'round': 1, 'current': 0, 'next_id': 2, 'participants': { 1: { 'id': 1,
+# 'name': '...', 'initiative': 10, 'secondary': 2, 'tiebreak': 1.0, 'held': None, 'character_id': 3 } }, 'order': [1],
+# 'effects': [ [expires, id, participant_id, 'Bless'] ], 'next_effect': 2, 'undo': [...] }, see initiative.py, effects.py
+# and combat_actions.py. 'character_id' is only set for the characters of the game (see add_party).
+combat_store: CombatStore = MemoryCombatStore()
+combat_journal: CombatJournal | None = None
+
+def configure_combat_store(app):
+    """
+    Select the combat state backend from the COMBAT_STORE setting ('memory' or 'sql'), and the
+    journal from COMBAT_JOURNAL ('memory', 'sql' or '' for none). Must be called within an
+    application context.
+    """
+    global combat_store, combat_journal
+    combat_store.flush()
+    if app.config['COMBAT_STORE'] == 'sql':
+        combat_store = SqlCombatStore(db.engine, CombatState.__table__, app.config['COMBAT_WRITE_BEHIND'],
+                                      app.config['COMBAT_FLUSH_INTERVAL'])
+    else:
+        combat_store = MemoryCombatStore()
+
+    interval = app.config['COMBAT_SNAPSHOT_INTERVAL']
+    if app.config['COMBAT_JOURNAL'] == 'sql':
+        combat_journal = SqlCombatJournal(db.engine, CombatJournalEntry.__table__, CombatSnapshot.__table__, interval)
+    elif app.config['COMBAT_JOURNAL'] == 'memory':
+        combat_journal = MemoryCombatJournal(interval)
+    else:
+        combat_journal = None
+    combat_store.restore = combat_journal.restore if combat_journal else None
+
+def _run(game_id, command):
+    """
+    Apply a command to the combat of a game, journal it, then publish the changes to the players.
+
+    The command is journaled before the state is saved, in the same transaction with the SQL
+    store and journal.
+
+    :raises KeyError | ValueError: If the command doesn't apply (nothing is changed)
+    :raises CombatJournalError: If the combat had to be rebuilt from an inconsistent journal (nothing is changed)
+    """
+    journal = None
+    if combat_journal is not None:
+        journal = lambda state, conn: combat_journal.append(game_id, state, command, conn)
+    with combat_store.lock(game_id): # Journal and publications of a game stay in order
+        try:
+            with combat_store.mutate(game_id, journal) as state:
+                combat_actions.upgrade_state(state)
+                events = combat_actions.apply(state, command)
+        except CombatJournalError as e:
+            current_app.logger.error(f"Combat of game {game_id} not changed by {command['type']}: {e}")
+            raise
+        combat_events.broker.publish(game_id, events)
 
 def get_combat_state(game_id):
-    if game_id not in COMBAT_STATE:
-        COMBAT_STATE[game_id] = {'turn': 1, 'participants': []}
-    return COMBAT_STATE[game_id]
-
-def add_participant(game_id, name, initiative):
-    state = get_combat_state(game_id)
-    state['participants'].append({
-        'name': name,
-        'initiative': initiative,
-        'effects': [] # List of {name, duration}
-    })
-    # Sort by initiative descending
-    state['participants'].sort(key=lambda x: x['initiative'], reverse=True)
+    state = combat_actions.upgrade_state(combat_store.load(game_id))
+    state['active'] = initiative.active(state)
+    state['participants'] = initiative.ordered(state) # Listed in turn order for the page
+    active_effects = effects.by_participant(state)
+    for p in state['participants']:
+        p['effects'] = active_effects.get(p['id'], [])
+    return state
+
+def get_combat_snapshot(game_id):
+    """
+    :return: The combat state sent at the start of an event stream, with the number of the last
+        event it includes ('seq')
+    :rtype: dict
+    """
+    with combat_store.lock(game_id):
+        state = combat_actions.upgrade_state(combat_store.load(game_id))
+        seq = combat_events.broker.seq(game_id)
+    return dict(combat_actions.snapshot_event(state), seq=seq)
+
+def get_combat_history(game_id, limit=50):
+    """
+    :return: The last commands of the combat as (seq, encounter, command, time), latest first
+    :rtype: list[tuple]
+    """
+    return combat_journal.history(game_id, limit) if combat_journal is not None else []
+
+def add_participant(game_id, name, initiative_roll, secondary=0, character_id=None):
+    command = {'type': 'add', 'name': name, 'initiative': initiative_roll, 'secondary': secondary}
+    if character_id is not None:
+        command['extra'] = {'character_id': character_id}
+    _run(game_id, command)
+
+def get_game_characters(game_id):
+    """
+    :return: The (character_id, name) of the characters of a game
+    :rtype: list[tuple[int, str]]
+    """
+    return db.session.query(Character.character_id, Character.name).join(GameUser) \
+        .filter(GameUser.game_id == game_id).order_by(Character.name).all()
+
+def add_party(game_id):
+    """
+    Add every character of the game not in the combat yet, rolling their initiative with the
+    modifiers of the game system. The modifiers of the whole party are computed together.
+
+    :return: The number of characters added
+    :rtype: int
+    """
+    characters = get_game_characters(game_id)
+    rules = get_game_rules(game_id)
+    modifiers = {}
+    if rules and hasattr(rules, 'initiative_modifiers'):
+        modifiers = rules.initiative_modifiers([character_id for character_id, _ in characters])
+
+    with combat_store.lock(game_id): # Nobody adds the same characters meanwhile
+        state = combat_actions.upgrade_state(combat_store.load(game_id))
+        present = {p.get('character_id') for p in state['participants'].values()}
+        joining = [(character_id, name) for character_id, name in characters if character_id not in present]
+        party = []
+        if joining:
+            rolls = dice.roll(f"{len(joining)}#1d20").totals # The whole party in one draw
+            for (character_id, name), d20 in zip(joining, rolls.tolist()):
+                modifier, secondary = modifiers.get(character_id, (0, 0))
+                party.append({'character_id': character_id, 'name': name,
+                              'initiative': d20 + modifier, 'secondary': secondary})
+        if party:
+            _run(game_id, {'type': 'add_party', 'participants': party})
+    return len(party)
+
+def participant_character(game_id, participant_id):
+    """
+    :return: The ID of the character a participant of the combat stands for, None for the GM's creatures
+    :rtype: int | None
+    :raises KeyError: If the participant is not in the combat
+    """
+    state = combat_actions.upgrade_state(combat_store.load(game_id))
+    return state['participants'][participant_id].get('character_id')
+
+def remove_participant(game_id, participant_id):
+    _run(game_id, {'type': 'remove', 'id': participant_id})
+
+def hold_action(game_id, participant_id, action):
+    _run(game_id, {'type': 'hold', 'id': participant_id, 'action': action})
+
+def act_now(game_id, participant_id):
+    _run(game_id, {'type': 'act', 'id': participant_id})
 
 def next_turn(game_id):
-    state = get_combat_state(game_id)
-    state['turn'] += 1
-    # Decrease duration of effects
-    for p in state['participants']:
-        new_effects = []
-        for e in p['effects']:
-            e['duration'] -= 1
-            if e['duration'] > 0:
-                new_effects.append(e)
-        p['effects'] = new_effects
-
-def add_effect(game_id, participant_name, effect_name, duration):
-    state = get_combat_state(game_id)
-    for p in state['participants']:
-        if p['name'] == participant_name:
-            p['effects'].append({'name': effect_name, 'duration': duration})
-            break
\ No newline at end of file
+    _run(game_id, {'type': 'next'})
+
+def add_effect(game_id, participant_id, effect_name, duration):
+    _run(game_id, {'type': 'effect', 'participant_id': participant_id, 'name': effect_name, 'duration': duration})
+
+def simulate_encounter(game_id, foes, trials=10_000, seed=None):
+    """
+    Simulate the fight of the characters in the combat against foes.
+
+    :param foes: The stat blocks of the foes
+    :type foes: list[encounter.Combatant]
+    :return: The outcome of the simulated fights
+    :rtype: encounter.EncounterReport
+    :raises ValueError: If there is no character in the combat, or the simulation is invalid
+    """
+    state = combat_actions.upgrade_state(combat_store.load(game_id))
+    party = [p for p in initiative.ordered(state) if p.get('character_id') is not None]
+    rules = get_game_rules(game_id)
+    profiles = {}
+    if party and rules and hasattr(rules, 'combat_profiles'):
+        profiles = rules.combat_profiles([p['character_id'] for p in party])
+    combatants = [encounter.Combatant(p['name'], encounter.PARTY, **profiles[p['character_id']])
+                  for p in party if p['character_id'] in profiles]
+    if not combatants:
+        raise ValueError("Add the characters of the party to the combat first")
+    report = encounter.simulator.run(combatants + list(foes), trials, seed)
+    return report._replace(assumptions=tuple(getattr(rules, 'COMBAT_PROFILE_ASSUMPTIONS', ())))
+
+def undo(game_id, count=1):
+    _run(game_id, {'type': 'undo', 'count': count})
+
+def new_encounter(game_id):
+    _run(game_id, {'type': 'new_encounter'})
@@ -0,0 +1,180 @@
+""" Initiative order of a combat, kept sorted as participants come and go.
+
+Functions of this module change a combat state (see combat_store.new_state) in place:
+    'round': the current round, 'participants': the participants keyed by id, 'order': their ids
+    sorted by descending initiative, then descending secondary initiative (e.g. the Dexterity
+    modifier), then order of arrival, 'current': index in 'order' of the active participant (None
+    before the first turn).
+
+Participants are found by id in the dict; inserting one or finding its place is a binary search on
+the order, and the turn pointer is shifted instead of re-sorting the list.
+"""
+
+import bisect
+
+def order_key(participant : dict) -> tuple:
+    """
+    :return: The sort key of a participant, the smallest acting first
+    :rtype: tuple
+    """
+    return (-participant['initiative'], -participant['secondary'], participant['tiebreak'])
+
+def upgrade_state(state : dict) -> dict:
+    """
+    Fill in the keys missing from states saved by a previous version.
+    """
+    if 'round' not in state:
+        state['round'] = state.pop('turn', 1)
+        state['current'] = None
+        state['next_id'] = 1
+        for p in state['participants']:
+            p.setdefault('id', state['next_id'])
+            p.setdefault('secondary', 0)
+            p.setdefault('tiebreak', float(p['id']))
+            p.setdefault('held', None)
+            state['next_id'] = max(state['next_id'], p['id']) + 1
+    participants = state['participants']
+    if isinstance(participants, list):
+        state['order'] = [p['id'] for p in participants]
+        state['participants'] = {p['id']: p for p in participants}
+    elif participants and isinstance(next(iter(participants)), str):
+        state['participants'] = {int(pid): p for pid, p in participants.items()} # Keys of a state read back from JSON
+    return state
+
+def _key_of(state : dict):
+    participants = state['participants']
+    return lambda participant_id: order_key(participants[participant_id])
+
+def index_of(state : dict, participant_id : int) -> int:
+    """
+    :return: The position of the participant in the initiative order
+    :rtype: int
+    :raises KeyError: If there is no such participant
+    """
+    key = order_key(state['participants'][participant_id])
+    return bisect.bisect_left(state['order'], key, key=_key_of(state))
+
+def ordered(state : dict) -> list[dict]:
+    """
+    :return: The participants in initiative order
+    :rtype: list[dict]
+    """
+    participants = state['participants']
+    return [participants[participant_id] for participant_id in state['order']]
+
+def active(state : dict) -> dict | None:
+    """
+    :return: The participant whose turn it is, None before the first turn
+    :rtype: dict | None
+    """
+    current = state['current']
+    return state['participants'][state['order'][current]] if current is not None else None
+
+def _insert(state : dict, participant : dict) -> int:
+    index = bisect.bisect_right(state['order'], order_key(participant), key=_key_of(state))
+    state['order'].insert(index, participant['id'])
+    state['participants'][participant['id']] = participant
+    if state['current'] is not None and index <= state['current']:
+        state['current'] += 1 # The active participant was pushed back
+    return index
+
+def add(state : dict, name : str, initiative : int, secondary : int = 0, **extra) -> dict:
+    """
+    Add a participant at its place in the initiative order. Mid-round, a participant inserted
+    before the active one acts from the next round.
+
+    :param name: The displayed name
+    :type name: str
+    :param initiative: The initiative roll
+    :type initiative: int
+    :param secondary: The tie-breaker between equal initiatives, highest first
+    :type secondary: int
+    :return: The new participant
+    :rtype: dict
+    """
+    participant = {'id': state['next_id'], 'name': name, 'initiative': initiative, 'secondary': secondary,
+                   'tiebreak': float(state['next_id']), 'held': None, **extra}
+    state['next_id'] += 1
+    _insert(state, participant)
+    return participant
+
+def remove(state : dict, participant_id : int) -> dict:
+    """
+    Remove a participant. If it was active, the next one in the order becomes active.
+
+    :return: The removed participant
+    :rtype: dict
+    """
+    index = index_of(state, participant_id)
+    state['order'].pop(index)
+    participant = state['participants'].pop(participant_id)
+    current = state['current']
+    if current is not None:
+        if index < current:
+            state['current'] -= 1
+        elif index == current:
+            state['current'] -= 1 # next_turn moves to the participant that took its place
+            next_turn(state)
+    return participant
+
+def next_turn(state : dict) -> bool:
+    """
+    Give the turn to the next participant that isn't holding its action, starting a new round
+    after the last one.
+
+    :return: Whether a new round started
+    :rtype: bool
+    """
+    participants, order = state['participants'], state['order']
+    current = -1 if state['current'] is None else state['current']
+    new_round = False
+    for _ in range(len(order) + 1):
+        current += 1
+        if current >= len(order):
+            current = 0
+            state['round'] += 1
+            new_round = True
+        if not order or participants[order[current]]['held'] is None:
+            break
+    state['current'] = current if order else None
+    return new_round
+
+def hold(state : dict, participant_id : int, action : str):
+    """
+    Let the active participant delay or ready its action: it is skipped until it acts with act_now.
+
+    :param action: 'delay' or 'ready'
+    :type action: str
+    :raises ValueError: If the participant isn't the active one
+    """
+    participant = active(state)
+    if participant is None or participant['id'] != participant_id:
+        raise ValueError("Only the active participant can delay or ready its action")
+    participant['held'] = action
+    next_turn(state)
+
+def act_now(state : dict, participant_id : int):
+    """
+    Make a participant holding its action act right now, before the active one. Its initiative
+    becomes that of the active participant, so it keeps this place in the next rounds.
+    """
+    participant = state['participants'][participant_id]
+    index = index_of(state, participant_id)
+    if participant['held'] is None:
+        raise ValueError(f"{participant['name']} isn't holding its action")
+    interrupted = active(state)
+    if interrupted is None:
+        raise ValueError("The combat didn't start")
+    state['order'].pop(index)
+    if index < state['current']:
+        state['current'] -= 1
+    participant['held'] = None
+    participant['initiative'] = interrupted['initiative']
+    participant['secondary'] = interrupted['secondary']
+    # Tie-breaker between the one acting before (if tied with the interrupted one) and the interrupted one
+    previous = state['participants'][state['order'][state['current'] - 1]] if state['current'] > 0 else None
+    if previous is not None and order_key(previous)[:2] == order_key(interrupted)[:2]:
+        participant['tiebreak'] = (previous['tiebreak'] + interrupted['tiebreak']) / 2
+    else:
+        participant['tiebreak'] = interrupted['tiebreak'] - 1
+    state['current'] = _insert(state, participant) # Inserted right before the interrupted one
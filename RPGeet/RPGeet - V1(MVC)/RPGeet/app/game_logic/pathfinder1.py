@@ -1,5 +1,341 @@
 from app.models.pathfinder1 import P1Character, P1Statistics, P1Class, P1Race, P1Skill, P1Source, P1DescriptiveFeatures
+from app.models.pathfinder1 import P1RCharacterDeity, P1RClassesCharacter, P1RSkillCharacter, P1Modifier
+from app.models.pathfinder1 import P1NSource, P1Deity, P1ClassStats, P1ModifierType, P1NClassStatsCategory
 from app.models.core import db, Character
+from app.cache import LRUCache, reference_cache, index_rows
+from app.game_logic.probability import d20_success
+from app import timing
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload, Session
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+import itertools
+import threading
+
+# ==================
+# CHARACTER GRAPH SNAPSHOT
+# ==================
+
+class StatisticsSnapshot(NamedTuple):
+    max_hp: int
+    lethal_dmg: int
+    non_lethal_dmg: int
+    base_strength: Optional[int]
+    base_dexterity: Optional[int]
+    base_constitution: Optional[int]
+    base_intelligence: Optional[int]
+    base_wisdom: Optional[int]
+    base_charisma: Optional[int]
+
+class FeaturesSnapshot(NamedTuple):
+    age: int
+    gender: str
+    height: float
+    weight: float
+    hair_short_desc: str
+    eyes_short_desc: str
+    skin_short_desc: str
+
+class ClassSnapshot(NamedTuple):
+    class_id: int
+    class_name: Optional[str]
+    class_level: int
+    main_class: bool
+    # Class stats categories, None if the class has no class_stats
+    base_battle_bonus: Optional[int]
+    fortitude_save_cat: Optional[int]
+    reflex_save_cat: Optional[int]
+    will_save_cat: Optional[int]
+
+class ModifierSnapshot(NamedTuple):
+    id_modifier: int
+    modifier_type_id: int
+    value: int
+    duration: Optional[int]
+
+class SkillSnapshot(NamedTuple):
+    id_skill: int
+    skill_name: str
+    proficiency: bool
+    base_score: int
+
+class CharacterSnapshot(NamedTuple):
+    """
+    Immutable snapshot of a Pathfinder 1e character and everything the rules need to compute its sheet.
+    """
+    character_id: int
+    name: str
+    alignment: str
+    race_name: str
+    deity_name: str
+    statistics: Optional[StatisticsSnapshot]
+    features: Optional[FeaturesSnapshot]
+    classes: tuple[ClassSnapshot, ...]
+    modifiers: tuple[ModifierSnapshot, ...]
+    skills: tuple[SkillSnapshot, ...]
+
+# ==================
+# REFERENCE DATA
+# ==================
+
+@reference_cache.loader('pathfinder1.sources')
+def load_sources():
+    return index_rows(db.session.query(P1Source.__table__), 'source_id')
+
+@reference_cache.loader('pathfinder1.n_class_stats_categories')
+def load_class_stats_categories():
+    return index_rows(db.session.query(P1NClassStatsCategory.__table__), 'class_stats_category_id')
+
+@reference_cache.loader('pathfinder1.class_stats')
+def load_class_stats():
+    return index_rows(db.session.query(P1ClassStats.__table__), 'class_stats_id')
+
+@reference_cache.loader('pathfinder1.classes')
+def load_classes():
+    return index_rows(db.session.query(P1Class.__table__), 'class_id')
+
+@reference_cache.loader('pathfinder1.races')
+def load_races():
+    return index_rows(db.session.query(P1Race.__table__), 'race_id')
+
+@reference_cache.loader('pathfinder1.deities')
+def load_deities():
+    return index_rows(db.session.query(P1Deity.__table__), 'deity_id')
+
+@reference_cache.loader('pathfinder1.skills')
+def load_skills():
+    return index_rows(db.session.query(P1Skill.__table__), 'id_skill')
+
+@reference_cache.loader('pathfinder1.modifier_types')
+def load_modifier_types():
+    return index_rows(db.session.query(P1ModifierType.__table__), 'modifier_type_id')
+
+def load_character_graph(character_id : int) -> CharacterSnapshot | None:
+    """
+    Load a Pathfinder 1e character with its own rows (statistics, features, deities, classes,
+    modifiers, skills) in a constant number of queries, and freeze it into a snapshot.
+
+    Races, deities, classes, class stats and skills are resolved from the reference data cache.
+
+    :param character_id: The ID of the character to load
+    :type character_id: int
+    :return: The character snapshot, or None if no P1Character exists for this ID
+    :rtype: CharacterSnapshot | None
+    """
+    return load_character_graphs([character_id]).get(character_id)
+
+def load_character_graphs(character_ids) -> dict[int, CharacterSnapshot]:
+    """
+    Load several Pathfinder 1e characters at once, in the same constant number of queries as a
+    single one (e.g. the whole party of a game).
+
+    :param character_ids: The IDs of the characters to load
+    :return: The snapshots, keyed by character ID; characters without a P1Character are missing
+    :rtype: dict[int, CharacterSnapshot]
+    """
+    if not character_ids:
+        return {}
+    p1_chars = P1Character.query.options(
+        joinedload(P1Character.statistics),
+        joinedload(P1Character.descriptive_features),
+        selectinload(P1Character.deities),
+        selectinload(P1Character.classes),
+        selectinload(P1Character.modifiers),
+        selectinload(P1Character.skills),
+    ).filter(P1Character.character_id.in_(list(character_ids))).all()
+    return {p1_char.character_id: _snapshot(p1_char) for p1_char in p1_chars}
+
+def _snapshot(p1_char : P1Character) -> CharacterSnapshot:
+    sources = reference_cache.get('pathfinder1.sources')
+    races = reference_cache.get('pathfinder1.races')
+    deities = reference_cache.get('pathfinder1.deities')
+    classes_ref = reference_cache.get('pathfinder1.classes')
+    class_stats = reference_cache.get('pathfinder1.class_stats')
+    skills_ref = reference_cache.get('pathfinder1.skills')
+
+    race_name = "Unknown"
+    race = races.get(p1_char.race_id)
+    if race and race.source_id in sources:
+        race_name = sources[race.source_id].name
+
+    deity_name = "None"
+    if p1_char.deities and p1_char.deities[0].deity_id in deities:
+        deity_name = deities[p1_char.deities[0].deity_id].deity_name
+
+    s = p1_char.statistics
+    statistics = StatisticsSnapshot(
+        s.max_hp, s.lethal_dmg, s.non_lethal_dmg,
+        s.base_strength, s.base_dexterity, s.base_constitution,
+        s.base_intelligence, s.base_wisdom, s.base_charisma
+    ) if s else None
+
+    f = p1_char.descriptive_features
+    features = FeaturesSnapshot(
+        f.age, f.gender, f.height, f.weight,
+        f.hair_short_desc, f.eyes_short_desc, f.skin_short_desc
+    ) if f else None
+
+    classes = []
+    for c in p1_char.classes:
+        class_ = classes_ref.get(c.class_id)
+        cs = class_stats.get(class_.class_stats_id) if class_ else None
+        classes.append(ClassSnapshot(
+            c.class_id,
+            class_.class_name if class_ else None,
+            c.class_level,
+            c.main_class,
+            cs.base_battle_bonus if cs else None,
+            cs.fortitude_save_cat if cs else None,
+            cs.reflex_save_cat if cs else None,
+            cs.will_save_cat if cs else None
+        ))
+
+    modifiers = tuple(
+        ModifierSnapshot(m.id_modifier, m.modifier_type_id, m.value, m.duration)
+        for m in p1_char.modifiers
+    )
+    skills = tuple(
+        SkillSnapshot(r.id_skill, skills_ref[r.id_skill].skill_name, r.proficiency, r.base_score)
+        for r in p1_char.skills if r.id_skill in skills_ref
+    )
+
+    return CharacterSnapshot(
+        character_id=p1_char.character_id,
+        name=p1_char.name,
+        alignment=p1_char.alignement,
+        race_name=race_name,
+        deity_name=deity_name,
+        statistics=statistics,
+        features=features,
+        classes=tuple(classes),
+        modifiers=modifiers,
+        skills=skills
+    )
+
+# ==================
+# DERIVED STATS CACHE
+# ==================
+
+stats_cache = LRUCache(max_size=1024, ttl=30.0, name='pathfinder1.stats')
+"""
+Computed sheets, as { character_id: stats } stamped with their version_stamp.
+
+The versions are kept per process: a write served by another worker is only seen here once the
+entry expires, so the TTL (STATS_CACHE_TTL) bounds how long a sheet can be stale across workers.
+"""
+
+_versions_lock = threading.Lock()
+_character_versions: dict[int, int] = {}
+_reference_version = 0
+
+# Rows whose writes change the sheet of the character they belong to
+CHARACTER_TABLES = (P1Character, P1Modifier, P1RSkillCharacter, P1RClassesCharacter, P1RCharacterDeity)
+# Rules reference data, whose writes may change every sheet
+REFERENCE_TABLES = (P1NSource, P1Source, P1Race, P1Deity, P1Class, P1ClassStats, P1Skill, P1ModifierType, P1NClassStatsCategory)
+
+def configure(config):
+    """
+    Apply the application settings, called once by the rules registry when this module is loaded.
+    """
+    stats_cache.max_size = config.get('STATS_CACHE_SIZE', stats_cache.max_size)
+    stats_cache.ttl = config.get('STATS_CACHE_TTL', stats_cache.ttl)
+
+def version_stamp(character_id : int) -> tuple[int, int]:
+    """
+    :return: The current (character version, reference data version) of a character
+    :rtype: tuple[int, int]
+    """
+    return _character_versions.get(character_id, 0), _reference_version
+
+def invalidate_character(character_id : int):
+    """
+    Drop the cached sheet of a character after one of its rows changed.
+
+    :param character_id: The ID of the character
+    :type character_id: int
+    """
+    with _versions_lock:
+        _character_versions[character_id] = _character_versions.get(character_id, 0) + 1
+    stats_cache.pop(character_id)
+
+def invalidate_reference_data():
+    """
+    Drop every cached sheet after a change to the rules reference data.
+    """
+    global _reference_version
+    with _versions_lock:
+        _reference_version += 1
+    reference_cache.invalidate('pathfinder1.')
+    stats_cache.clear()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_p1_writes(session, flush_context):
+    """
+    Record the characters (or the reference data) touched by a flush, to invalidate them on commit.
+    """
+    pending = session.info.setdefault('p1_invalidations', set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, CHARACTER_TABLES):
+            pending.add(obj.character_id)
+        elif isinstance(obj, REFERENCE_TABLES):
+            pending.add(None)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_p1_invalidations(session):
+    for character_id in session.info.pop('p1_invalidations', ()):
+        if character_id is None:
+            invalidate_reference_data()
+        else:
+            invalidate_character(character_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_p1_invalidations(session):
+    session.info.pop('p1_invalidations', None)
+
+# ==================
+# MODIFIERS STACKING
+# ==================
+
+STACKING_MODIFIER_TYPES = frozenset({'Circumstance', 'Dodge', 'Untyped'})
+""" Modifier types whose bonuses stack; any other type only keeps its highest bonus. """
+
+class ModifierTypeRule(NamedTuple):
+    name: str
+    stacks: bool
+
+@reference_cache.loader('pathfinder1.modifier_type_rules')
+def get_modifier_type_rules() -> dict[int, ModifierTypeRule]:
+    """
+    Stacking rules of each modifier type, derived from pathfinder1.modifier_types.
+
+    :return: The rules, keyed by modifier_type_id
+    :rtype: dict[int, ModifierTypeRule]
+    """
+    return MappingProxyType({
+        t.modifier_type_id: ModifierTypeRule(t.modifier_type_name, t.modifier_type_name in STACKING_MODIFIER_TYPES)
+        for t in reference_cache.get('pathfinder1.modifier_types').values()
+    })
+
+def aggregate_modifiers(modifiers, rules : dict[int, ModifierTypeRule]) -> dict[str, int]:
+    """
+    Sum up modifiers by type in a single pass: stacking types add up, the others keep their highest bonus.
+
+    :param modifiers: The modifiers to aggregate (anything with modifier_type_id and value)
+    :param rules: The stacking rules, keyed by modifier_type_id
+    :type rules: dict[int, ModifierTypeRule]
+    :return: The total bonus of each modifier type, keyed by type name
+    :rtype: dict[str, int]
+    """
+    totals = {}
+    for m in modifiers:
+        rule = rules.get(m.modifier_type_id)
+        if rule is None:
+            rule = ModifierTypeRule(f"Type {m.modifier_type_id}", False)
+        if rule.stacks:
+            totals[rule.name] = totals.get(rule.name, 0) + m.value
+        elif m.value > totals.get(rule.name, 0):
+            totals[rule.name] = m.value
+    return totals
 
 def ensure_p1_character_exists(character_id):
     """
@@ -98,31 +434,105 @@ def ensure_p1_character_exists(character_id):
 
 def calculate_stats(character_id):
     """
-    Calculate stats for a Pathfinder 1e character.
+    Calculate stats for a Pathfinder 1e character, served from the stats_cache while
+    none of its rows nor the reference data changed.
+
+    The returned dict is shared with the cache and must not be mutated.
     """
-    p1_char = ensure_p1_character_exists(character_id)
+    stamp = version_stamp(character_id)
+    cached = stats_cache.get(character_id, stamp=stamp)
+    if cached is not None:
+        return cached
+
+    stats = compute_stats(character_id)
+    if 'Error' not in stats:
+        stats_cache.put(character_id, stats, stamp)
+    return stats
+
+def calculate_stats_batch(character_ids) -> dict[int, dict]:
+    """
+    Calculate the stats of several Pathfinder 1e characters, loading the ones missing from the
+    stats_cache together (see load_character_graphs) instead of one by one.
+
+    The returned dicts are shared with the cache and must not be mutated.
+
+    :param character_ids: The IDs of the characters
+    :return: The stats, keyed by character ID
+    :rtype: dict[int, dict]
+    """
+    results, stamps = {}, {}
+    for character_id in set(character_ids):
+        stamps[character_id] = version_stamp(character_id)
+        cached = stats_cache.get(character_id, stamp=stamps[character_id])
+        if cached is not None:
+            results[character_id] = cached
+
+    missing = stamps.keys() - results.keys()
+    with timing.phase('graph'):
+        graphs = load_character_graphs(missing)
+    absent = missing - graphs.keys()
+    if absent:
+        # First view of these characters: create their P1 defaults, then load them together
+        with timing.phase('ensure-p1'):
+            created = [character_id for character_id in absent if ensure_p1_character_exists(character_id)]
+        with timing.phase('graph'):
+            graphs.update(load_character_graphs(created))
+    for character_id in missing:
+        if character_id in graphs:
+            stats = stats_from_graph(graphs[character_id])
+        else:
+            stats = {'Error': 'Pathfinder character data not found could not be created'}
+        if 'Error' not in stats:
+            stats_cache.put(character_id, stats, stamps[character_id])
+        results[character_id] = stats
+    return results
+
+def initiative_modifiers(character_ids) -> dict[int, tuple[int, int]]:
+    """
+    :param character_ids: The IDs of the characters joining a combat
+    :return: The (initiative modifier, Dexterity modifier) of each character, the latter breaking
+        ties between equal initiatives
+    :rtype: dict[int, tuple[int, int]]
+    """
+    modifiers = {}
+    for character_id, stats in calculate_stats_batch(character_ids).items():
+        if 'Error' not in stats:
+            dex = next(a['mod'] for a in stats['attributes'] if a['key'] == 'dex')
+            modifiers[character_id] = (stats['initiative'], dex)
+    return modifiers
+
+def compute_stats(character_id):
+    """
+    Compute the stats of a Pathfinder 1e character from the database, bypassing the cache.
+    """
+    with timing.phase('graph'):
+        p1_char = load_character_graph(character_id)
     if not p1_char:
-        return {'Error': 'Pathfinder character data not found could not be created'}
-    
+        # First view of this character: create the P1 defaults, then load them
+        with timing.phase('ensure-p1'):
+            created = ensure_p1_character_exists(character_id)
+        if not created:
+            return {'Error': 'Pathfinder character data not found could not be created'}
+        with timing.phase('graph'):
+            p1_char = load_character_graph(character_id)
+        if not p1_char:
+            return {'Error': 'Pathfinder character data not found could not be created'}
+    return stats_from_graph(p1_char)
+
+def stats_from_graph(p1_char : CharacterSnapshot) -> dict:
+    """
+    Compute the stats of a Pathfinder 1e character from its loaded snapshot.
+    """
+    laps = timing.Laps('stats-')
     stats = {}
     
     # --- 1. Base Info ---
     stats['name'] = p1_char.name
     stats['player'] = "Unknown" 
     
-    race_name = "Unknown"
-    if p1_char.race and p1_char.race.source_id:
-        from app.models.pathfinder1 import P1Source
-        src = P1Source.query.get(p1_char.race.source_id)
-        if src: race_name = src.name 
-    stats['race'] = race_name
-    stats['alignment'] = p1_char.alignement
-    
-    if p1_char.deities:
-        d_rel = p1_char.deities[0]
-        stats['deity'] = d_rel.deity.deity_name if d_rel.deity else "None"
-    else:
-        stats['deity'] = "None"
+    stats['race'] = p1_char.race_name
+    stats['alignment'] = p1_char.alignment
+    stats['deity'] = p1_char.deity_name
     
     # --- 2. Attributes & Features ---
     def calc_mod(score): return (score - 10) // 2
@@ -153,8 +563,8 @@ def calculate_stats(character_id):
     # Store mods for easy access
     mods = {a['key']: a['mod'] for a in stats['attributes']}
     
-    if p1_char.descriptive_features:
-        f = p1_char.descriptive_features
+    if p1_char.features:
+        f = p1_char.features
         stats.update({'age': f.age, 'gender': f.gender, 'height': f.height, 'weight': f.weight, 'eyes': f.eyes_short_desc, 'hair': f.hair_short_desc})
     else:
         stats.update({'age': 0, 'gender': '', 'height': 0, 'weight': 0, 'eyes': '', 'hair': ''})
@@ -165,6 +575,8 @@ def calculate_stats(character_id):
     stats['hp_current'] = current_hp
     stats['hp_nonlethal'] = hp_nonlethal
 
+    laps.mark('attributes')
+
     # --- 3. Class Calculation (BAB & Base Saves) ---
     level = 0
     base_bab, base_fort, base_ref, base_will = 0, 0, 0, 0
@@ -173,18 +585,16 @@ def calculate_stats(character_id):
     for c in p1_char.classes:
         lvl = c.class_level
         level += lvl
-        c_name = c.class_.class_name if c.class_ else f"Class {c.class_id}"
+        c_name = c.class_name if c.class_name else f"Class {c.class_id}"
         class_names.append(f"{c_name} ({lvl})")
         
         # Stats logic
-        if c.class_ and c.class_.class_stats:
-            cs = c.class_.class_stats
-            
+        if c.base_battle_bonus is not None:
             # BAB: 3=Fast(1), 4=Medium(0.75), 5=Slow(0.5)
             # Note: Math.floor used in PF
-            if cs.base_battle_bonus == 3: base_bab += lvl
-            elif cs.base_battle_bonus == 4: base_bab += int(lvl * 0.75)
-            elif cs.base_battle_bonus == 5: base_bab += int(lvl * 0.5)
+            if c.base_battle_bonus == 3: base_bab += lvl
+            elif c.base_battle_bonus == 4: base_bab += int(lvl * 0.75)
+            elif c.base_battle_bonus == 5: base_bab += int(lvl * 0.5)
             
             # Saves: 1=Good(2 + lvl/2), 2=Poor(lvl/3)
             # Assuming these IDs from previous check
@@ -192,52 +602,29 @@ def calculate_stats(character_id):
                 if cat_id == 1: return 2 + int(level / 2)
                 return int(level / 3)
                 
-            base_fort += get_save(cs.fortitude_save_cat, lvl)
-            base_ref += get_save(cs.reflex_save_cat, lvl)
-            base_will += get_save(cs.will_save_cat, lvl)
+            base_fort += get_save(c.fortitude_save_cat, lvl)
+            base_ref += get_save(c.reflex_save_cat, lvl)
+            base_will += get_save(c.will_save_cat, lvl)
             
     stats['class_level'] = f"{', '.join(class_names)}" if level > 0 else "Level 1"
     stats['bab'] = base_bab
 
+    laps.mark('classes')
+
     # --- 4. Modifiers Aggregation ---
-    # Group modifiers by type to apply stacking rules
-    # Types: 2:Armor, 5:Deflection, 6:Dodge, 12:Natural, 15:Resistance, 17:Shield, 18:Size, 20:Untyped
-    # Stacking Rule: Max of each type, except Dodge(6) and Untyped(20) and Circumstance(3) stack.
-    
-    active_mods = p1_char.modifiers # Relationship
-    
-    def get_bonus_sum(target_types, specific_stat=None):
-        """
-        Calculate stacked bonus for a list of allowed modifier types.
-        TODO: filtering by 'stat' if modifiers have a target column (schema doesn't show one yet?)
-        
-        """
-        relevant_mods = [m for m in active_mods if m.modifier_type_id in target_types]
-        
-        # Stacking logic
-        stacking_types = [3, 6, 20] # Circumstance, Dodge, Untyped
-        type_groups = {}
-        total = 0
-        
-        for m in relevant_mods:
-            if m.modifier_type_id in stacking_types:
-                total += m.value
-            else:
-                current = type_groups.get(m.modifier_type_id, 0)
-                if m.value > current:
-                    type_groups[m.modifier_type_id] = m.value
-        
-        total += sum(type_groups.values())
-        return total
+    # Bucket all modifiers by type in one pass, applying the stacking rules of pathfinder1.modifier_types
+    bonuses = aggregate_modifiers(p1_char.modifiers, reference_cache.get('pathfinder1.modifier_type_rules'))
+
+    laps.mark('modifiers')
 
     # --- 5. AC Calculation ---
     # AC = 10 + Armor + Shield + Dex + Size + Dodge + Deflection + Natural
-    armor_bonus = get_bonus_sum([2]) # Armor
-    shield_bonus = get_bonus_sum([17]) # Shield
-    nat_armor = get_bonus_sum([12]) # Natural
-    deflection = get_bonus_sum([5]) # Deflection
-    dodge_bonus = get_bonus_sum([6]) # Dodge
-    size_bonus = get_bonus_sum([18]) # Size
+    armor_bonus = bonuses.get('Armor', 0)
+    shield_bonus = bonuses.get('Shield', 0)
+    nat_armor = bonuses.get('Natural Armor', 0)
+    deflection = bonuses.get('Deflection', 0)
+    dodge_bonus = bonuses.get('Dodge', 0)
+    size_bonus = bonuses.get('Size', 0)
     
     # AC Total
     stats['ac_total'] = 10 + armor_bonus + shield_bonus + mods['dex'] + size_bonus + dodge_bonus + deflection + nat_armor
@@ -247,10 +634,12 @@ def calculate_stats(character_id):
     stats['ac_flat'] = 10 + armor_bonus + shield_bonus + size_bonus + deflection + nat_armor
     stats['initiative'] = mods['dex'] # + Improved Init (feat/misc)
 
+    laps.mark('ac')
+
     # --- 6. Saves Calculation ---
     # Save = Base + Ability + Resistance + Luck + ...
     # We apply Resistance(15) to all for now as it's the most common (Cloak)
-    resistance = get_bonus_sum([15]) 
+    resistance = bonuses.get('Resistance', 0)
     
     stats['saves'] = [
         {'key': 'fort', 'name': 'Fortitude', 'total': base_fort + mods['con'] + resistance, 'base': base_fort, 'ability': mods['con'], 'magic': resistance, 'misc': 0},
@@ -264,12 +653,13 @@ def calculate_stats(character_id):
     stats['cmb'] = base_bab + mods['str'] + size_bonus
     stats['cmd'] = 10 + base_bab + mods['str'] + mods['dex'] + size_bonus + dodge_bonus + deflection
 
+    laps.mark('saves')
+
     # --- 8. Skills ---
     stats['skills'] = []
     if p1_char.skills:
         for r_skill in p1_char.skills:
-            s_def = r_skill.skill
-            s_name = s_def.skill_name.lower()
+            s_name = r_skill.skill_name.lower()
             
             # Simple Ability Mapping
             abil = 'int'
@@ -288,8 +678,8 @@ def calculate_stats(character_id):
             total = mods[abil] + ranks + misc_bonus + class_bonus
             
             stats['skills'].append({
-                'key': f"skill_{s_def.id_skill}",
-                'name': s_def.skill_name,
+                'key': f"skill_{r_skill.id_skill}",
+                'name': r_skill.skill_name,
                 'ability': abil,
                 'is_class': is_class,
                 'ranks': ranks,
@@ -301,9 +691,57 @@ def calculate_stats(character_id):
         stats['skills'].append({'key': 'none', 'name': 'No Skills', 'ability': 'int', 'ranks': 0, 'misc': 0})
 
     stats['weapons'] = [] 
+    laps.mark('skills')
     
     return stats
 
+def check_odds(stats : dict, target : int) -> dict[str, float]:
+    """
+    Chances of the d20 checks of a sheet against a target number: the DC of the saving throws,
+    the AC of the attack rolls, the CMD of the combat maneuvers.
+
+    :param stats: The stats computed by calculate_stats
+    :type stats: dict
+    :param target: The number to reach
+    :type target: int
+    :return: The probability of success of each save (by key), 'melee', 'ranged' and 'cmb'
+    :rtype: dict[str, float]
+    """
+    mods = {a['key']: a['mod'] for a in stats['attributes']}
+    odds = {save['key']: d20_success(save['total'], target) for save in stats['saves']}
+    odds['melee'] = d20_success(stats['bab'] + mods['str'], target)
+    odds['ranged'] = d20_success(stats['bab'] + mods['dex'], target)
+    odds['cmb'] = d20_success(stats['cmb'], target)
+    return odds
+
+COMBAT_PROFILE_ASSUMPTIONS = (
+    "Weapons are not modelled yet: every character is assumed to hit for 1d8 + Strength modifier (a longsword).",
+)
+""" What combat_profiles guesses, shown with the encounter reports. """
+
+def combat_profiles(character_ids) -> dict[int, dict]:
+    """
+    Fighting stats of characters for the encounter simulator (see encounter.Combatant), computed
+    for the whole party at once. The damage is assumed (see COMBAT_PROFILE_ASSUMPTIONS).
+
+    :param character_ids: The IDs of the characters
+    :return: hp, ac, attack, damage and saves of each character, keyed by ID
+    :rtype: dict[int, dict]
+    """
+    profiles = {}
+    for character_id, stats in calculate_stats_batch(character_ids).items():
+        if 'Error' in stats:
+            continue
+        strength = next(a['mod'] for a in stats['attributes'] if a['key'] == 'str')
+        profiles[character_id] = {
+            'hp': max(stats['hp_current'], 1),
+            'ac': stats['ac_total'],
+            'attack': stats['bab'] + strength,
+            'damage': f"1d8{strength:+d}" if strength else "1d8",
+            'saves': tuple(save['total'] for save in stats['saves']),
+        }
+    return profiles
+
 def update_character(character_id, form_data):
     """
     Update a Pathfinder 1e character from form data.
@@ -395,6 +833,8 @@ def update_character(character_id, form_data):
                         continue
 
         db.session.commit()
+        # Statistics and features rows carry no character_id, so invalidate explicitly
+        invalidate_character(character_id)
         return True, "Character saved successfully"
         
     except Exception as e:
@@ -0,0 +1,144 @@
+""" Exact outcome distributions of dice expressions (see dice.py), computed by convolution.
+
+A distribution is the probability of every total from its minimum to its maximum. The sum of
+independent terms is the convolution of their distributions, so NdS costs O(log N) convolutions
+and no sampling. Distributions are memoized per dice term and per expression, in bounded caches:
+the same few (1d20, 1d8, 2d6, ...) come back on every character sheet.
+"""
+
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from app.game_logic.dice import DiceExpression, parse
+
+MAX_KEEP_OUTCOMES = 1_000_000
+""" Combinations enumerated at most for a keep/drop term (e.g. 6^6 for 6d6kh3). """
+MAX_SUPPORT = 20_000
+""" Totals a distribution spans at most, counted as the sum of count x sides of its dice terms. """
+
+def support(expression : DiceExpression) -> int:
+    """
+    :return: The size of the exact distribution of an expression, as bounded by MAX_SUPPORT
+    :rtype: int
+    """
+    return sum(min(term.keep, term.count) * term.sides for term in expression.terms)
+
+class Distribution(NamedTuple):
+    minimum: int
+    pmf: np.ndarray
+    """ Probability of each total, from minimum to maximum (read-only). """
+
+    @property
+    def maximum(self) -> int:
+        return self.minimum + len(self.pmf) - 1
+
+    @property
+    def mean(self) -> float:
+        return float(np.dot(np.arange(self.minimum, self.maximum + 1), self.pmf))
+
+    def at_least(self, target : int) -> float:
+        """
+        :return: The probability of a total greater than or equal to target
+        :rtype: float
+        """
+        index = min(max(target - self.minimum, 0), len(self.pmf))
+        return float(self.pmf[index:].sum())
+
+    def as_dict(self) -> dict[int, float]:
+        return {self.minimum + i: float(p) for i, p in enumerate(self.pmf)}
+
+def _frozen(minimum : int, pmf : np.ndarray) -> Distribution:
+    pmf.flags.writeable = False # Shared by the caches
+    return Distribution(minimum, pmf)
+
+def add(a : Distribution, b : Distribution) -> Distribution:
+    """
+    :return: The distribution of the sum of two independent totals
+    :rtype: Distribution
+    """
+    return _frozen(a.minimum + b.minimum, np.convolve(a.pmf, b.pmf))
+
+def _power(pmf : np.ndarray, count : int) -> np.ndarray:
+    # Sum of count independent copies, by squaring
+    result = np.ones(1)
+    while count:
+        if count & 1:
+            result = np.convolve(result, pmf)
+        count >>= 1
+        if count:
+            pmf = np.convolve(pmf, pmf)
+    return result
+
+@lru_cache(maxsize=256)
+def dice_distribution(count : int, sides : int, keep : int | None = None, highest : bool = True) -> Distribution:
+    """
+    Distribution of the total of count dice with the given sides, keeping only the keep highest
+    (or lowest) ones if set.
+
+    :raises ValueError: If the distribution is too large, or a keep/drop term has too many combinations to enumerate
+    """
+    if (keep if keep is not None else count) * sides > MAX_SUPPORT:
+        raise ValueError(f"{count}d{sides} has too many outcomes for an exact distribution (at most {MAX_SUPPORT})")
+    die = np.full(sides, 1.0 / sides)
+    if keep is None or keep >= count:
+        return _frozen(count, _power(die, count))
+    if sides ** count > MAX_KEEP_OUTCOMES:
+        raise ValueError(f"{count}d{sides} keeping {keep} has too many combinations for an exact distribution")
+    faces = np.indices((sides,) * count).reshape(count, -1) + 1
+    faces.sort(axis=0)
+    kept = faces[count - keep:] if highest else faces[:keep]
+    totals = kept.sum(axis=0)
+    return _frozen(keep, np.bincount(totals - keep) / faces.shape[1])
+
+@lru_cache(maxsize=512)
+def distribution(expression : str | DiceExpression) -> Distribution:
+    """
+    Exact distribution of the total of a dice expression (a single row, without repeat).
+
+    :param expression: The expression, e.g. '2d6+3' or '1d20+7'
+    :type expression: str | DiceExpression
+    :return: The distribution of its total
+    :rtype: Distribution
+    :raises ValueError: If the expression is invalid, repeated or has more than MAX_SUPPORT outcomes
+    """
+    if isinstance(expression, str):
+        expression = parse(expression)
+    if expression.repeat != 1:
+        raise ValueError(f"'{expression.text}' is repeated: its rows have each the distribution of one")
+    if support(expression) > MAX_SUPPORT:
+        raise ValueError(f"'{expression.text}' has too many outcomes for an exact distribution (at most {MAX_SUPPORT})")
+
+    total = _frozen(expression.constant, np.ones(1))
+    for term in expression.terms:
+        d = dice_distribution(term.count, term.sides, term.keep if term.keep < term.count else None, term.highest)
+        if term.sign < 0:
+            d = _frozen(-d.maximum, d.pmf[::-1].copy())
+        total = add(total, d)
+    return total
+
+def d20_success(bonus : int, target : int) -> float:
+    """
+    Chance that a d20 check (attack roll, saving throw) succeeds, a natural 20 always succeeding
+    and a natural 1 always failing.
+
+    :param bonus: The total bonus of the check
+    :type bonus: int
+    :param target: The number to reach (AC, DC)
+    :type target: int
+    :return: The probability of success, between 0.05 and 0.95
+    :rtype: float
+    """
+    d20 = dice_distribution(1, 20)
+    needed = min(max(target - bonus, 2), 20) # Natural 1 fails, natural 20 succeeds
+    return d20.at_least(needed)
+
+def expected_damage(attack_bonus : int, target_ac : int, damage : str | DiceExpression) -> float:
+    """
+    :return: The mean damage of an attack against an armor class, misses included (damage at least 1 on a hit)
+    :rtype: float
+    """
+    d = distribution(damage)
+    totals = np.maximum(np.arange(d.minimum, d.maximum + 1), 1)
+    return d20_success(attack_bonus, target_ac) * float(np.dot(totals, d.pmf))
@@ -0,0 +1,333 @@
+""" Versioned SQL migrations of the core schema and of the game system schemas.
+
+Migrations are plain SQL files stored in "Database initialisation/migrations/<schema_name>/",
+named "<version>_<description>.sql" (e.g. 0001_fk_lookup_indexes.sql). Each one is applied in its
+own transaction and recorded in core.schema_migrations, so running the upgrade again only applies
+the new ones.
+
+Commands (from the project root):
+    flask db status     Lists the applied and pending migrations of each schema
+    flask db upgrade    Applies the pending migrations
+    flask db explain    Checks that the hot queries can be answered with index scans
+
+The models declare the same indexes, for the schemas created by db.create_all() (e.g. the SQLite
+stand-in of the tests and load test).
+"""
+
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from pathlib import Path
+from sqlalchemy import text
+from typing import NamedTuple
+import click
+import hashlib
+import json
+import re
+
+VERSION_TABLE = 'core.schema_migrations'
+MIGRATION_FILE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+ADVISORY_LOCK_ID = 0x52504765 # Serializes concurrent upgrades (e.g. several workers starting at once)
+
+class Migration(NamedTuple):
+    schema_name: str
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+class MigrationError(Exception):
+    """
+    Raised when a migration fails, or when an applied migration file has been modified since.
+    """
+
+# ==================
+# DISCOVERY
+# ==================
+
+def discover(schema_name : str, migrations_dir : Path) -> list[Migration]:
+    """
+    :param schema_name: The schema whose migrations are listed
+    :type schema_name: str
+    :param migrations_dir: The directory containing one sub-directory of migrations per schema
+    :type migrations_dir: Path
+    :return: The migrations of the schema, ordered by version
+    :rtype: list[Migration]
+    """
+    directory = migrations_dir / schema_name
+    if not directory.is_dir():
+        return []
+    migrations = []
+    for path in directory.iterdir():
+        match = MIGRATION_FILE.match(path.name)
+        if match:
+            migrations.append(Migration(schema_name, int(match.group(1)), match.group(2), path))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Duplicated migration version in {directory}")
+    return migrations
+
+def managed_schemas(conn) -> list[str]:
+    """
+    :return: The core schema followed by the schemas of the registered game systems
+    :rtype: list[str]
+    """
+    rows = conn.execute(text("SELECT schema_name FROM core.n_game_system ORDER BY system_id")).scalars()
+    return ['core'] + [name for name in dict.fromkeys(rows) if name and name != 'core']
+
+def ensure_version_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+                schema_name VARCHAR(64) NOT NULL,
+                version INTEGER NOT NULL,
+                name VARCHAR(255) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                CONSTRAINT schema_migrations_pk PRIMARY KEY (schema_name, version)
+        )
+    """))
+
+def applied_versions(conn, schema_name : str) -> dict[int, str]:
+    """
+    :return: The checksum of each applied migration of the schema, keyed by version
+    :rtype: dict[int, str]
+    """
+    rows = conn.execute(text(f"SELECT version, checksum FROM {VERSION_TABLE} WHERE schema_name = :schema_name"),
+                        {'schema_name': schema_name})
+    return {version: checksum.strip() for version, checksum in rows}
+
+def pending(conn, schema_name : str, migrations_dir : Path) -> list[Migration]:
+    """
+    :return: The migrations of the schema that are not applied yet
+    :rtype: list[Migration]
+    :raises MigrationError: If an applied migration file has been modified since
+    """
+    applied = applied_versions(conn, schema_name)
+    migrations = []
+    for migration in discover(schema_name, migrations_dir):
+        if migration.version not in applied:
+            migrations.append(migration)
+        elif applied[migration.version] != migration.checksum:
+            raise MigrationError(f"{migration.path.name} of {schema_name} has been modified after being applied, "
+                                 "add a new migration instead")
+    return migrations
+
+# ==================
+# UPGRADE
+# ==================
+
+def upgrade(engine, migrations_dir : Path, schemas : list[str] = None, log=print) -> list[Migration]:
+    """
+    Applies the pending migrations of the schemas, in version order, each in its own transaction.
+    Stops at the first failing migration (the previous ones stay applied).
+
+    :param engine: The engine of the database to migrate
+    :param migrations_dir: The directory containing one sub-directory of migrations per schema
+    :type migrations_dir: Path
+    :param schemas: The schemas to migrate, defaults to core and every game system schema
+    :type schemas: list[str]
+    :return: The applied migrations
+    :rtype: list[Migration]
+    :raises MigrationError: If a migration fails
+    """
+    done = []
+    with engine.connect() as conn:
+        with conn.begin():
+            ensure_version_table(conn)
+        if engine.dialect.name == 'postgresql':
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {'id': ADVISORY_LOCK_ID})
+            conn.commit()
+        try:
+            with conn.begin():
+                schemas = schemas or managed_schemas(conn)
+            for schema_name in schemas:
+                with conn.begin():
+                    todo = pending(conn, schema_name, migrations_dir)
+                for migration in todo:
+                    log(f"Applying {schema_name} {migration.path.name}")
+                    try:
+                        with conn.begin():
+                            conn.exec_driver_sql(migration.path.read_text(encoding='utf-8'))
+                            conn.execute(text(f"""
+                                INSERT INTO {VERSION_TABLE} (schema_name, version, name, checksum)
+                                VALUES (:schema_name, :version, :name, :checksum)
+                            """), {'schema_name': schema_name, 'version': migration.version,
+                                   'name': migration.name, 'checksum': migration.checksum})
+                    except Exception as e:
+                        raise MigrationError(f"{migration.path.name} of {schema_name} failed and was rolled back: {e}") from e
+                    done.append(migration)
+        finally:
+            if engine.dialect.name == 'postgresql':
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': ADVISORY_LOCK_ID})
+                conn.commit()
+    return done
+
+# ==================
+# INDEX USAGE CHECKS
+# ==================
+
+class HotQuery(NamedTuple):
+    sql: str
+    tables: frozenset[str]
+    """ Tables that must not be read with a sequential scan. """
+
+HOT_QUERIES = {
+    'lobby': HotQuery("""
+        SELECT g.game_id, g.name, gu.gamemaster
+        FROM core.r_game_user gu JOIN core.games g ON g.game_id = gu.game_id
+        WHERE gu.username = :username
+    """, frozenset({'r_game_user'})),
+    'membership': HotQuery("""
+        SELECT gu.id_game_user, gu.gamemaster FROM core.r_game_user gu
+        WHERE gu.game_id = :game_id AND gu.username = :username
+    """, frozenset({'r_game_user'})),
+    'game members': HotQuery("""
+        SELECT gu.username, gu.gamemaster FROM core.r_game_user gu WHERE gu.game_id = :game_id
+    """, frozenset({'r_game_user'})),
+    'characters of a user': HotQuery("""
+        SELECT c.character_id, c.name
+        FROM core.r_game_user gu JOIN core.characters c ON c.id_game_user = gu.id_game_user
+        WHERE gu.username = :username
+    """, frozenset({'r_game_user', 'characters'})),
+    'game sources': HotQuery("""
+        SELECT gs.source_id FROM core.r_game_sources gs WHERE gs.game_id = :game_id
+    """, frozenset({'r_game_sources'})),
+}
+""" Hot queries of the core schema, with the tables they must reach through an index. """
+
+SYSTEM_HOT_QUERIES = {
+    'pathfinder1': {
+        'character modifiers': HotQuery("""
+            SELECT m.modifier_type_id, m.value FROM pathfinder1.modifiers m WHERE m.character_id = :character_id
+        """, frozenset({'modifiers'})),
+        'character classes': HotQuery("""
+            SELECT rc.class_id, rc.class_level FROM pathfinder1.r_classes_character rc WHERE rc.character_id = :character_id
+        """, frozenset({'r_classes_character'})),
+        'character deities': HotQuery("""
+            SELECT rd.deity_id FROM pathfinder1.r_character_deity rd WHERE rd.character_id = :character_id
+        """, frozenset({'r_character_deity'})),
+        'character skills': HotQuery("""
+            SELECT rs.id_skill, rs.base_score FROM pathfinder1.r_skill_character rs WHERE rs.character_id = :character_id
+        """, frozenset({'r_skill_character'})),
+    },
+}
+""" Hot queries of the game system schemas, keyed by schema name. """
+
+HOT_QUERY_PARAMS = {'username': 'explain', 'game_id': 1, 'character_id': 1}
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(?:\w+\.)?(\w+)\s+(?:AS\s+)?(\w+)', re.IGNORECASE)
+SQLITE_TABLE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$') # "SCAN TABLE" before SQLite 3.36
+
+def _sequential_scans(plan : dict) -> list[str]:
+    """
+    :return: The relations read with a sequential scan anywhere in the plan
+    :rtype: list[str]
+    """
+    scans = [plan['Relation Name']] if plan.get('Node Type') == 'Seq Scan' else []
+    for child in plan.get('Plans', []):
+        scans += _sequential_scans(child)
+    return scans
+
+def _postgresql_sequential_scans(conn, sql : str) -> list[str]:
+    plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), HOT_QUERY_PARAMS).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return _sequential_scans(plan[0]['Plan'])
+
+def _sqlite_sequential_scans(conn, sql : str) -> list[str]:
+    """
+    SQLite plans name the tables by their alias in the query, and read a table without an index
+    on a "SCAN <alias>" step ("SCAN <alias> USING INDEX ..." going through an index).
+    """
+    aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql)}
+    scans = []
+    for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), HOT_QUERY_PARAMS):
+        match = SQLITE_TABLE_SCAN.match(row[-1])
+        if match:
+            scans.append(aliases.get(match.group(1), match.group(1)))
+    return scans
+
+def explain_hot_queries(conn, schemas : list[str]) -> dict[str, list[str]]:
+    """
+    Plans every hot query of the schemas with sequential scans disabled: on small tables the
+    planner rightfully prefers them, so this checks that an index CAN answer the query. SQLite,
+    which has no statistics before an ANALYZE, uses an index whenever one matches.
+
+    :return: The tables still read with a sequential scan, keyed by query name (empty when all use an index)
+    :rtype: dict[str, list[str]]
+    """
+    queries = dict(HOT_QUERIES) if 'core' in schemas else {}
+    for schema_name in schemas:
+        queries.update(SYSTEM_HOT_QUERIES.get(schema_name, {}))
+
+    postgresql = conn.dialect.name == 'postgresql'
+    sequential_scans = _postgresql_sequential_scans if postgresql else _sqlite_sequential_scans
+    failures = {}
+    with conn.begin():
+        if postgresql:
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, query in queries.items():
+            scanned = [table for table in sequential_scans(conn, query.sql) if table in query.tables]
+            if scanned:
+                failures[name] = scanned
+    return failures
+
+# ==================
+# CLI
+# ==================
+
+db_cli = AppGroup('db', help="Schema migrations.")
+
+def _engine():
+    from app.models.core import db
+    return db.engine
+
+@db_cli.command('status')
+def status_command():
+    """ Lists the applied and pending migrations of each schema. """
+    migrations_dir = current_app.config['MIGRATIONS_DIR']
+    with _engine().connect() as conn:
+        with conn.begin():
+            ensure_version_table(conn)
+            for schema_name in managed_schemas(conn):
+                applied = applied_versions(conn, schema_name)
+                for migration in discover(schema_name, migrations_dir):
+                    state = 'applied' if migration.version in applied else 'pending'
+                    click.echo(f"{schema_name:<16} {migration.path.name:<48} {state}")
+
+@db_cli.command('upgrade')
+@click.option('--schema', 'schemas', multiple=True, help="Schema to migrate (repeatable), defaults to all of them.")
+def upgrade_command(schemas):
+    """ Applies the pending migrations. """
+    try:
+        done = upgrade(_engine(), current_app.config['MIGRATIONS_DIR'], list(schemas), log=click.echo)
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{len(done)} migration(s) applied.")
+
+@db_cli.command('explain')
+def explain_command():
+    """ Checks that the hot queries can be answered with index scans. """
+    engine = _engine()
+    if engine.dialect.name not in ('postgresql', 'sqlite'):
+        raise click.ClickException("The plans are only checked on PostgreSQL and SQLite.")
+    with engine.connect() as conn:
+        with conn.begin():
+            schemas = managed_schemas(conn)
+        failures = explain_hot_queries(conn, schemas)
+    for name, tables in failures.items():
+        click.echo(f"{name}: sequential scan on {', '.join(tables)}")
+    if failures:
+        raise click.ClickException("Some hot queries can't use an index, run 'flask db upgrade'.")
+    click.echo("All hot queries use an index.")
+
+def init_app(app : Flask):
+    """
+    Registers the "flask db" commands.
+
+    :param app: The application
+    :type app: Flask
+    """
+    app.cli.add_command(db_cli)
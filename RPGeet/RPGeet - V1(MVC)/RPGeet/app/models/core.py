@@ -1,8 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import exists, and_
+from app.cache import LRUCache, reference_cache, index_rows
+from app import passwords
+from datetime import datetime
+from typing import NamedTuple
+import threading
 
 db = SQLAlchemy()
 
@@ -16,7 +20,10 @@ class GameSystem(db.Model):
 
 class Source(db.Model):
     __tablename__ = 'n_sources'
-    __table_args__ = {'schema': 'core'}
+    __table_args__ = (
+        db.Index('n_sources_system_id_idx', 'system_id'),
+        {'schema': 'core'}
+    )
     
     source_id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(nullable=False)
@@ -35,7 +42,10 @@ class Game(db.Model):
     
 class GameSources(db.Model):
     __tablename__ = 'r_game_sources'
-    __table_args__ = {'schema': 'core'}
+    __table_args__ = (
+        db.UniqueConstraint('game_id', 'source_id', name='r_game_sources_game_id_source_id_uk'),
+        {'schema': 'core'}
+    )
 
     id_game_source: Mapped[int] = mapped_column(primary_key=True)
     source_id: Mapped[int] = mapped_column(db.ForeignKey('core.n_sources.source_id'), nullable=False)
@@ -43,7 +53,11 @@ class GameSources(db.Model):
 
 class GameUser(db.Model):
     __tablename__ = 'r_game_user'
-    __table_args__ = {'schema': 'core'}
+    __table_args__ = (
+        db.Index('r_game_user_username_idx', 'username'),
+        db.UniqueConstraint('game_id', 'username', name='r_game_user_game_id_username_uk'),
+        {'schema': 'core'}
+    )
 
     id_game_user: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(db.ForeignKey('core.users.username'), nullable=False)
@@ -57,7 +71,10 @@ class GameUser(db.Model):
 
 class Character(db.Model):
     __tablename__ = 'characters'
-    __table_args__ = {'schema': 'core'}
+    __table_args__ = (
+        db.Index('characters_id_game_user_idx', 'id_game_user'),
+        {'schema': 'core'}
+    )
 
     character_id: Mapped[int] = mapped_column(primary_key=True)
     id_game_user: Mapped[int] = mapped_column(db.ForeignKey('core.r_game_user.id_game_user'), nullable=False)
@@ -66,6 +83,141 @@ class Character(db.Model):
     # Relationships
     game_user = db.relationship('GameUser', back_populates='characters')
 
+class CombatState(db.Model):
+    """
+    Combat tracker of a game, used by the SQL combat store (see app/game_logic/combat_store.py).
+    """
+    __tablename__ = 'combat_state'
+    __table_args__ = {'schema': 'core'}
+
+    game_id: Mapped[int] = mapped_column(db.ForeignKey('core.games.game_id'), primary_key=True)
+    state: Mapped[dict] = mapped_column(db.JSON, nullable=False)
+    version: Mapped[int] = mapped_column(default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(nullable=False)
+
+class CombatJournalEntry(db.Model):
+    """
+    Command applied to the combat of a game, see app/game_logic/combat_journal.py.
+    """
+    __tablename__ = 'combat_journal'
+    __table_args__ = {'schema': 'core'}
+
+    game_id: Mapped[int] = mapped_column(db.ForeignKey('core.games.game_id'), primary_key=True)
+    seq: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    encounter: Mapped[int] = mapped_column(nullable=False)
+    command: Mapped[dict] = mapped_column(db.JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(nullable=False)
+
+class CombatSnapshot(db.Model):
+    """
+    Combat state of a game after its command number seq.
+    """
+    __tablename__ = 'combat_snapshot'
+    __table_args__ = {'schema': 'core'}
+
+    game_id: Mapped[int] = mapped_column(db.ForeignKey('core.games.game_id'), primary_key=True)
+    seq: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    state: Mapped[dict] = mapped_column(db.JSON, nullable=False)
+
+class Roles(NamedTuple):
+    """
+    Role set of a user towards a game, and optionally one of its characters.
+
+    Built by :meth:`User.get_roles` from the cached :class:`GameRoleFacts`.
+    """
+    username: str
+    game_id: int | None
+    is_admin: bool
+    is_member: bool
+    is_gm: bool
+    is_owner: bool
+
+    @property
+    def is_owner_or_gm(self) -> bool:
+        return self.is_owner or self.is_gm
+
+class GameRoleFacts(NamedTuple):
+    """
+    Role facts of a user in a game, as stored in the :class:`RolesCache`.
+    """
+    is_admin: bool
+    is_member: bool
+    is_gm: bool
+    owned_characters: frozenset[int]
+
+class RolesCache:
+    """
+    Process-level cache of :class:`GameRoleFacts`, keyed by (username, game_id).
+
+    Each game carries a membership version, bumped through :meth:`bump` whenever one
+    of its GameUser or Character rows changes. An entry is only served while the version
+    it was stored with is still current and its TTL has not expired.
+
+    The versions live in this process only: a bump seen by one worker does not reach the
+    others, which keep serving their entries until the TTL (ROLES_CACHE_TTL) expires. A
+    membership change can therefore take up to that long to apply on every worker.
+    """
+    def __init__(self, ttl : float = 30.0, max_entries : int = 10000, name : str | None = None):
+        self._lock = threading.Lock()
+        self._versions: dict[int, int] = {}
+        self._entries = LRUCache(max_entries, ttl, name and f"{name}.roles")
+        self._character_games = LRUCache(max_entries, ttl, name and f"{name}.character_games")
+
+    @property
+    def ttl(self) -> float:
+        return self._entries.ttl
+
+    @ttl.setter
+    def ttl(self, ttl : float):
+        self._entries.ttl = ttl
+        self._character_games.ttl = ttl
+
+    def version(self, game_id : int) -> int:
+        return self._versions.get(game_id, 0)
+
+    def bump(self, game_id : int):
+        """
+        Invalidate every cached entry of a game by bumping its membership version.
+
+        :param game_id: The ID of the game whose memberships or characters changed
+        :type game_id: int
+        """
+        with self._lock:
+            self._versions[game_id] = self._versions.get(game_id, 0) + 1
+
+    def get(self, username : str, game_id : int) -> GameRoleFacts | None:
+        return self._entries.get((username, game_id), stamp=self.version(game_id))
+
+    def put(self, username : str, game_id : int, version : int, facts : GameRoleFacts):
+        self._entries.put((username, game_id), facts, version)
+
+    def character_game(self, character_id : int) -> int | None:
+        """
+        Return the game a character belongs to. Characters never move between games: the
+        mapping is cached with the same TTL as the roles.
+
+        :param character_id: The ID of the character
+        :type character_id: int
+        :return: The ID of the game, or None if the character does not exist
+        :rtype: int | None
+        """
+        game_id = self._character_games.get(character_id)
+        if game_id is None:
+            game_id = db.session.query(GameUser.game_id).join(
+                Character, Character.id_game_user == GameUser.id_game_user
+            ).filter(Character.character_id == character_id).scalar()
+            if game_id is None:
+                return None
+            self._character_games.put(character_id, game_id)
+        return game_id
+
+    def clear(self):
+        self._entries.clear()
+        self._character_games.clear()
+
+roles_cache = RolesCache(name='core')
+""" Process-level cache of the users' role facts in each game. """
+
 class User(db.Model):
     """
     Model representing a user from "users" table.
@@ -83,10 +235,20 @@ class User(db.Model):
     participations = db.relationship('GameUser', back_populates='user')
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = passwords.hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        """
+        Check the password, and replace the stored hash if it was made with other parameters
+        (or by the V0 application). The new hash is committed by the caller.
+        """
+        valid, needs_rehash = passwords.hasher.verify(self.password, password)
+        if valid and needs_rehash:
+            try:
+                self.set_password(password)
+            except passwords.HashingBusy:
+                pass # The old hash still works, replaced on a later login
+        return valid
     
     
     def set_session_user(self):
@@ -161,12 +323,82 @@ class User(db.Model):
         ).scalar()
         return self.is_gm_of_game(game_id) if game_id else False
 
+    @classmethod
+    def get_game_facts(cls, username : str, game_id : int) -> GameRoleFacts | None:
+        """
+        Get the role facts (admin, member, GM, owned characters) of a user in a game.
+
+        Served from the process-level roles_cache when possible, otherwise loaded
+        in one joined query.
+
+        :param username: The username to get the facts of
+        :type username: str
+        :param game_id: The ID of the game
+        :type game_id: int
+        :return: The role facts, or None if the user does not exist
+        :rtype: GameRoleFacts | None
+        """
+        facts = roles_cache.get(username, game_id)
+        if facts is not None:
+            return facts
+
+        version = roles_cache.version(game_id)
+        rows = db.session.query(cls.admin, GameUser.gamemaster, Character.character_id).select_from(cls).outerjoin(
+            GameUser, and_(GameUser.username == cls.username, GameUser.game_id == game_id)
+        ).outerjoin(
+            Character, Character.id_game_user == GameUser.id_game_user
+        ).filter(cls.username == username).all()
+        if not rows:
+            return None
+
+        facts = GameRoleFacts(
+            is_admin=bool(rows[0][0]),
+            is_member=any(gm is not None for _, gm, _ in rows),
+            is_gm=any(bool(gm) for _, gm, _ in rows),
+            owned_characters=frozenset(cid for _, _, cid in rows if cid is not None)
+        )
+        roles_cache.put(username, game_id, version, facts)
+        return facts
+
+    @classmethod
+    def get_roles(cls, username : str, game_id : int | None = None, character_id : int | None = None) -> Roles | None:
+        """
+        Resolve the full role set (admin, member, GM, owner) of a user.
+
+        When a character_id is given, the roles are resolved against the game the character belongs to.
+
+        :param username: The username to resolve the roles of
+        :type username: str
+        :param game_id: The ID of the target game
+        :type game_id: int | None
+        :param character_id: The ID of the target character
+        :type character_id: int | None
+        :return: The resolved roles, or None if the user does not exist
+        :rtype: Roles | None
+        """
+        if character_id is not None:
+            game_id = roles_cache.character_game(character_id)
+            if game_id is None:
+                admin = db.session.query(cls.admin).filter(cls.username == username).first()
+                return Roles(username, None, bool(admin[0]), False, False, False) if admin else None
+
+        facts = cls.get_game_facts(username, game_id)
+        if facts is None:
+            return None
+        is_owner = character_id is not None and character_id in facts.owned_characters
+        return Roles(username, game_id, facts.is_admin, facts.is_member, facts.is_gm, is_owner)
+
     @classmethod
     def login(cls, username, password):
         user = cls.query.filter_by(username=username).first()
         if user:
             user:User
             if user.check_password(password):
+                if user in db.session.dirty:
+                    try:
+                        db.session.commit() # Rehashed password
+                    except Exception:
+                        db.session.rollback() # The old hash still works, retried on next login
                 return True, user
             else:
                 return False, "Invalid password"
@@ -178,10 +410,10 @@ class User(db.Model):
         if cls.query.filter_by(username=username).first():
             return False, "User already exists"
         
+        new_user = cls(username=username)
+        new_user.set_password(password) # Raises HashingBusy, for the caller to answer 503
         try:
             # User creation attempt
-            new_user = cls(username=username)
-            new_user.set_password(password)
             db.session.add(new_user)
             db.session.commit()
             return True, new_user
@@ -191,4 +423,17 @@ class User(db.Model):
         except Exception as e:
             db.session.rollback()
             return False, f"Unexpected error: {e}"
-        
\ No newline at end of file
+
+# ==================
+# REFERENCE DATA
+# ==================
+
+@reference_cache.loader('core.game_systems')
+def load_game_systems():
+    """ Game systems, as a read-only { system_id: row } mapping. """
+    return index_rows(db.session.query(GameSystem.__table__).order_by(GameSystem.system_id), 'system_id')
+
+@reference_cache.loader('core.sources')
+def load_sources():
+    """ Core sources of every system, as a tuple of rows. """
+    return tuple(db.session.query(Source.__table__).order_by(Source.source_id))
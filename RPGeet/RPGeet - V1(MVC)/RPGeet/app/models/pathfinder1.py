@@ -96,6 +96,8 @@ class P1Race(db.Model):
     race_id: Mapped[int] = mapped_column(primary_key=True)
     source_id: Mapped[int] = mapped_column(db.ForeignKey('pathfinder1.sources.source_id'), nullable=False)
 
+    source = db.relationship('P1Source')
+
 class P1Character(db.Model):
     __tablename__ = 'character'
     __table_args__ = {'schema': 'pathfinder1'}
@@ -119,7 +121,10 @@ class P1Character(db.Model):
 
 class P1Modifier(db.Model):
     __tablename__ = 'modifiers'
-    __table_args__ = {'schema': 'pathfinder1'}
+    __table_args__ = (
+        db.Index('modifiers_character_id_idx', 'character_id'),
+        {'schema': 'pathfinder1'}
+    )
     
     id_modifier: Mapped[int] = mapped_column(primary_key=True)
     character_id: Mapped[int] = mapped_column(db.ForeignKey('pathfinder1.character.character_id'), nullable=False)
@@ -132,14 +137,20 @@ class P1Modifier(db.Model):
 
 class P1RModifierOrigin(db.Model):
     __tablename__ = 'r_modifier_origin'
-    __table_args__ = {'schema': 'pathfinder1'}
+    __table_args__ = (
+        db.Index('r_modifier_origin_id_modifier_idx', 'id_modifier'),
+        {'schema': 'pathfinder1'}
+    )
     
     modifier_origin_id: Mapped[int] = mapped_column(primary_key=True)
     id_modifier: Mapped[int] = mapped_column(db.ForeignKey('pathfinder1.modifiers.id_modifier'), nullable=False)
 
 class P1RSkillCharacter(db.Model):
     __tablename__ = 'r_skill_character'
-    __table_args__ = {'schema': 'pathfinder1'}
+    __table_args__ = (
+        db.Index('r_skill_character_character_id_idx', 'character_id'), # The primary key starts with id_skill
+        {'schema': 'pathfinder1'}
+    )
     
     id_skill: Mapped[int] = mapped_column(db.ForeignKey('pathfinder1.skills.id_skill'), primary_key=True)
     character_id: Mapped[int] = mapped_column(db.ForeignKey('pathfinder1.character.character_id'), primary_key=True)
@@ -151,7 +162,10 @@ class P1RSkillCharacter(db.Model):
 
 class P1RCharacterDeity(db.Model):
     __tablename__ = 'r_character_deity'
-    __table_args__ = {'schema': 'pathfinder1'}
+    __table_args__ = (
+        db.UniqueConstraint('character_id', 'deity_id', name='r_character_deity_character_id_deity_id_uk'),
+        {'schema': 'pathfinder1'}
+    )
     
     id_character_deity: Mapped[int] = mapped_column(primary_key=True)
     character_id: Mapped[int] = mapped_column(db.ForeignKey('pathfinder1.character.character_id'), nullable=False)
@@ -173,7 +187,10 @@ class P1Class(db.Model):
 
 class P1RClassesCharacter(db.Model):
     __tablename__ = 'r_classes_character'
-    __table_args__ = {'schema': 'pathfinder1'}
+    __table_args__ = (
+        db.UniqueConstraint('character_id', 'class_id', name='r_classes_character_character_id_class_id_uk'),
+        {'schema': 'pathfinder1'}
+    )
     
     id_class_character: Mapped[int] = mapped_column(primary_key=True)
     class_id: Mapped[int] = mapped_column(db.ForeignKey('pathfinder1.classes.class_id'), nullable=False)
@@ -0,0 +1,177 @@
+""" Password hashing offloaded to a bounded thread pool, and login throttling.
+
+Hashes use werkzeug's format ("<method>$<salt>$<hash>"), with the PASSWORD_HASH_METHOD of the
+configuration (e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"). hashlib releases the GIL while
+hashing, so the PASSWORD_HASH_WORKERS threads hash in parallel, and at most PASSWORD_HASH_QUEUE more
+requests wait for them: a burst of logins can't hold every server thread on hashing.
+
+Hashes made with other parameters, and the unsalted MD5 hashes of the V0 application, are
+still accepted, and replaced on the next successful login.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+from werkzeug.security import generate_password_hash, check_password_hash
+import hashlib
+import hmac
+import re
+import threading
+import time
+
+class HashingBusy(Exception):
+    """
+    Raised when the hashing queue is full, or the hash didn't complete in time.
+    """
+
+LEGACY_MD5 = re.compile(r'^[0-9a-f]{32}$')
+""" Format of the V0 hashes (hashlib.md5(password).hexdigest()). """
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords on a bounded pool of worker threads.
+    """
+    def __init__(self, method : str = 'scrypt:32768:8:1', workers : int = 2, queue : int = 16, timeout : float = 10.0):
+        self.method = method
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._prefix = None
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Too many password hashes in progress")
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError as e:
+            raise HashingBusy("Password hashing timed out") from e
+
+    @property
+    def prefix(self) -> str:
+        """ The "<method>" part of the hashes generated with the configured method (defaults filled in). """
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', method=self.method).split('$', 1)[0]
+        return self._prefix
+
+    def hash(self, password : str) -> str:
+        """
+        :param password: The password to hash
+        :type password: str
+        :return: The salted hash of the password
+        :rtype: str
+        :raises HashingBusy: If the hashing queue is full
+        """
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored : str, password : str) -> tuple[bool, bool]:
+        """
+        :param stored: The stored hash, werkzeug or V0 MD5
+        :type stored: str
+        :param password: The password to check
+        :type password: str
+        :return: Whether the password matches, and whether the stored hash should be replaced
+        :rtype: tuple[bool, bool]
+        :raises HashingBusy: If the hashing queue is full
+        """
+        if LEGACY_MD5.match(stored):
+            legacy = hashlib.md5(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy, stored), True
+        if not self._run(check_password_hash, stored, password):
+            return False, False
+        return True, stored.split('$', 1)[0] != self.prefix
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+hasher = PasswordHasher()
+
+class LoginThrottle:
+    """
+    Sliding-window counters of login attempts per client IP, and of failed logins per username.
+    """
+    def __init__(self, window : float = 60.0, max_per_ip : int = 30, max_per_user : int = 5, enabled : bool = True):
+        self.window = window
+        self.max_per_ip = max_per_ip
+        self.max_per_user = max_per_user
+        self.enabled = enabled
+        self._events: dict[tuple[str, str], deque[float]] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def _recent(self, key : tuple[str, str], now : float) -> deque[float]:
+        events = self._events.get(key)
+        if events is None:
+            return deque()
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+        return events
+
+    def _sweep(self, now : float):
+        for key in list(self._events):
+            self._recent(key, now)
+
+    def retry_after(self, ip : str, username : str) -> float:
+        """
+        Count a login attempt from the IP, unless it is already throttled.
+
+        :return: Seconds before the next attempt is allowed, 0 if this one is
+        :rtype: float
+        """
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                self._sweep(now)
+            waits = []
+            for key, limit in ((('ip', ip), self.max_per_ip), (('user', username), self.max_per_user)):
+                events = self._recent(key, now)
+                if len(events) >= limit:
+                    waits.append(events[0] + self.window - now)
+            if waits:
+                return max(waits)
+            self._events.setdefault(('ip', ip), deque()).append(now)
+            return 0.0
+
+    def failed(self, username : str):
+        """ Count a failed login of the username. """
+        if self.enabled:
+            with self._lock:
+                self._events.setdefault(('user', username), deque()).append(time.monotonic())
+
+    def succeeded(self, username : str):
+        """ Forget the failed logins of the username. """
+        with self._lock:
+            self._events.pop(('user', username), None)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+throttle = LoginThrottle()
+
+def init_app(app : Flask):
+    """
+    Configure the hasher and the throttle from the application configuration.
+
+    :param app: The Flask application
+    :type app: Flask
+    """
+    global hasher
+    config = app.config
+    hasher.shutdown()
+    hasher = PasswordHasher(config['PASSWORD_HASH_METHOD'], config['PASSWORD_HASH_WORKERS'],
+                            config['PASSWORD_HASH_QUEUE'], config['PASSWORD_HASH_TIMEOUT'])
+    throttle.enabled = config['LOGIN_THROTTLE']
+    throttle.window = config['LOGIN_THROTTLE_WINDOW']
+    throttle.max_per_ip = config['LOGIN_THROTTLE_PER_IP']
+    throttle.max_per_user = config['LOGIN_THROTTLE_PER_USER']
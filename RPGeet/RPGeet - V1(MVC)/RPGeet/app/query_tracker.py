@@ -0,0 +1,131 @@
+""" Per-request SQL statement tracking, built on SQLAlchemy engine events.
+
+Counts the statements, the total database time and the repeated statements (likely N+1
+lazy loads) of every Flask request, aggregates them per endpoint, and checks them against
+the configured per-endpoint query budgets.
+"""
+
+from collections import Counter
+from flask import Flask, g, has_request_context, request, current_app
+from sqlalchemy import event
+import threading
+import time
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised in strict mode when a request issues more statements than its endpoint's budget.
+    """
+
+class RequestQueries:
+    """
+    Statements issued during a single request.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+
+    def duplicates(self, threshold : int) -> dict[str, int]:
+        """
+        :param threshold: The number of executions from which a statement counts as duplicated
+        :type threshold: int
+        :return: The statements executed at least threshold times, with their count
+        :rtype: dict[str, int]
+        """
+        return {sql: n for sql, n in self.statements.items() if n >= threshold}
+
+class EndpointQueryStats:
+    """
+    Statements issued by all the requests of an endpoint.
+    """
+    def __init__(self, endpoint : str):
+        self.endpoint = endpoint
+        self.requests = 0
+        self.statements = 0
+        self.total_time = 0.0
+        self.max_statements = 0
+        self.over_budget = 0
+        self.duplicate_requests = 0
+        self.last_duplicates: dict[str, int] = {}
+
+    @property
+    def avg_statements(self) -> float:
+        return self.statements / self.requests if self.requests else 0.0
+
+    @property
+    def avg_time_ms(self) -> float:
+        return 1000 * self.total_time / self.requests if self.requests else 0.0
+
+_lock = threading.Lock()
+endpoint_stats: dict[str, EndpointQueryStats] = {}
+""" Per-endpoint aggregates, keyed by Flask endpoint name. """
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'queries' in g:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'queries' in g:
+        starts = conn.info.get('query_start')
+        elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+        g.queries.count += 1
+        g.queries.total_time += elapsed
+        g.queries.statements[statement] += 1
+
+def _start_request():
+    g.queries = RequestQueries()
+
+def _end_request(response):
+    queries = g.pop('queries', None)
+    if queries is None or request.endpoint is None:
+        return response
+
+    config = current_app.config
+    endpoint = request.endpoint
+    duplicates = queries.duplicates(config['QUERY_DUPLICATE_THRESHOLD'])
+    budget = config['QUERY_BUDGETS'].get(endpoint)
+    over_budget = budget is not None and queries.count > budget
+
+    with _lock:
+        stats = endpoint_stats.setdefault(endpoint, EndpointQueryStats(endpoint))
+        stats.requests += 1
+        stats.statements += queries.count
+        stats.total_time += queries.total_time
+        stats.max_statements = max(stats.max_statements, queries.count)
+        if over_budget:
+            stats.over_budget += 1
+        if duplicates:
+            stats.duplicate_requests += 1
+            stats.last_duplicates = duplicates
+
+    current_app.logger.debug(f"{endpoint}: {queries.count} statements in {1000 * queries.total_time:.1f} ms")
+    for sql, n in duplicates.items():
+        current_app.logger.warning(f"{endpoint}: statement executed {n} times (possible N+1): {sql}")
+    if over_budget:
+        message = f"{endpoint} issued {queries.count} statements, over its budget of {budget}"
+        if config['QUERY_BUDGET_STRICT']:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+    return response
+
+def reset():
+    """
+    Drop all the per-endpoint aggregates.
+    """
+    with _lock:
+        endpoint_stats.clear()
+
+def init_app(app : Flask, engine):
+    """
+    Hook the tracker on the engine and the request lifecycle of the application.
+
+    :param app: The Flask application
+    :type app: Flask
+    :param engine: The SQLAlchemy engine to track the statements of
+    """
+    if not app.config.get('QUERY_TRACKING'):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_end_request)
@@ -0,0 +1,150 @@
+// Live combat tracker: applies the events streamed by /game/<id>/combat/events to the page,
+// and sends the actions without reloading it.
+document.addEventListener('DOMContentLoaded', () => {
+    const tracker = document.getElementById('combat-tracker');
+    if (!tracker || !window.EventSource) {
+        return; // The forms keep working with full page reloads
+    }
+
+    const tbody = document.getElementById('combat-participants');
+    const rowTemplate = document.getElementById('combat-participant-row');
+    let combat = null; // { seq, round, active, participants: [], effects: Map(id => effect) }
+
+    // Same order as app/game_logic/initiative.py
+    function orderKey(a, b) {
+        return (b.initiative - a.initiative) || (b.secondary - a.secondary) || (a.tiebreak - b.tiebreak);
+    }
+
+    function insert(participant) {
+        combat.participants = combat.participants.filter(p => p.id !== participant.id);
+        combat.participants.push(participant);
+        combat.participants.sort(orderKey);
+    }
+
+    function fill(form, name, value) {
+        form.querySelector(`input[name="${name}"]`).value = value;
+    }
+
+    function render() {
+        document.getElementById('combat-round').textContent = combat.round;
+        const active = combat.participants.find(p => p.id === combat.active);
+        const activeLine = document.getElementById('combat-active');
+        activeLine.textContent = active ? 'Active: ' : 'The combat starts with the first turn.';
+        if (active) {
+            const name = document.createElement('strong');
+            name.textContent = active.name;
+            activeLine.appendChild(name);
+        }
+        document.getElementById('combat-next').textContent = active ? 'Next Turn' : 'Start';
+
+        const effectsOf = new Map();
+        [...combat.effects.values()]
+            .sort((a, b) => a.expires - b.expires || a.id - b.id)
+            .forEach(e => {
+                if (!effectsOf.has(e.participant_id)) effectsOf.set(e.participant_id, []);
+                effectsOf.get(e.participant_id).push(`${e.name} (${e.expires - combat.round} rnds)`);
+            });
+
+        tbody.replaceChildren(...combat.participants.map(p => {
+            const row = rowTemplate.content.firstElementChild.cloneNode(true);
+            if (p.id === combat.active) row.style.fontWeight = 'bold';
+            row.querySelector('.initiative').textContent = p.initiative + (p.secondary ? ` (${p.secondary})` : '');
+            row.querySelector('.name').textContent = p.name + (p.held ? ` (${p.held})` : '');
+            const effectsCell = row.querySelector('.effects');
+            (effectsOf.get(p.id) || []).forEach(text => {
+                effectsCell.append(text, document.createElement('br'));
+            });
+            row.querySelectorAll('form').forEach(form => {
+                if (form.querySelector('input[name="participant_id"]')) fill(form, 'participant_id', p.id);
+            });
+            if (p.id !== combat.active) row.querySelector('form.hold').remove();
+            if (!p.held) row.querySelector('form.act').remove();
+            return row;
+        }));
+    }
+
+    const handlers = {
+        participant_added: e => insert(e.participant),
+        participant_removed: e => {
+            combat.participants = combat.participants.filter(p => p.id !== e.id);
+            combat.effects.forEach((effect, id) => {
+                if (effect.participant_id === e.id) combat.effects.delete(id);
+            });
+        },
+        turn: e => { combat.round = e.round; combat.active = e.active; },
+        held: e => { combat.participants.find(p => p.id === e.id).held = e.action; },
+        acted: e => insert(e.participant),
+        effect_added: e => combat.effects.set(e.effect.id, e.effect),
+        effect_expired: e => e.ids.forEach(id => combat.effects.delete(id)),
+    };
+
+    const source = new EventSource(tracker.dataset.eventsUrl);
+    source.addEventListener('snapshot', message => {
+        const snapshot = JSON.parse(message.data); // On connection, and after an undo or a new encounter
+        combat = {
+            seq: parseInt(message.lastEventId),
+            round: snapshot.round,
+            active: snapshot.active,
+            participants: snapshot.participants.sort(orderKey),
+            effects: new Map(snapshot.effects.map(e => [e.id, e])),
+        };
+        render();
+    });
+    Object.keys(handlers).forEach(type => {
+        source.addEventListener(type, message => {
+            const seq = parseInt(message.lastEventId);
+            if (!combat || seq <= combat.seq) return; // Already in the snapshot
+            combat.seq = seq;
+            handlers[type](JSON.parse(message.data));
+            render();
+        });
+    });
+
+    // Send the actions in the background, the stream brings the result
+    tracker.addEventListener('submit', event => {
+        const form = event.target;
+        event.preventDefault();
+        fetch(form.action, {
+            method: 'POST',
+            body: new FormData(form, event.submitter),
+            headers: { 'X-Requested-With': 'fetch' },
+        }).then(response => {
+            if (!response.ok) {
+                response.text().then(text => alert(text || response.statusText));
+            } else if (form.querySelector('input[type="text"]')) {
+                form.reset();
+            }
+        });
+    });
+});
+
+// Encounter simulator of the GM: shows the report under the form instead of the raw JSON
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.getElementById('encounter-simulator');
+    if (!form) {
+        return;
+    }
+    const output = document.getElementById('encounter-report');
+    const percent = value => `${Math.round(value * 100)}%`;
+
+    form.addEventListener('submit', event => {
+        event.preventDefault();
+        output.textContent = 'Simulating...';
+        fetch(form.action, { method: 'POST', body: new FormData(form) })
+            .then(response => response.json())
+            .then(report => {
+                if (report.error) {
+                    output.textContent = report.error;
+                    return;
+                }
+                const lines = [
+                    `${report.trials} fights: party wins ${percent(report.party_wins)}, foes win ${percent(report.foes_wins)}, draws ${percent(report.draws)}`,
+                    `${report.mean_rounds.toFixed(1)} rounds on average, party loses ${percent(report.party_hp_lost)} of its HP`,
+                    '',
+                    ...report.combatants.map(c => `${c.name} (${c.side}, ${c.damage}): standing ${percent(c.survival)}, ${c.mean_hp_left.toFixed(1)}/${c.hp} HP left`),
+                    ...(report.assumptions.length ? ['', ...report.assumptions.map(a => `Assumed: ${a}`)] : []),
+                ];
+                output.textContent = lines.join('\n');
+            });
+    });
+});
@@ -0,0 +1,88 @@
+""" Per-request phase timings, reported in a Server-Timing response header and a sampled log.
+
+Phases are recorded either with the :func:`phase` context manager or with a :class:`Laps`
+stopwatch marking consecutive sections. Outside of a request, recording is a no-op.
+"""
+
+from contextlib import contextmanager
+from flask import Flask, g, has_request_context, request, current_app
+import random
+import time
+
+def record(name : str, duration : float):
+    """
+    Add a duration to a phase of the current request.
+
+    :param name: The phase name, a token without spaces (e.g. "stats-skills")
+    :type name: str
+    :param duration: The duration, in seconds
+    :type duration: float
+    """
+    if not has_request_context():
+        return
+    if 'timings' not in g:
+        g.timings = {}
+    g.timings[name] = g.timings.get(name, 0.0) + duration
+
+@contextmanager
+def phase(name : str):
+    """
+    Time the enclosed block as a phase of the current request.
+
+    :param name: The phase name
+    :type name: str
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+class Laps:
+    """
+    Stopwatch recording consecutive sections of a function as phases.
+    """
+    def __init__(self, prefix : str = ''):
+        self.prefix = prefix
+        self._last = time.perf_counter()
+
+    def mark(self, name : str):
+        """
+        Record the time elapsed since the previous mark as the phase prefix + name.
+        """
+        now = time.perf_counter()
+        record(self.prefix + name, now - self._last)
+        self._last = now
+
+def header(timings : dict[str, float]) -> str:
+    """
+    :return: The Server-Timing header value of the given phases, durations in milliseconds
+    :rtype: str
+    """
+    return ', '.join(f"{name};dur={1000 * duration:.2f}" for name, duration in timings.items())
+
+def _start_request():
+    g.request_start = time.perf_counter()
+
+def _end_request(response):
+    timings = g.pop('timings', None)
+    if not timings:
+        return response
+    timings['total'] = time.perf_counter() - g.get('request_start', time.perf_counter())
+    value = header(timings)
+    response.headers['Server-Timing'] = value
+    if random.random() < current_app.config['SERVER_TIMING_LOG_RATE']:
+        current_app.logger.info(f"Server-Timing {request.endpoint}: {value}")
+    return response
+
+def init_app(app : Flask):
+    """
+    Report the phases recorded during each request of the application.
+
+    :param app: The Flask application
+    :type app: Flask
+    """
+    if not app.config.get('SERVER_TIMING'):
+        return
+    app.before_request(_start_request)
+    app.after_request(_end_request)
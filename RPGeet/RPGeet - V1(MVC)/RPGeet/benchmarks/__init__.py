@@ -0,0 +1 @@
+""" Load-testing benchmarks of the application, run from the project root with `python -m benchmarks.load_test`. """
@@ -0,0 +1,324 @@
+""" Deterministic synthetic campaign data for the benchmarks.
+
+Every table is produced by a row generator, in foreign key order, so that the data can be
+streamed into the database in chunks whatever the size of the population. All the rows are
+derived from the population settings and its seed only: the same settings always produce
+the same database.
+
+On PostgreSQL the chunks are streamed through COPY FROM STDIN and the sequences are fixed
+afterwards, which loads millions of rows in seconds; other databases use executemany inserts.
+"""
+
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from sqlalchemy import Integer, text
+import csv
+import io
+import random
+
+from app.models.core import db, User, GameSystem, Source, Game, GameSources, GameUser, Character
+from app.models import pathfinder1 as p1
+
+BENCHMARK_PASSWORD = 'benchmark'
+""" Password of every synthetic user. """
+
+CHUNK_SIZE = 5000
+""" Rows inserted per statement by :func:`load`. """
+
+COPY_CHUNK_SIZE = 100000
+""" Rows streamed per COPY statement by :func:`copy_load`. """
+
+@dataclass(frozen=True)
+class Population:
+    """
+    Size settings of a synthetic population.
+    """
+    users: int = 200
+    games: int = 100
+    players_per_game: int = 4
+    characters: int = 1000
+    modifiers_per_character: int = 6
+    skills_per_character: int = 8
+    seed: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+# ==================
+# REFERENCE DATA
+# ==================
+
+CLASSES = [
+    # (class_id, name, fortitude, reflex, will, bab) - 1=Good, 2=Poor, 3=Fast, 4=Medium, 5=Slow
+    (1, 'Fighter', 1, 2, 2, 3),
+    (2, 'Wizard', 2, 2, 1, 5),
+    (3, 'Rogue', 2, 1, 2, 4),
+    (4, 'Cleric', 1, 2, 1, 4),
+]
+DEITIES = [(1, 'Sarenrae', 'NG'), (2, 'Iomedae', 'LG'), (3, 'Desna', 'CG'), (4, 'Asmodeus', 'LE')]
+MODIFIER_TYPES = [
+    'Alchemical', 'Armor', 'Circumstance', 'Competence', 'Deflection', 'Dodge', 'Enhancement',
+    'Inherent', 'Insight', 'Luck', 'Morale', 'Natural Armor', 'Profane', 'Racial', 'Resistance',
+    'Sacred', 'Shield', 'Size', 'Trait', 'Untyped',
+]
+SKILLS = [
+    'Acrobatics', 'Appraise', 'Bluff', 'Climb', 'Craft', 'Diplomacy', 'Disable Device', 'Disguise',
+    'Escape Artist', 'Fly', 'Handle Animal', 'Heal', 'Intimidate', 'Knowledge (Arcana)',
+    'Knowledge (Dungeoneering)', 'Linguistics', 'Perception', 'Perform', 'Profession', 'Ride',
+    'Sense Motive', 'Sleight of Hand', 'Spellcraft', 'Stealth', 'Survival', 'Swim', 'Use Magic Device',
+]
+RACES = 4
+ALIGNMENTS = ['LG', 'NG', 'CG', 'LN', 'N', 'CN', 'LE', 'NE', 'CE']
+
+def reference_tables():
+    """
+    Yield the (table, rows) of the core and Pathfinder reference data.
+    """
+    yield GameSystem.__table__, [{'system_id': 1, 'name': 'Pathfinder 1e', 'schema_name': 'pathfinder1'}]
+    yield Source.__table__, [{'source_id': 1, 'name': 'Pathfinder Core Rulebook', 'system_id': 1}]
+    yield p1.P1NSource.__table__, [{'source_id': 1, 'name': 'Pathfinder Core Rulebook', 'core_source_id': 1}]
+    yield p1.P1Source.__table__, [{'source_id': 1, 'name': 'Pathfinder Core Rulebook', 'core_source_id': 1}]
+    yield p1.P1NClassStatsCategory.__table__, [
+        {'class_stats_category_id': i, 'class_stats_category_name': name}
+        for i, name in enumerate(['Good', 'Poor', 'Fast', 'Medium', 'Slow'], 1)
+    ]
+    yield p1.P1ClassStats.__table__, [
+        {'class_stats_id': cid, 'fortitude_save_cat': fort, 'reflex_save_cat': ref, 'will_save_cat': will, 'base_battle_bonus': bab}
+        for cid, _, fort, ref, will, bab in CLASSES
+    ]
+    yield p1.P1Class.__table__, [
+        {'class_id': cid, 'class_name': name, 'source_id': 1, 'class_stats_id': cid}
+        for cid, name, *_ in CLASSES
+    ]
+    yield p1.P1Race.__table__, [{'race_id': i, 'source_id': 1} for i in range(1, RACES + 1)]
+    yield p1.P1Deity.__table__, [
+        {'deity_id': i, 'deity_name': name, 'deity_alignment': al, 'source_id': 1} for i, name, al in DEITIES
+    ]
+    yield p1.P1ModifierType.__table__, [
+        {'modifier_type_id': i, 'modifier_type_name': name} for i, name in enumerate(MODIFIER_TYPES, 1)
+    ]
+    yield p1.P1Skill.__table__, [
+        {'id_skill': i, 'skill_name': name, 'skill_short_description': name} for i, name in enumerate(SKILLS, 1)
+    ]
+
+# ==================
+# POPULATION
+# ==================
+
+def username(i : int) -> str:
+    return f"user_{i}"
+
+# Independent random streams, so that adding rows to a table never shifts the others
+STREAM_GAME, STREAM_STATS, STREAM_FEATURES, STREAM_CLASSES, STREAM_MODIFIERS, STREAM_SKILLS = range(6)
+
+def _rng(pop : Population, stream : int, n : int) -> random.Random:
+    return random.Random(((pop.seed * 8 + stream) << 40) + n)
+
+@lru_cache(maxsize=65536)
+def game_members(pop : Population, game_id : int) -> tuple[int, ...]:
+    """
+    :return: The user indexes of a game's members, its GM first
+    :rtype: tuple[int, ...]
+    """
+    return tuple(_rng(pop, STREAM_GAME, game_id).sample(range(pop.users), pop.players_per_game + 1))
+
+def membership_id(pop : Population, game_id : int, slot : int) -> int:
+    """
+    :return: The id_game_user of a game member (slot 0 is the GM)
+    :rtype: int
+    """
+    return (game_id - 1) * (pop.players_per_game + 1) + slot + 1
+
+def character_owner(pop : Population, character_id : int) -> tuple[int, int, int]:
+    """
+    Characters are dealt round-robin to the players of all the games.
+
+    :return: The (game_id, player slot, user index) owning a character
+    :rtype: tuple[int, int, int]
+    """
+    slot = (character_id - 1) % (pop.games * pop.players_per_game)
+    game_id = slot // pop.players_per_game + 1
+    player = slot % pop.players_per_game + 1
+    return game_id, player, game_members(pop, game_id)[player]
+
+def population_tables(pop : Population, password_hash : str):
+    """
+    Yield the (table, rows) of the synthetic population, rows being lazy generators.
+
+    :param pop: The population settings
+    :type pop: Population
+    :param password_hash: The stored password of every user
+    :type password_hash: str
+    """
+    if pop.users < pop.players_per_game + 1:
+        raise ValueError("Not enough users to fill a game")
+
+    yield User.__table__, (
+        {'username': username(i), 'password': password_hash, 'admin': False} for i in range(pop.users)
+    )
+    yield Game.__table__, (
+        {'game_id': g, 'name': f"Campaign {g}", 'system_id': 1} for g in range(1, pop.games + 1)
+    )
+    yield GameSources.__table__, (
+        {'id_game_source': g, 'game_id': g, 'source_id': 1} for g in range(1, pop.games + 1)
+    )
+    yield GameUser.__table__, (
+        {'id_game_user': membership_id(pop, g, slot), 'username': username(u), 'game_id': g, 'gamemaster': slot == 0}
+        for g in range(1, pop.games + 1)
+        for slot, u in enumerate(game_members(pop, g))
+    )
+    characters = range(1, pop.characters + 1)
+    yield Character.__table__, (
+        {'character_id': c, 'id_game_user': membership_id(pop, *character_owner(pop, c)[:2]), 'name': f"Hero {c}"}
+        for c in characters
+    )
+    yield p1.P1Statistics.__table__, (_statistics(pop, c) for c in characters)
+    yield p1.P1DescriptiveFeatures.__table__, (_features(pop, c) for c in characters)
+    yield p1.P1Character.__table__, (
+        {'character_id': c, 'race_id': c % RACES + 1, 'alignement': ALIGNMENTS[c % len(ALIGNMENTS)],
+         'statistics_id': c, 'name': f"Hero {c}", 'descriptive_features_id': c}
+        for c in characters
+    )
+    yield p1.P1RCharacterDeity.__table__, (
+        {'id_character_deity': c, 'character_id': c, 'deity_id': c % len(DEITIES) + 1} for c in characters
+    )
+    yield p1.P1RClassesCharacter.__table__, (row for c in characters for row in _classes(pop, c))
+    yield p1.P1Modifier.__table__, (row for c in characters for row in _modifiers(pop, c))
+    yield p1.P1RSkillCharacter.__table__, (row for c in characters for row in _skills(pop, c))
+
+def _statistics(pop : Population, c : int) -> dict:
+    rng = _rng(pop, STREAM_STATS, c)
+    scores = [sum(sorted(rng.randint(1, 6) for _ in range(4))[1:]) for _ in range(6)]
+    return {
+        'statistics_id': c, 'max_hp': rng.randint(8, 120), 'lethal_dmg': 0, 'non_lethal_dmg': 0,
+        'base_strength': scores[0], 'base_dexterity': scores[1], 'base_constitution': scores[2],
+        'base_intelligence': scores[3], 'base_wisdom': scores[4], 'base_charisma': scores[5],
+    }
+
+def _features(pop : Population, c : int) -> dict:
+    rng = _rng(pop, STREAM_FEATURES, c)
+    return {
+        'descriptive_features_id': c, 'age': rng.randint(16, 120), 'gender': rng.choice('MF'),
+        'height': float(rng.randint(90, 210)), 'weight': float(rng.randint(20, 150)),
+        'hair_short_desc': 'Brown', 'eyes_short_desc': 'Green', 'skin_short_desc': 'Pale',
+    }
+
+def _classes(pop : Population, c : int):
+    # Up to 3 classes per character, ids allocated in fixed blocks of 3
+    rng = _rng(pop, STREAM_CLASSES, c)
+    for j, class_id in enumerate(rng.sample(range(1, len(CLASSES) + 1), rng.randint(1, 3))):
+        yield {'id_class_character': (c - 1) * 3 + j + 1, 'class_id': class_id, 'character_id': c,
+               'main_class': j == 0, 'class_level': rng.randint(1, 10)}
+
+def _modifiers(pop : Population, c : int):
+    rng = _rng(pop, STREAM_MODIFIERS, c)
+    for j in range(pop.modifiers_per_character):
+        yield {'id_modifier': (c - 1) * pop.modifiers_per_character + j + 1, 'character_id': c,
+               'modifier_type_id': rng.randint(1, len(MODIFIER_TYPES)), 'value': rng.randint(1, 5),
+               'duration': rng.choice([0, 0, 1, 10, 100])}
+
+def _skills(pop : Population, c : int):
+    rng = _rng(pop, STREAM_SKILLS, c)
+    for id_skill in rng.sample(range(1, len(SKILLS) + 1), min(pop.skills_per_character, len(SKILLS))):
+        yield {'id_skill': id_skill, 'character_id': c, 'proficiency': rng.random() < 0.5, 'base_score': rng.randint(0, 10)}
+
+def chunks(rows, size : int = CHUNK_SIZE):
+    """
+    Split an iterable of rows into lists of at most size rows.
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def load(tables, log=print):
+    """
+    Insert (table, rows) pairs through the session, in chunked executemany statements.
+
+    :param tables: The (table, rows) pairs to insert, in foreign key order
+    :param log: Progress callback
+    """
+    for table, rows in tables:
+        count = 0
+        for chunk in chunks(rows):
+            db.session.execute(table.insert(), chunk)
+            count += len(chunk)
+        db.session.commit()
+        log(f"{table.fullname}: {count} rows")
+
+def _csv_value(value):
+    # '1'/'0' are valid input for both boolean and bit columns, None is an unquoted empty field (NULL)
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return value
+
+def copy_load(tables, chunk_size : int = COPY_CHUNK_SIZE, log=print):
+    """
+    Stream (table, rows) pairs into PostgreSQL through COPY FROM STDIN, one COPY per chunk.
+
+    :param tables: The (table, rows) pairs to insert, in foreign key order
+    :param chunk_size: The number of rows per COPY statement
+    :type chunk_size: int
+    :param log: Progress callback
+    """
+    conn = db.engine.raw_connection()
+    try:
+        for table, rows in tables:
+            columns = [c.name for c in table.columns]
+            sql = f"COPY {table.fullname} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+            count = 0
+            with conn.cursor() as cur:
+                for chunk in chunks(rows, chunk_size):
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerows([_csv_value(row[c]) for c in columns] for row in chunk)
+                    buffer.seek(0)
+                    cur.copy_expert(sql, buffer)
+                    count += len(chunk)
+            conn.commit()
+            log(f"{table.fullname}: {count} rows")
+    finally:
+        conn.close()
+
+def fix_sequences(tables, log=print):
+    """
+    Move the sequence of every serial primary key past the rows loaded with explicit IDs.
+
+    :param tables: The tables to fix (tables without a single integer primary key are skipped)
+    """
+    for table in tables:
+        pk = list(table.primary_key.columns)
+        if len(pk) != 1 or not isinstance(pk[0].type, Integer):
+            continue
+        column = pk[0].name
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.fullname}', '{column}'), "
+            f"COALESCE((SELECT MAX({column}) FROM {table.fullname}), 0) + 1, false)"
+        ))
+    db.session.commit()
+    log("Sequences fixed")
+
+def seed(pop : Population, password_hash : str, with_reference : bool = True, log=print):
+    """
+    Fill the database with the reference data (optionally) and a synthetic population.
+
+    Uses COPY on PostgreSQL (then fixes the sequences), executemany inserts otherwise.
+
+    :param pop: The population settings
+    :type pop: Population
+    :param password_hash: The stored password of every user
+    :type password_hash: str
+    :param with_reference: Whether to insert the reference data too
+    :type with_reference: bool
+    """
+    tables = list(reference_tables()) if with_reference else []
+    tables += list(population_tables(pop, password_hash))
+    if db.engine.dialect.name == 'postgresql':
+        copy_load(tables, log=log)
+        fix_sequences([table for table, _ in tables], log=log)
+    else:
+        load(tables, log)
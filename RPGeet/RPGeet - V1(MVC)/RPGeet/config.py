@@ -9,8 +9,11 @@ BASE_DIR = PROJECT_DIR / "_app"
 """ Base directory of the application. """
 DB_ENV = PROJECT_DIR / '.env'
 """ Path to the .env file containing database environment variables. """
+MIGRATIONS_DIR = PROJECT_DIR.parent / 'Database initialisation' / 'migrations'
+""" Directory of the versioned SQL migrations, one sub-directory per schema. """
 
 import os
+import json
 from dotenv import load_dotenv
 load_dotenv(DB_ENV)
 
@@ -36,4 +39,60 @@ class Config:
     DB_NAME = os.getenv('DB_NAME')
 
     SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    SQLALCHEMY_TRACK_MODIFICATIONS = False # Disable to save resources
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False # Disable to save resources
+    SQLALCHEMY_ENGINE_OPTIONS = {} # Extra create_engine options, over the DB_* settings below (see app/db_pool.py)
+
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10')) # Connections kept open by the engine pool
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10')) # Extra connections opened under load, closed when given back
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10')) # Seconds a request waits for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800')) # Seconds after which a connection is replaced
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() in ('true', '1', 't') # Check connections on checkout
+    DB_APPLICATION_NAME = os.getenv('DB_APPLICATION_NAME', 'rpgeet') # Shown in pg_stat_activity
+    DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', '3000')) # Milliseconds, default of every connection
+    # Milliseconds per blueprint, e.g. STATEMENT_TIMEOUTS={"admin": 120000}. Only the ones different from
+    # DB_STATEMENT_TIMEOUT cost an extra SET LOCAL per transaction.
+    STATEMENT_TIMEOUTS = json.loads(os.getenv('STATEMENT_TIMEOUTS', '{}')) or {
+        'main': 3000,
+        'character': 3000,
+        'admin': 120000,
+    }
+    MIGRATIONS_DIR = Path(os.getenv('MIGRATIONS_DIR', MIGRATIONS_DIR)) # Applied by "flask db upgrade"
+
+    ROLES_CACHE_TTL = float(os.getenv('ROLES_CACHE_TTL', '30')) # Seconds a cached role lookup stays valid
+    STATS_CACHE_SIZE = int(os.getenv('STATS_CACHE_SIZE', '1024')) # Max number of cached character sheets
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '30')) # Seconds a cached character sheet stays valid, i.e. may be stale on the other workers
+    REFERENCE_CACHE_TTL = float(os.getenv('REFERENCE_CACHE_TTL', '3600')) # Seconds before reference tables are reloaded
+
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1') # werkzeug method, changing it rehashes on login
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2')) # Passwords hashed in parallel
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '16')) # Hashes waiting for a worker before refusing logins
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10')) # Seconds a login waits for its hash
+    LOGIN_THROTTLE = os.getenv('LOGIN_THROTTLE', 'True').lower() in ('true', '1', 't') # Limit the login attempts
+    LOGIN_THROTTLE_WINDOW = float(os.getenv('LOGIN_THROTTLE_WINDOW', '60')) # Seconds the attempts are counted over
+    LOGIN_THROTTLE_PER_IP = int(os.getenv('LOGIN_THROTTLE_PER_IP', '30')) # Login and register attempts per IP and window
+    LOGIN_THROTTLE_PER_USER = int(os.getenv('LOGIN_THROTTLE_PER_USER', '5')) # Failed logins per username and window
+
+    COMBAT_STORE = os.getenv('COMBAT_STORE', 'memory') # 'memory' (single worker) or 'sql' (core.combat_state, shared by the workers)
+    COMBAT_WRITE_BEHIND = os.getenv('COMBAT_WRITE_BEHIND', 'False').lower() in ('true', '1', 't') # Batch the SQL writes, needs game-sticky workers
+    COMBAT_FLUSH_INTERVAL = float(os.getenv('COMBAT_FLUSH_INTERVAL', '0.5')) # Seconds between two write-behind batches
+    COMBAT_JOURNAL = os.getenv('COMBAT_JOURNAL', 'memory') # 'memory', 'sql' (core.combat_journal) or '' to disable
+    COMBAT_SNAPSHOT_INTERVAL = int(os.getenv('COMBAT_SNAPSHOT_INTERVAL', '50')) # Journaled commands between two state snapshots
+    ENCOUNTER_WORKERS = int(os.getenv('ENCOUNTER_WORKERS', '0')) # Processes of the encounter simulator, 0 for the CPU count (at most 4)
+    ENCOUNTER_POOL_THRESHOLD = int(os.getenv('ENCOUNTER_POOL_THRESHOLD', '5000000')) # Work (trials x combatants x max rounds) simulated in the request's thread below this
+    ENCOUNTER_MAX_TRIALS = int(os.getenv('ENCOUNTER_MAX_TRIALS', '200000')) # Trials of a single simulation
+    ENCOUNTER_MAX_ROUNDS = int(os.getenv('ENCOUNTER_MAX_ROUNDS', '50')) # Rounds before a fight counts as a draw
+    ENCOUNTER_MAX_WORK = int(os.getenv('ENCOUNTER_MAX_WORK', '20000000')) # Work of a simulation per process (x workers with the pool), ~1 s of a core
+
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'True').lower() in ('true', '1', 't') # Report phase timings in a Server-Timing header
+    SERVER_TIMING_LOG_RATE = float(os.getenv('SERVER_TIMING_LOG_RATE', '0.01')) # Fraction of the timed requests also logged
+
+    QUERY_TRACKING = os.getenv('QUERY_TRACKING', 'True').lower() in ('true', '1', 't') # Count SQL statements per request
+    QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False').lower() in ('true', '1', 't') # Raise instead of logging when over budget
+    QUERY_DUPLICATE_THRESHOLD = int(os.getenv('QUERY_DUPLICATE_THRESHOLD', '3')) # Executions of one statement flagged as N+1
+    # Max statements per request of each endpoint (cold caches included), e.g. QUERY_BUDGETS={"main.lobby": 1}
+    QUERY_BUDGETS = json.loads(os.getenv('QUERY_BUDGETS', '{}')) or {
+        'main.lobby': 1,
+        'character.characters': 1,
+        'game.view_game': 3,
+        'character.view_character': 20,
+    }
\ No newline at end of file
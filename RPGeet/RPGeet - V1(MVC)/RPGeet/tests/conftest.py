@@ -0,0 +1,88 @@
+""" Test fixtures: the application on SQLite, seeded with a small synthetic population.
+
+The database is the SQLite stand-in of the load test (the core and pathfinder1 schemas being
+attached databases), and the population the benchmark one (see benchmarks/seed.py), so the
+users, games and characters of a test are derived from its settings.
+"""
+
+from pathlib import Path
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config
+from benchmarks import seed as seeding
+from benchmarks.load_test import use_sqlite_standin, create_schema
+
+POPULATION = seeding.Population(users=30, games=6, players_per_game=3, characters=24, seed=1)
+""" Seeded population: every game has a GM and 3 players, each player having a character or more. """
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    use_sqlite_standin(str(tmp_path_factory.mktemp('db')))
+    config.Config.SECRET_KEY = 'test'
+    config.Config.TESTING = True
+    config.Config.QUERY_TRACKING = True
+    config.Config.QUERY_BUDGET_STRICT = True
+    config.Config.LOGIN_THROTTLE = False
+    config.Config.ENCOUNTER_WORKERS = 1 # Never start a process pool
+
+    from app import create_app
+    from app.models.core import db
+    import app.models.pathfinder1 # Registers the pathfinder1 tables
+
+    application = create_app()
+    with application.app_context():
+        create_schema(db)
+        seeding.seed(POPULATION, generate_password_hash(seeding.BENCHMARK_PASSWORD, 'pbkdf2:sha256:1000'), log=lambda _: None)
+    return application
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def combat(app):
+    """
+    Start every test with empty combats, in new in-memory stores.
+    """
+    from app.game_logic import game_logic
+    with app.app_context():
+        game_logic.configure_combat_store(app)
+    return game_logic
+
+@pytest.fixture
+def login():
+    """
+    :return: A function logging a test client in as a user, without a password round trip
+    """
+    def login(client, username : str, admin : bool = False):
+        with client.session_transaction() as session:
+            session['username'] = username
+            session['is_admin'] = admin
+        return client
+    return login
+
+def gamemaster(game_id : int) -> str:
+    """
+    :return: The username of a seeded game's GM
+    :rtype: str
+    """
+    return seeding.username(seeding.game_members(POPULATION, game_id)[0])
+
+def player(game_id : int, slot : int = 1) -> str:
+    """
+    :return: The username of a seeded game's player (slot 1 to players_per_game)
+    :rtype: str
+    """
+    return seeding.username(seeding.game_members(POPULATION, game_id)[slot])
+
+def character_of(game_id : int, slot : int = 1) -> int:
+    """
+    :return: The ID of the first character of a seeded game's player
+    :rtype: int
+    """
+    return (game_id - 1) * POPULATION.players_per_game + slot
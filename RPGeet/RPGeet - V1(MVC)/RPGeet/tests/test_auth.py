@@ -0,0 +1,42 @@
+""" Login and registration when the password hasher is saturated. """
+
+import pytest
+
+from app import passwords
+from app.models.core import User
+from benchmarks.seed import BENCHMARK_PASSWORD
+from conftest import player
+
+@pytest.fixture
+def busy_hasher(monkeypatch):
+    def busy(password):
+        raise passwords.HashingBusy("busy")
+    monkeypatch.setattr(passwords.hasher, 'hash', busy)
+
+def test_register_when_busy(app, client, busy_hasher):
+    response = client.post('/register', data={'username': 'newcomer', 'password': 'secret'})
+    assert response.status_code == 503 and response.headers['Retry-After']
+    with app.app_context():
+        assert User.query.filter_by(username='newcomer').first() is None
+
+def test_register(app, client):
+    response = client.post('/register', data={'username': 'registered', 'password': 'secret'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert User.query.filter_by(username='registered').one().check_password('secret')
+
+def test_login_skips_a_busy_rehash(app, client, busy_hasher):
+    # The seeded hashes use another method than the configured one: they are rehashed on login
+    with app.app_context():
+        stored = User.query.filter_by(username=player(3)).one().password
+    response = client.post('/login', data={'username': player(3), 'password': BENCHMARK_PASSWORD})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session['username'] == player(3)
+    with app.app_context():
+        assert User.query.filter_by(username=player(3)).one().password == stored
+
+def test_wrong_password(client):
+    assert client.post('/login', data={'username': player(3), 'password': 'wrong'}).status_code == 200
+    with client.session_transaction() as session:
+        assert 'username' not in session
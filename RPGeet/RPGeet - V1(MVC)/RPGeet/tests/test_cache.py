@@ -0,0 +1,39 @@
+""" The LRU caches: staleness, eviction and their counters on the admin page. """
+
+from app.cache import LRUCache
+from app.game_logic.pathfinder1 import invalidate_character, stats_cache
+from conftest import player, character_of
+
+def test_stale_stamp_is_a_miss():
+    cache = LRUCache(max_size=4, ttl=60)
+    cache.put('sheet', 'old', stamp=1)
+    assert cache.get('sheet', stamp=1) == 'old'
+    assert cache.get('sheet', stamp=2) is None
+    assert cache.get('sheet', stamp=1) is None # Dropped when found stale
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stale'], stats['size']) == (1, 2, 1, 0)
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.stats()['evictions'] == 1
+
+def test_invalidated_sheet_counts_stale(client, login):
+    login(client, player(1))
+    character_id = character_of(1)
+    path = f'/game/1/character/{character_id}'
+    client.get(path)
+    stats_cache.reset_stats()
+    invalidate_character(character_id)
+    stats_cache.put(character_id, {'stale': True}, (-1, -1)) # As left by a concurrent request
+    client.get(path)
+    assert stats_cache.stats()['stale'] == 1
+
+def test_admin_page_shows_the_caches(client, login):
+    login(client, player(1), admin=True)
+    page = client.get('/admin/queries').get_data(as_text=True)
+    assert 'pathfinder1.stats' in page
@@ -0,0 +1,43 @@
+""" The combat event streams: who may open them, and how many. """
+
+import pytest
+
+from app.game_logic import combat_events
+from conftest import gamemaster, player
+
+def test_stream_starts_with_a_snapshot(client, login, combat):
+    login(client, player(1))
+    response = client.get('/game/1/combat/events', buffered=False)
+    try:
+        assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b'retry:')
+        assert b'event: snapshot' in next(chunks)
+        assert combat_events.broker.listeners(1) == 1
+    finally:
+        response.close()
+    assert combat_events.broker.listeners(1) == 0
+
+def test_outsiders_cannot_listen(client, login):
+    login(client, player(2))
+    assert client.get('/game/1/combat/events').status_code == 403
+
+def test_streams_per_user_are_capped():
+    broker = combat_events.LocalBroker()
+    streams = [broker.subscribe(1, 'alice') for _ in range(combat_events.MAX_STREAMS_PER_USER)]
+    with pytest.raises(combat_events.TooManySubscriptions):
+        broker.subscribe(1, 'alice')
+    broker.subscribe(1, 'bob')
+    broker.subscribe(2, 'alice')
+    broker.unsubscribe(streams[0])
+    broker.subscribe(1, 'alice')
+    assert broker.listeners(1) == combat_events.MAX_STREAMS_PER_USER + 1
+
+def test_stream_over_the_cap_is_refused(client, login):
+    streams = [combat_events.broker.subscribe(1, gamemaster(1)) for _ in range(combat_events.MAX_STREAMS_PER_USER)]
+    try:
+        login(client, gamemaster(1))
+        assert client.get('/game/1/combat/events').status_code == 429
+    finally:
+        for subscription in streams:
+            combat_events.broker.unsubscribe(subscription)
@@ -0,0 +1,125 @@
+""" Undo and the combat journal: round trips, replay, integrity and retention. """
+
+import pytest
+
+from app.game_logic import combat_actions, combat_journal
+from app.game_logic.combat_journal import CombatJournalError, MemoryCombatJournal
+from conftest import gamemaster, player
+
+FETCH = {'X-Requested-With': 'fetch'}
+
+def _fields(state : dict) -> dict:
+    """ The parts of a state that undo restores (not its command number nor undo patches). """
+    kept = {key: state[key] for key in ('round', 'current', 'next_id', 'next_effect', 'participants', 'order', 'encounter')}
+    kept['effects'] = sorted(map(tuple, state['effects']))
+    return kept
+
+def _commands(combat, game_id : int):
+    combat.add_participant(game_id, 'Orc', 12)
+    combat.add_participant(game_id, 'Elf', 18, 3)
+    combat.next_turn(game_id)
+    combat.add_effect(game_id, 2, 'Haste', 2)
+    combat.next_turn(game_id)
+    combat.hold_action(game_id, 1, 'delay')
+    combat.next_turn(game_id)
+    combat.act_now(game_id, 1)
+    combat.remove_participant(game_id, 2)
+
+@pytest.fixture
+def store(app, combat):
+    """
+    The combat functions, called within an application context (not for the tests going through
+    the routes: their requests would share its flask.g).
+    """
+    with app.app_context():
+        yield combat
+
+def _state(combat, game_id : int) -> dict:
+    return combat_actions.upgrade_state(combat.combat_store.load(game_id))
+
+def test_undo_round_trip(store):
+    states = [_fields(_state(store, 1))]
+    store.add_participant(1, 'Orc', 12)
+    states.append(_fields(_state(store, 1)))
+    store.add_participant(1, 'Elf', 18, 3)
+    states.append(_fields(_state(store, 1)))
+    for _ in range(7):
+        store.undo(1, 1)
+        assert _fields(_state(store, 1)) == states[-2]
+        store.add_participant(1, 'Elf', 18, 3)
+        assert _fields(_state(store, 1)) == states[-1]
+
+def test_undo_every_kind_of_command(store):
+    start = _fields(_state(store, 1))
+    _commands(store, 1)
+    store.undo(1, 9)
+    assert _fields(_state(store, 1)) == start
+
+def test_undo_past_the_start_is_refused(store):
+    store.add_participant(1, 'Orc', 12)
+    with pytest.raises(ValueError):
+        store.undo(1, 5)
+    assert [p['name'] for p in _state(store, 1)['participants'].values()] == ['Orc']
+
+def test_undo_through_the_route(app, client, login, combat):
+    login(client, gamemaster(1))
+    client.post('/game/1/combat/add', data={'name': 'Orc', 'initiative': 12}, headers=FETCH)
+    client.post('/game/1/combat/add', data={'name': 'Elf', 'initiative': 18}, headers=FETCH)
+    assert client.post('/game/1/combat/undo', headers=FETCH).status_code == 204
+    assert [p['name'] for p in _state(combat, 1)['participants'].values()] == ['Orc']
+    login(client, player(1))
+    assert client.post('/game/1/combat/undo', headers=FETCH).status_code == 403
+
+def test_journal_replays_to_the_same_state(store):
+    _commands(store, 1)
+    live = _state(store, 1)
+    assert store.combat_journal.restore(1) == live
+
+def test_journal_gap_raises(store):
+    _commands(store, 1)
+    journal = store.combat_journal
+    del journal._entries[1][3]
+    with pytest.raises(CombatJournalError):
+        journal.restore(1)
+
+def test_journal_error_is_a_conflict(client, login, combat):
+    login(client, gamemaster(1))
+    client.post('/game/1/combat/add', data={'name': 'Orc', 'initiative': 12}, headers=FETCH)
+    client.post('/game/1/combat/add', data={'name': 'Elf', 'initiative': 18}, headers=FETCH)
+    del combat.combat_journal._entries[1][0]
+    combat.combat_store._states.clear() # As after a restart: rebuilt from the journal
+    assert client.post('/game/1/combat/next', headers=FETCH).status_code == 409
+    assert client.get('/game/1/combat').status_code == 409
+
+def test_memory_and_sql_retention_match(app, combat):
+    app.config.update(COMBAT_STORE='sql', COMBAT_JOURNAL='sql', COMBAT_SNAPSHOT_INTERVAL=4)
+    try:
+        with app.app_context():
+            combat.configure_combat_store(app)
+            memory = MemoryCombatJournal(4)
+            for i in range(11):
+                combat.add_participant(3, f"Orc {i}", i)
+                memory.append(3, _state(combat, 3), {'type': 'add', 'name': f"Orc {i}", 'initiative': i, 'secondary': 0})
+            assert [seq for seq, *_ in combat.combat_journal.history(3)] == [seq for seq, *_ in memory.history(3)]
+            assert [seq for seq, *_ in memory.history(3)] == [11, 10, 9, 8, 7, 6, 5]
+            assert combat.combat_journal.restore(3) == _state(combat, 3)
+    finally:
+        app.config.update(COMBAT_STORE='memory', COMBAT_JOURNAL='memory', COMBAT_SNAPSHOT_INTERVAL=50)
+
+def test_sql_journal_commits_with_the_state(app, combat, monkeypatch):
+    app.config.update(COMBAT_STORE='sql', COMBAT_JOURNAL='sql')
+    try:
+        with app.app_context():
+            combat.configure_combat_store(app)
+            combat.add_participant(4, 'Orc', 12)
+
+            def failing_append(*args, **kwargs):
+                raise RuntimeError("journal down")
+            monkeypatch.setattr(combat.combat_journal, '_append', failing_append)
+            with pytest.raises(RuntimeError):
+                combat.add_participant(4, 'Elf', 18)
+            monkeypatch.undo()
+            assert [p['name'] for p in _state(combat, 4)['participants'].values()] == ['Orc']
+            assert [seq for seq, *_ in combat.combat_journal.history(4)] == [1]
+    finally:
+        app.config.update(COMBAT_STORE='memory', COMBAT_JOURNAL='memory')
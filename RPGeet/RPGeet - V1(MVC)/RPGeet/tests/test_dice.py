@@ -0,0 +1,41 @@
+""" Dice expressions: parsing, limits and the roll route. """
+
+import pytest
+
+from app.game_logic import dice
+from conftest import player
+
+def test_parse():
+    expression = dice.parse('20#4d6kh3 + 2 - 1d4')
+    assert expression.repeat == 20 and expression.constant == 2
+    assert [(t.sign, t.count, t.sides, t.keep, t.highest) for t in expression.terms] == [(1, 4, 6, 3, True), (-1, 1, 4, 1, True)]
+
+def test_seeded_rolls_replay():
+    first, second = dice.roll_batch(['10#1d20+5', '3d6'], seed=7), dice.roll_batch(['10#1d20+5', '3d6'], seed=7)
+    assert [r.totals.tolist() for r in first] == [r.totals.tolist() for r in second]
+    assert all(6 <= total <= 25 for total in first[0].totals)
+
+@pytest.mark.parametrize('text', [
+    '', '1d0', '0d6', '1d1001', '4d6kh5', '10001#1d6', '1001#1000d6', '1d20 5',
+    '1d6+99999999999999999999999', '1000000001', '-1000000001', '1d6+600000000+600000000',
+])
+def test_invalid_expressions(text):
+    with pytest.raises(ValueError):
+        dice.parse(text)
+
+def test_largest_constant():
+    assert dice.roll(f'1d6+{dice.MAX_CONSTANT}', dice.generator(1)).totals[0] > dice.MAX_CONSTANT
+    assert dice.parse(f'-{dice.MAX_CONSTANT}').constant == -dice.MAX_CONSTANT
+
+def test_roll_route_rejects_huge_constants(client, login):
+    login(client, player(1))
+    response = client.post('/game/1/roll', json={'expressions': ['1d6+99999999999999999999999']})
+    assert response.status_code == 400 and 'error' in response.get_json()
+
+def test_roll_route(client, login):
+    login(client, player(1))
+    response = client.post('/game/1/roll', json={'expressions': ['3#1d20+5'], 'seed': 3, 'faces': True})
+    rolls = response.get_json()['rolls']
+    assert response.get_json()['seed'] == 3 and len(rolls[0]['totals']) == 3 and len(rolls[0]['faces'][0]) == 3
+    login(client, player(2))
+    assert client.post('/game/1/roll', json={'expressions': ['1d20']}).status_code == 403
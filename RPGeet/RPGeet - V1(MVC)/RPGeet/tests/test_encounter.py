@@ -0,0 +1,73 @@
+""" The encounter simulator: its bounds, and its report through the route. """
+
+import pytest
+
+from app.game_logic.encounter import FOES, PARTY, Combatant, EncounterSimulator
+from conftest import gamemaster, player
+
+FETCH = {'X-Requested-With': 'fetch'}
+HERO = Combatant('Hero', PARTY, hp=30, ac=18, attack=8, damage='1d8+4')
+ORC = {'name': 'Orc', 'hp': 6, 'ac': 13, 'attack': 5, 'damage': '2d4+4'}
+
+def _orcs(n : int) -> list[Combatant]:
+    return [Combatant(f"Orc {i}", FOES, hp=6, ac=13, attack=5, damage='2d4+4') for i in range(n)]
+
+def test_seeded_report_replays():
+    simulator = EncounterSimulator(workers=1)
+    first, second = simulator.run([HERO] + _orcs(3), 2000, seed=5), simulator.run([HERO] + _orcs(3), 2000, seed=5)
+    assert first == second
+    assert first.party_wins + first.foes_wins + first.draws == pytest.approx(1.0)
+
+def test_work_is_bounded():
+    simulator = EncounterSimulator(workers=1, max_rounds=50, max_work=1_000_000)
+    simulator.run([HERO] + _orcs(3), 5000) # 4 x 50 x 5000
+    with pytest.raises(ValueError, match='2500 times at most'):
+        simulator.run([HERO] + _orcs(7), 5000) # 8 x 50 x 5000
+
+def test_large_fights_use_the_pool():
+    # A party of 4 against 6 foes, 10 000 times: 10 x 50 x 10 000 = 5M, at the pool threshold
+    simulator = EncounterSimulator(workers=2)
+    party = [HERO._replace(name=f"Hero {i}") for i in range(4)]
+    try:
+        small = simulator.run(party + _orcs(6), 1000, seed=3)
+        assert simulator._pool is None
+        report = simulator.run(party + _orcs(6), 10_000, seed=3)
+        assert simulator._pool is not None
+        assert report.trials == 10_000 and report.party_wins == pytest.approx(small.party_wins, abs=0.1)
+        # Each process does up to max_work: twice as many trials as a single one allows
+        simulator.run(party + _orcs(6), 2 * simulator.max_work // (10 * simulator.max_rounds))
+    finally:
+        simulator.shutdown()
+
+def test_damage_support_is_bounded():
+    simulator = EncounterSimulator(workers=1)
+    with pytest.raises(ValueError, match='Orc 0'):
+        simulator.run([HERO] + [_orcs(1)[0]._replace(damage='1000d1000')], 10)
+    with pytest.raises(ValueError, match='Dragon'):
+        simulator.run([HERO, Combatant('Dragon', FOES, 100, 20, 10, '2d6', save_dc=20, save_damage='500d100')], 10)
+
+@pytest.fixture
+def party(combat, client, login):
+    login(client, gamemaster(1))
+    assert client.post('/game/1/combat/party', headers=FETCH).status_code == 204
+    return client
+
+def test_report_flags_the_assumed_damage(party):
+    response = party.post('/game/1/combat/simulate', json={'foes': [dict(ORC, count=4)], 'trials': 500, 'seed': 1})
+    report = response.get_json()
+    assert response.status_code == 200 and report['trials'] == 500
+    assert any('1d8' in a for a in report['assumptions'])
+    assert {c['damage'] for c in report['combatants'] if c['side'] == 'foes'} == {'2d4+4'}
+
+@pytest.mark.parametrize('foes, trials', [
+    ([dict(ORC, damage='1000d1000')], 100),
+    ([dict(ORC, count=100)], 200_000),
+    ([dict(ORC, count=101)], 10),
+])
+def test_oversized_simulations_are_refused(party, foes, trials):
+    response = party.post('/game/1/combat/simulate', json={'foes': foes, 'trials': trials})
+    assert response.status_code == 400 and 'error' in response.get_json()
+
+def test_only_the_gm_simulates(client, login):
+    login(client, player(1))
+    assert client.post('/game/1/combat/simulate', json={'foes': [ORC]}).status_code == 403
@@ -0,0 +1,90 @@
+""" Holding actions (delay, ready) and acting out of turn, with who may do it. """
+
+import pytest
+
+from conftest import character_of, gamemaster, player
+
+FETCH = {'X-Requested-With': 'fetch'}
+
+@pytest.fixture
+def fight(app, combat, client, login):
+    """
+    Game 1 fighting an orc (20), the character of player 1 (15) and the one of player 2 (10).
+
+    :return: The participant ids, by name
+    """
+    login(client, gamemaster(1))
+    client.post('/game/1/combat/add', data={'name': 'Orc', 'initiative': 20}, headers=FETCH)
+    client.post('/game/1/combat/add', data={'name': 'Valeros', 'initiative': 15, 'character_id': character_of(1, 1)}, headers=FETCH)
+    client.post('/game/1/combat/add', data={'name': 'Kyra', 'initiative': 10, 'character_id': character_of(1, 2)}, headers=FETCH)
+    client.post('/game/1/combat/next', headers=FETCH)
+    with app.app_context():
+        return {p['name']: p['id'] for p in combat.get_combat_state(1)['participants']}
+
+def _state(app, combat):
+    with app.app_context():
+        state = combat.get_combat_state(1)
+    return state['active']['name'], [(p['name'], p['held']) for p in state['participants']]
+
+def test_delay_then_act(app, combat, client, login, fight):
+    assert _state(app, combat)[0] == 'Orc'
+    assert client.post('/game/1/combat/hold', data={'participant_id': fight['Orc'], 'action': 'delay'}, headers=FETCH).status_code == 204
+    active, participants = _state(app, combat)
+    assert active == 'Valeros' and ('Orc', 'delay') in participants
+
+    assert client.post('/game/1/combat/act', data={'participant_id': fight['Orc']}, headers=FETCH).status_code == 204
+    active, participants = _state(app, combat)
+    assert active == 'Orc' and [name for name, _ in participants] == ['Orc', 'Valeros', 'Kyra']
+    assert all(held is None for _, held in participants)
+
+def test_only_the_active_participant_holds(client, fight):
+    response = client.post('/game/1/combat/hold', data={'participant_id': fight['Kyra'], 'action': 'ready'}, headers=FETCH)
+    assert response.status_code == 409
+
+def test_players_control_their_own_character(app, combat, client, login, fight):
+    client.post('/game/1/combat/next', headers=FETCH) # Valeros' turn
+    login(client, player(1, 2))
+    assert client.post('/game/1/combat/hold', data={'participant_id': fight['Valeros'], 'action': 'ready'}, headers=FETCH).status_code == 403
+    login(client, player(1, 1))
+    assert client.post('/game/1/combat/hold', data={'participant_id': fight['Valeros'], 'action': 'ready'}, headers=FETCH).status_code == 204
+    assert ('Valeros', 'ready') in _state(app, combat)[1]
+    login(client, player(1, 2))
+    assert client.post('/game/1/combat/act', data={'participant_id': fight['Valeros']}, headers=FETCH).status_code == 403
+
+def test_players_cannot_control_the_gm_creatures(client, login, fight):
+    login(client, player(1, 1))
+    assert client.post('/game/1/combat/hold', data={'participant_id': fight['Orc'], 'action': 'delay'}, headers=FETCH).status_code == 403
+
+def test_outsiders_are_rejected(client, login, fight):
+    login(client, player(2, 1))
+    assert client.post('/game/1/combat/hold', data={'participant_id': fight['Orc'], 'action': 'delay'}, headers=FETCH).status_code == 403
+    assert client.post('/game/1/combat/act', data={'participant_id': fight['Orc']}, headers=FETCH).status_code == 403
+    assert client.get('/game/1/combat').status_code == 403
+    assert client.post('/game/1/combat/add', data={'name': 'Goblin', 'initiative': 5}, headers=FETCH).status_code == 403
+    assert client.post('/game/1/combat/effect', data={'participant_id': fight['Orc'], 'effect': 'Bless', 'duration': 1}, headers=FETCH).status_code == 403
+    assert client.post('/game/1/combat/next', headers=FETCH).status_code == 403
+
+def test_only_the_gm_adds_and_blesses(app, combat, client, login, fight):
+    login(client, player(1, 1))
+    assert client.get('/game/1/combat').status_code == 200
+    assert client.post('/game/1/combat/add', data={'name': 'Goblin', 'initiative': 5}, headers=FETCH).status_code == 403
+    assert client.post('/game/1/combat/effect', data={'participant_id': fight['Valeros'], 'effect': 'Bless', 'duration': 1}, headers=FETCH).status_code == 403
+    assert [name for name, _ in _state(app, combat)[1]] == ['Orc', 'Valeros', 'Kyra']
+
+def test_players_end_only_their_own_turn(app, combat, client, login, fight):
+    login(client, player(1, 1))
+    assert client.post('/game/1/combat/next', headers=FETCH).status_code == 403 # The orc's turn
+    login(client, gamemaster(1))
+    assert client.post('/game/1/combat/next', headers=FETCH).status_code == 204
+    login(client, player(1, 2))
+    assert client.post('/game/1/combat/next', headers=FETCH).status_code == 403 # Valeros' turn
+    login(client, player(1, 1))
+    assert client.post('/game/1/combat/next', headers=FETCH).status_code == 204
+    assert _state(app, combat)[0] == 'Kyra'
+
+def test_only_the_gm_removes(app, combat, client, login, fight):
+    login(client, player(1, 1))
+    assert client.post('/game/1/combat/remove', data={'participant_id': fight['Valeros']}, headers=FETCH).status_code == 403
+    login(client, gamemaster(1))
+    assert client.post('/game/1/combat/remove', data={'participant_id': fight['Valeros']}, headers=FETCH).status_code == 204
+    assert 'Valeros' not in [name for name, _ in _state(app, combat)[1]]
@@ -0,0 +1,31 @@
+""" The index checks of "flask db explain", on the SQLite stand-in schema. """
+
+from sqlalchemy import text
+
+from app.migrations import explain_hot_queries
+from app.models.core import db
+
+SCHEMAS = ['core', 'pathfinder1']
+
+def test_hot_queries_use_an_index(app):
+    with app.app_context(), db.engine.connect() as conn:
+        assert explain_hot_queries(conn, SCHEMAS) == {}
+
+def test_missing_index_is_reported(app):
+    with app.app_context(), db.engine.connect() as conn:
+        conn.execute(text("DROP INDEX core.r_game_user_username_idx"))
+        conn.commit()
+        conn.invalidate() # The statements cached by the driver keep their plans
+        try:
+            failures = explain_hot_queries(conn, SCHEMAS)
+        finally:
+            conn.execute(text("CREATE INDEX core.r_game_user_username_idx ON r_game_user (username)"))
+            conn.commit()
+            conn.invalidate()
+    assert failures['lobby'] == ['r_game_user']
+    assert 'game members' not in failures # Answered by the unique (game_id, username) index
+
+def test_explain_command(app):
+    result = app.test_cli_runner().invoke(args=['db', 'explain'])
+    assert result.exit_code == 0, result.output
+    assert "All hot queries use an index." in result.output
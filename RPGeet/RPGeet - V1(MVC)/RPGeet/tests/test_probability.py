@@ -0,0 +1,37 @@
+""" Exact distributions of dice expressions, and their size limit. """
+
+import pytest
+
+from app.game_logic import probability
+from conftest import player
+
+def test_sums_to_one():
+    d = probability.distribution('2d6+3')
+    assert (d.minimum, d.maximum) == (5, 15)
+    assert d.pmf.sum() == pytest.approx(1.0)
+    assert d.mean == pytest.approx(10.0)
+    assert d.at_least(15) == pytest.approx(1 / 36)
+
+def test_keep_highest():
+    assert probability.distribution('4d6kh3').mean == pytest.approx(12.2446, abs=1e-4)
+
+def test_d20_success_bounds():
+    assert probability.d20_success(100, 10) == pytest.approx(0.95)
+    assert probability.d20_success(-100, 10) == pytest.approx(0.05)
+    assert probability.d20_success(5, 15) == pytest.approx(0.55)
+
+def test_largest_support():
+    d = probability.distribution('20d1000')
+    assert d.maximum == 20_000 and d.pmf.sum() == pytest.approx(1.0)
+
+@pytest.mark.parametrize('text', ['1000d1000', '21d1000', '20d1000+1d6', '10d1000-11d1000', '3#1d20'])
+def test_too_large_distributions(text):
+    with pytest.raises(ValueError):
+        probability.distribution(text)
+
+def test_distribution_route_rejects_large_supports(client, login):
+    login(client, player(1))
+    response = client.get('/game/1/roll/distribution', query_string={'expression': '1000d1000'})
+    assert response.status_code == 400 and 'too many outcomes' in response.get_json()['error']
+    response = client.get('/game/1/roll/distribution', query_string={'expression': '1d20+5', 'target': 15})
+    assert response.get_json()['at_least'] == pytest.approx(0.55)
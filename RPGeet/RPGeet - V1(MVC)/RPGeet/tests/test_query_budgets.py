@@ -0,0 +1,72 @@
+""" The statement budgets of the hot pages (QUERY_BUDGETS), enforced in strict mode by the fixtures. """
+
+import pytest
+
+from app import query_tracker
+from app.models.core import db, Game, GameUser, Character, User
+from app.game_logic.pathfinder1 import stats_cache
+from conftest import gamemaster, player, character_of
+
+@pytest.fixture(autouse=True)
+def cold(app):
+    query_tracker.reset()
+    stats_cache.clear()
+
+def _max_statements(endpoint : str) -> int:
+    return query_tracker.endpoint_stats[endpoint].max_statements
+
+@pytest.mark.parametrize('endpoint, path', [
+    ('main.lobby', '/lobby'),
+    ('character.characters', '/characters'),
+    ('game.view_game', '/game/1'),
+    ('character.view_character', f'/game/1/character/{character_of(1)}'),
+])
+def test_page_within_budget(app, client, login, endpoint, path):
+    login(client, player(1))
+    for _ in range(2): # Cold, then warm caches
+        assert client.get(path).status_code == 200
+    assert _max_statements(endpoint) <= app.config['QUERY_BUDGETS'][endpoint]
+
+def _join_games(username : str, count : int):
+    """
+    Make a user play in count more new games, with a character in each.
+    """
+    system_id = db.session.get(Game, 1).system_id
+    for _ in range(count):
+        game = Game(name=f"{username}'s game", system_id=system_id)
+        participation = GameUser(username=username, game=game)
+        db.session.add_all([game, participation, Character(name=username.title(), game_user=participation)])
+    db.session.commit()
+
+def _statements(client, endpoint : str, path : str) -> int:
+    query_tracker.reset()
+    assert client.get(path).status_code == 200
+    return query_tracker.endpoint_stats[endpoint].statements
+
+@pytest.mark.parametrize('endpoint, path, username', [
+    ('main.lobby', '/lobby', 'globetrotter'),
+    ('character.characters', '/characters', 'wanderer'),
+])
+def test_lists_cost_the_same_for_any_number_of_games(app, client, login, endpoint, path, username):
+    with app.app_context():
+        db.session.add(User(username=username, password='-'))
+        _join_games(username, 1)
+    login(client, username)
+    one_game = _statements(client, endpoint, path)
+    with app.app_context():
+        _join_games(username, 19)
+    assert _statements(client, endpoint, path) == one_game
+
+def test_cached_sheet_costs_less(client, login):
+    login(client, player(1))
+    path = f'/game/1/character/{character_of(1)}'
+    client.get(path)
+    cold_statements = query_tracker.endpoint_stats['character.view_character'].statements
+    client.get(path)
+    warm_statements = query_tracker.endpoint_stats['character.view_character'].statements - cold_statements
+    assert warm_statements < cold_statements
+
+def test_gm_sees_the_game_within_budget(app, client, login):
+    login(client, gamemaster(1))
+    assert client.get('/game/1').status_code == 200
+    assert _max_statements('game.view_game') <= app.config['QUERY_BUDGETS']['game.view_game']
@@ -0,0 +1,34 @@
+""" The roles cache: version bumps, bounded size and the character to game mapping. """
+
+from app.models.core import GameRoleFacts, RolesCache, User, db
+from conftest import character_of, player
+
+FACTS = GameRoleFacts(is_admin=False, is_member=True, is_gm=False, owned_characters=frozenset())
+
+def test_bump_invalidates_the_game():
+    cache = RolesCache(ttl=60)
+    cache.put('alice', 1, cache.version(1), FACTS)
+    cache.put('alice', 2, cache.version(2), FACTS)
+    cache.bump(1)
+    assert cache.get('alice', 1) is None
+    assert cache.get('alice', 2) == FACTS
+
+def test_full_cache_evicts_one_entry():
+    cache = RolesCache(ttl=60, max_entries=2)
+    for username in ('alice', 'bob', 'carol'):
+        cache.put(username, 1, 0, FACTS)
+    assert cache.get('alice', 1) is None
+    assert cache.get('bob', 1) == FACTS and cache.get('carol', 1) == FACTS
+
+def test_character_game(app):
+    cache = RolesCache(ttl=60)
+    with app.app_context():
+        assert cache.character_game(character_of(2)) == 2
+        assert cache._character_games.get(character_of(2)) == 2
+        assert cache.character_game(10_000) is None
+
+def test_roles_of_a_character(app):
+    with app.app_context():
+        roles = User.get_roles(player(1), character_id=character_of(1))
+        assert roles.game_id == 1 and roles.is_owner and not roles.is_gm
+        assert not User.get_roles(player(2), character_id=character_of(1)).is_member